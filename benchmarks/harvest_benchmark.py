@@ -0,0 +1,207 @@
+import logging
+import argparse
+import os
+import resource
+import shutil
+import tempfile
+import time
+from tweepy import OAuthHandler
+from benchmarks.standins import StandInServer, Scale, redirect_hosts
+from sfh import SocialFeedHarvester
+from socialfeedharvester.fetch_strategy import DefaultFetchStrategy
+from socialfeedharvester.host_scheduler import HostScheduler
+from socialfeedharvester.metrics import MetricsRegistry
+from socialfeedharvester.session_pool import SessionPool
+from socialfeedharvester.digest_index import SqliteDigestIndex
+from socialfeedharvester.warc import AsyncWarcWriter, RotatingWarcWriter
+import socialfeedharvester.fetchables.tumblr as tumblr
+import twh
+
+log = logging.getLogger(__name__)
+
+"""
+Benchmarks harvesting against local stand-in servers, so that throughput regressions can be caught before deploying.
+
+The sfh benchmark harvests Twitter user timelines, Tumblr blogs, and Flickr users, along with the web resources they
+link to, with SocialFeedHarvester.fetch().  The twh benchmark harvests the Twitter streaming API with twh.WarcListener.
+
+Invoke with:
+
+    python -m benchmarks.harvest_benchmark [sfh|twh|all] [options]
+"""
+
+AUTHS = {
+    "twitter": {"consumer_key": "benchmark", "consumer_secret": "benchmark", "access_token": "benchmark",
+                "access_token_secret": "benchmark"},
+    "tumblr": {"api_key": "benchmark"},
+    "flickr": {"key": "benchmark", "secret": "benchmark"}
+}
+
+
+class Result():
+    """
+    Results of a benchmark.
+    """
+    def __init__(self, name, seconds, fetches, payload_bytes, warc_records, warc_bytes, unit="fetches"):
+        self.name = name
+        self.unit = unit
+        self.seconds = seconds
+        self.fetches = fetches
+        self.payload_bytes = payload_bytes
+        self.warc_records = warc_records
+        self.warc_bytes = warc_bytes
+
+    def __str__(self):
+        return ("%s: %s %s in %.2f secs (%.1f %s/sec); %.1f MB payload (%.2f MB/sec); "
+                "%s warc records (%.1f records/sec); %.1f MB warc files (%.2f MB/sec)"
+                % (self.name, self.fetches, self.unit, self.seconds, self.fetches / self.seconds, self.unit,
+                   self.payload_bytes / 1048576.0, self.payload_bytes / 1048576.0 / self.seconds,
+                   self.warc_records, self.warc_records / self.seconds,
+                   self.warc_bytes / 1048576.0, self.warc_bytes / 1048576.0 / self.seconds))
+
+
+def benchmark_sfh(server, collection_path, users=5, blogs=5, flickr_users=5, workers=1, sniff_content_type=False,
+                  digest_index=None, compresslevel=9, warc_queue_size=1000, name="sfh"):
+    """
+    Harvests user timelines, blogs, and Flickr users from a stand-in server with SocialFeedHarvester.
+
+    :param digest_index: Digest index of payloads archived by previous harvests, to benchmark repeat harvests.
+    :param warc_queue_size: Number of records to queue for writing in the background.  If 0, written by the workers.
+    """
+    #Tumblr uses httplib2, so point the client at the stand-in server.
+    tumblr.client_manager.get_client(AUTHS["tumblr"]["api_key"]).request.host = server.url
+
+    seeds = [{"type": "twitter_user_timeline", "screen_name": "user%s" % i} for i in range(users)]
+    seeds.extend([{"type": "tumblr_blog", "blog_name": "blog%s" % i, "incremental": False} for i in range(blogs)])
+    seeds.extend([{"type": "flickr_user", "username": "flickr%s" % i} for i in range(flickr_users)])
+
+    warc_writer = RotatingWarcWriter(collection_path, "benchmark", compresslevel=compresslevel, index=True)
+    if warc_queue_size:
+        warc_writer = AsyncWarcWriter(warc_writer, queue_size=warc_queue_size)
+    metrics = MetricsRegistry()
+    sfh = SocialFeedHarvester(seeds, auths=AUTHS,
+                              fetch_strategy=DefaultFetchStrategy(
+                                  depth2_resource_types=["ImageType", "WebPageType", "DocumentType", "FlickrType"],
+                                  depth3_resource_types=["ImageType"]),
+                              warc_writer=warc_writer,
+                              #No politeness, since everything is local.
+                              host_scheduler=HostScheduler(0, max_per_host=workers),
+                              session_pool=SessionPool(max_connections_per_host=workers),
+                              workers=workers, metrics=metrics, sniff_content_type=sniff_content_type,
+                              digest_index=digest_index)
+    start = time.time()
+    with redirect_hosts(server):
+        sfh.fetch()
+    seconds = time.time() - start
+
+    return Result(name, seconds, metrics.total("sfh_fetches_total"), metrics.total("sfh_warc_bytes_total"),
+                  metrics.total("sfh_warc_records_total"), _warc_bytes(collection_path))
+
+
+class _BenchmarkWarcListener(twh.WarcListener):
+    """
+    A WarcListener that stops the stream after a number of tweets.
+    """
+    def __init__(self, tweets, *args, **kwargs):
+        twh.WarcListener.__init__(self, *args, **kwargs)
+        self.tweets = tweets
+        self.tweets_received = 0
+        self.bytes_received = 0
+
+    def on_data(self, data):
+        twh.WarcListener.on_data(self, data)
+        self.tweets_received += 1
+        self.bytes_received += len(data)
+        if self.tweets_received >= self.tweets:
+            return False
+
+
+def benchmark_twh(server, collection_path, tweets_per_record=25000):
+    """
+    Harvests the stand-in streaming API with twh.WarcListener.
+    """
+    auth = OAuthHandler("benchmark", "benchmark")
+    auth.set_access_token("benchmark", "benchmark")
+    start = time.time()
+    with redirect_hosts(server):
+        with _BenchmarkWarcListener(server.scale.stream_tweets, "benchmark", "stream", collection_path,
+                                    tweets_per_record=tweets_per_record) as listener:
+            stream = twh.StreamDecorator(auth, listener)
+            stream.filter(track=["benchmark"])
+    seconds = time.time() - start
+
+    #Request and response, followed by continuations.
+    warc_records = 1 + (listener.tweets_received + tweets_per_record - 1) // tweets_per_record
+    return Result("twh", seconds, listener.tweets_received, listener.bytes_received, warc_records,
+                  _warc_bytes(collection_path), unit="tweets")
+
+
+def peak_rss():
+    """
+    Returns the peak resident set size of this process in bytes.
+    """
+    #Kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _warc_bytes(path):
+    total = 0
+    for (dirpath, _, filenames) in os.walk(path):
+        for filename in filenames:
+            if ".warc" in filename:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+    return total
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark harvesting against local stand-in servers.")
+    parser.add_argument("benchmark", choices=("sfh", "twh", "all"), nargs="?", default="all")
+    parser.add_argument("--users", type=int, default=5, help="Number of Twitter user timelines.")
+    parser.add_argument("--tweet-pages", type=int, default=5, help="Number of pages of each user timeline.")
+    parser.add_argument("--tweets-per-page", type=int, default=20)
+    parser.add_argument("--blogs", type=int, default=5, help="Number of Tumblr blogs.")
+    parser.add_argument("--posts", type=int, default=100, help="Number of posts of each blog.")
+    parser.add_argument("--flickr-users", type=int, default=5, help="Number of Flickr users.")
+    parser.add_argument("--photos", type=int, default=50, help="Number of photos of each Flickr user.")
+    parser.add_argument("--web-pages", type=int, default=100, help="Number of distinct web pages.")
+    parser.add_argument("--images-per-page", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=20000, help="Approximate size of web pages in bytes.")
+    parser.add_argument("--image-size", type=int, default=20000, help="Size of images in bytes.")
+    parser.add_argument("--stream-tweets", type=int, default=10000, help="Number of tweets to stream.")
+    parser.add_argument("--tweets-per-record", type=int, default=25000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--harvests", type=int, default=1,
+                        help="Number of times to harvest, deduplicating against the previous harvests.")
+    parser.add_argument("--sniff-content-type", action="store_true",
+                        help="Fetch unknown resources with a single GET.")
+    parser.add_argument("--compress-level", type=int, choices=range(1, 10), default=9)
+    parser.add_argument("--warc-queue-size", type=int, default=1000,
+                        help="Number of records to queue for writing in the background. If 0, written by the workers.")
+    parser.add_argument("--collection-path", help="Where to write WARCs. If omitted, a temporary directory that is "
+                                                  "deleted afterwards.")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s: %(name)s --> %(message)s', level=getattr(logging, args.log_level))
+
+    scale = Scale(tweet_pages=args.tweet_pages, tweets_per_page=args.tweets_per_page,
+                  stream_tweets=args.stream_tweets, posts=args.posts, photos=args.photos, web_pages=args.web_pages,
+                  images_per_page=args.images_per_page, page_size=args.page_size, image_size=args.image_size)
+    s = StandInServer(scale).start()
+    collection_path = args.collection_path or tempfile.mkdtemp()
+    try:
+        if args.benchmark in ("sfh", "all"):
+            for harvest in range(1, args.harvests + 1):
+                print benchmark_sfh(s, os.path.join(collection_path, "sfh", str(harvest)), users=args.users,
+                                    blogs=args.blogs, flickr_users=args.flickr_users, workers=args.workers,
+                                    sniff_content_type=args.sniff_content_type,
+                                    digest_index=SqliteDigestIndex(os.path.join(collection_path, "sfh")),
+                                    compresslevel=args.compress_level, warc_queue_size=args.warc_queue_size,
+                                    name="sfh" if args.harvests == 1 else "sfh harvest %s" % harvest)
+        if args.benchmark in ("twh", "all"):
+            print benchmark_twh(s, os.path.join(collection_path, "twh"), tweets_per_record=args.tweets_per_record)
+        print "peak RSS: %.1f MB" % (peak_rss() / 1048576.0)
+    finally:
+        s.stop()
+        if not args.collection_path:
+            shutil.rmtree(collection_path)
@@ -0,0 +1,92 @@
+import logging
+import argparse
+import os
+import time
+import warnings
+from benchmarks.standins import Scale, _page, _stylesheet
+from socialfeedharvester.fetchables.link_extractor import LINK_EXTRACTORS, extract_css_links
+
+log = logging.getLogger(__name__)
+
+"""
+Benchmarks extracting links from web pages with each link extractor and from stylesheets.
+
+The pages are the synthetic web pages served by the stand-in server.  The stylesheets are the *.css files found under
+a corpus directory, e.g., a mirror of real sites, or else the synthetic stylesheets served by the stand-in server.
+Stylesheets are also parsed with cssutils, if installed, for comparison.
+
+Invoke with:
+
+    python -m benchmarks.link_extractor_benchmark [html|css|all] [options]
+"""
+
+
+def benchmark(extract, docs, repeat=1):
+    """
+    Extracts the links of the documents with an extract function.
+
+    :return: (documents per second, MB per second, number of links)
+    """
+    payload_bytes = sum(len(doc) for doc in docs) * repeat
+    links = 0
+    start = time.time()
+    for _ in range(repeat):
+        for doc in docs:
+            links += len(extract(doc))
+    seconds = time.time() - start
+    return len(docs) * repeat / seconds, payload_bytes / 1048576.0 / seconds, links
+
+
+def load_stylesheets(corpus_path):
+    """
+    Returns the contents of the *.css files under a directory.
+    """
+    stylesheets = []
+    for (dirpath, _, filenames) in os.walk(corpus_path):
+        for filename in filenames:
+            if filename.endswith(".css"):
+                with open(os.path.join(dirpath, filename)) as css_file:
+                    stylesheets.append(css_file.read())
+    return stylesheets
+
+
+def _cssutils_extract(css):
+    sheet = cssutils.parseString(css)
+    return list(cssutils.getUrls(sheet))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark extracting links from web pages and stylesheets.")
+    parser.add_argument("benchmark", choices=("html", "css", "all"), nargs="?", default="all")
+    parser.add_argument("--pages", type=int, default=100, help="Number of distinct web pages.")
+    parser.add_argument("--images-per-page", type=int, default=50)
+    parser.add_argument("--page-size", type=int, default=50000, help="Approximate size of web pages in bytes.")
+    parser.add_argument("--css-corpus", help="Directory containing stylesheets. If omitted, synthetic stylesheets.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of times to extract the links of each document.")
+    args = parser.parse_args()
+
+    #BeautifulSoup warns about guessing the parser.
+    warnings.simplefilter("ignore")
+    if args.benchmark in ("html", "all"):
+        scale = Scale(web_pages=args.pages, images_per_page=args.images_per_page, page_size=args.page_size)
+        test_pages = [_page(scale, page_id) for page_id in range(args.pages)]
+        for extractor_name in sorted(LINK_EXTRACTORS):
+            print "html %s: %.1f pages/sec (%.2f MB/sec); %s links" % (
+                (extractor_name,) + benchmark(LINK_EXTRACTORS[extractor_name], test_pages, repeat=args.repeat))
+
+    if args.benchmark in ("css", "all"):
+        if args.css_corpus:
+            test_stylesheets = load_stylesheets(args.css_corpus)
+        else:
+            test_stylesheets = [_stylesheet(str(stylesheet_id)) for stylesheet_id in range(args.pages)]
+        extractors = [("tokenizer", extract_css_links)]
+        try:
+            import cssutils
+            #cssutils logs every property it doesn't know.
+            cssutils.log.setLevel(logging.CRITICAL)
+            extractors.append(("cssutils", _cssutils_extract))
+        except ImportError:
+            print "cssutils is not installed, so not comparing."
+        for (extractor_name, extract) in extractors:
+            print "css %s: %.1f stylesheets/sec (%.2f MB/sec); %s links" % (
+                (extractor_name,) + benchmark(extract, test_stylesheets, repeat=args.repeat))
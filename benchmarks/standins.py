@@ -0,0 +1,306 @@
+import logging
+import BaseHTTPServer
+import SocketServer
+import socket
+import sys
+import threading
+import json
+import urlparse
+import requests.adapters
+
+log = logging.getLogger(__name__)
+
+"""
+Local stand-ins for the Twitter REST and streaming, Tumblr, and Flickr APIs and a synthetic web of HTML, CSS, and
+image resources, for benchmarking without network access or API credentials.
+
+Responses are generated deterministically according to the scale of the stand-in server.  The web resources are
+served from /web/ and are linked to by tweets, posts, and photos, so that harvesting the APIs also harvests the web.
+
+The API clients are pointed at a stand-in server with redirect_hosts() (for clients using requests) or by setting the
+host of the client (for Tumblr).
+"""
+
+TWITTER_HOSTS = ("api.twitter.com", "stream.twitter.com")
+FLICKR_HOSTS = ("api.flickr.com",)
+
+
+class Scale():
+    """
+    Sizes of the responses of a stand-in server.
+    """
+    def __init__(self, tweet_pages=5, tweets_per_page=20, stream_tweets=10000, posts=100, photos=50,
+                 web_pages=100, images_per_page=10, page_size=20000, image_size=20000):
+        """
+        :param tweet_pages: Number of pages of each user timeline.
+        :param tweets_per_page: Number of tweets in each page of a user timeline.
+        :param stream_tweets: Number of tweets sent by the streaming API per connection.
+        :param posts: Number of posts of each Tumblr blog.
+        :param photos: Number of public photos of each Flickr user.
+        :param web_pages: Number of distinct web pages linked to.
+        :param images_per_page: Number of images in each web page.
+        :param page_size: Approximate size in bytes of each web page.
+        :param image_size: Size in bytes of each image.
+        """
+        self.tweet_pages = tweet_pages
+        self.tweets_per_page = tweets_per_page
+        self.stream_tweets = stream_tweets
+        self.posts = posts
+        self.photos = photos
+        self.web_pages = web_pages
+        self.images_per_page = images_per_page
+        self.page_size = page_size
+        self.image_size = image_size
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    A stand-in server serving all of the stand-in APIs and the synthetic web from localhost.
+    """
+    daemon_threads = True
+
+    def __init__(self, scale=None, port=0):
+        """
+        :param scale: Scale of the responses.  If None, the default scale.
+        :param port: Port to listen on.  If 0, any free port.
+        """
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", port), _StandInHandler)
+        self.scale = scale or Scale()
+        self.url = "http://127.0.0.1:%s" % self.server_port
+        self._thread = None
+        #Map of requests being handled to the threads handling them
+        self._handlers = {}
+        self._handlers_lock = threading.Lock()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="stand-in-server")
+        self._thread.daemon = True
+        self._thread.start()
+        log.info("Serving stand-ins at %s", self.url)
+        return self
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], socket.error):
+            #Ignore clients closing connections, e.g., when the stream is stopped.
+            return
+        log.debug("Error handling request from %s", client_address, exc_info=True)
+
+    def process_request(self, request, client_address):
+        thread = threading.Thread(target=self.process_request_thread, args=(request, client_address))
+        thread.daemon = self.daemon_threads
+        with self._handlers_lock:
+            self._handlers[request] = thread
+        thread.start()
+
+    def shutdown_request(self, request):
+        with self._handlers_lock:
+            self._handlers.pop(request, None)
+        BaseHTTPServer.HTTPServer.shutdown_request(self, request)
+
+    def stop(self):
+        """
+        Stops serving and waits for the threads handling requests to finish, so that none are left running at exit.
+        """
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+        with self._handlers_lock:
+            handlers = self._handlers.items()
+        for (request, thread) in handlers:
+            #Unblock handlers waiting on kept alive connections or writing to clients that have stopped reading.
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            thread.join()
+
+
+class redirect_hosts():
+    """
+    Context manager that sends requests made with requests for the hosts to a stand-in server instead.
+
+    The Host header of the original request is retained.
+    """
+    def __init__(self, server, hosts=TWITTER_HOSTS + FLICKR_HOSTS):
+        self.server = server
+        self.hosts = hosts
+
+    def __enter__(self):
+        self._send = requests.adapters.HTTPAdapter.send
+        send = self._send
+        netloc = urlparse.urlsplit(self.server.url).netloc
+        hosts = self.hosts
+
+        def redirect_send(adapter, request, **kwargs):
+            parts = urlparse.urlsplit(request.url)
+            if parts.hostname in hosts:
+                if "Host" not in request.headers:
+                    request.headers["Host"] = parts.netloc
+                request.url = urlparse.urlunsplit(("http", netloc, parts.path, parts.query, parts.fragment))
+            return send(adapter, request, **kwargs)
+        requests.adapters.HTTPAdapter.send = redirect_send
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        requests.adapters.HTTPAdapter.send = self._send
+        return False
+
+
+class _StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    #Keep-alive
+    protocol_version = "HTTP/1.1"
+    #Buffer responses and send them without delay, as a real server would.  Otherwise, delayed acks slow down
+    #keep-alive connections.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._route(send_body=True)
+
+    def do_HEAD(self):
+        self._route(send_body=False)
+
+    def do_POST(self):
+        self._route(send_body=True)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _route(self, send_body):
+        parts = urlparse.urlsplit(self.path)
+        params = dict(urlparse.parse_qsl(parts.query))
+        if self.command == "POST":
+            length = int(self.headers.getheader("Content-Length") or 0)
+            params.update(urlparse.parse_qsl(self.rfile.read(length)))
+        path = parts.path
+        scale = self.server.scale
+        base_url = self.server.url
+        if path == "/1.1/statuses/user_timeline.json":
+            page = int(params.get("page", 1))
+            count = int(params.get("count") or scale.tweets_per_page)
+            tweets = []
+            if page <= scale.tweet_pages:
+                first_id = (scale.tweet_pages - page + 1) * count
+                tweets = [_tweet(base_url, scale, first_id - i, params.get("screen_name"))
+                          for i in range(count)]
+            self._respond("application/json", json.dumps(tweets), send_body)
+        elif path == "/1.1/statuses/filter.json" or path == "/1.1/statuses/sample.json":
+            self._stream(base_url, scale)
+        elif path.startswith("/v2/blog/") and path.endswith("/info"):
+            blog_name = path.split("/")[3]
+            self._respond("application/json", json.dumps(
+                {"meta": {"status": 200, "msg": "OK"},
+                 "response": {"blog": {"name": blog_name, "title": blog_name, "posts": scale.posts}}}), send_body)
+        elif path.startswith("/v2/blog/") and path.endswith("/posts"):
+            offset = int(params.get("offset", 0))
+            limit = int(params.get("limit", 20))
+            posts = [_post(base_url, scale, scale.posts - i) for i in range(offset, min(offset + limit, scale.posts))]
+            self._respond("application/json", json.dumps(
+                {"meta": {"status": 200, "msg": "OK"},
+                 "response": {"posts": posts, "total_posts": scale.posts}}), send_body)
+        elif path == "/services/rest/":
+            self._respond("application/json", json.dumps(_flickr(base_url, scale, params)), send_body)
+        elif path.startswith("/web/page/"):
+            self._respond("text/html; charset=utf-8", _page(scale, int(path[10:].split(".")[0])), send_body)
+        elif path.startswith("/web/css/"):
+            self._respond("text/css", _stylesheet(path[9:].split(".")[0]), send_body)
+        elif path.startswith("/web/js/"):
+            self._respond("application/javascript", "var benchmark = true;\n" * 50, send_body)
+        elif path.startswith("/web/img/"):
+            self._respond("image/jpeg", "\xff" * scale.image_size, send_body)
+        elif path.startswith("/web/doc/"):
+            self._respond("application/pdf", "%PDF-1.4\n" + "0" * scale.image_size, send_body)
+        else:
+            self._respond("text/plain", "Not found", send_body, status=404)
+
+    def _respond(self, content_type, body, send_body, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def _stream(self, base_url, scale):
+        #Length delimited tweets, as with delimited=length.  The connection is closed at the end.
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = 1
+        for i in range(scale.stream_tweets):
+            tweet = json.dumps(_tweet(base_url, scale, i + 1, "stream")) + "\r\n"
+            self.wfile.write("%s\r\n%s" % (len(tweet), tweet))
+
+
+def _tweet(base_url, scale, tweet_id, screen_name):
+    page_url = "%s/web/page/%s.html" % (base_url, tweet_id % scale.web_pages)
+    return {
+        "id": tweet_id,
+        "id_str": str(tweet_id),
+        "text": "Benchmark tweet %s %s" % (tweet_id, page_url),
+        "created_at": "Mon Jan 05 15:00:00 +0000 2015",
+        "user": {"id": 1, "screen_name": screen_name},
+        "entities": {
+            "hashtags": [],
+            "urls": [{"url": page_url, "expanded_url": page_url, "display_url": page_url}],
+            "media": [{"media_url": "%s/web/img/tweet-%s.jpg" % (base_url, tweet_id)}]
+        }
+    }
+
+
+def _post(base_url, scale, post_id):
+    if post_id % 2:
+        return {"id": post_id, "type": "photo",
+                "photos": [{"alt_sizes": [{"url": "%s/web/img/post-%s.jpg" % (base_url, post_id)}]}]}
+    return {"id": post_id, "type": "text",
+            "body": '<p>Benchmark post <a href="%s/web/page/%s.html">link</a> <img src="%s/web/img/post-%s.jpg"/></p>'
+                    % (base_url, post_id % scale.web_pages, base_url, post_id)}
+
+
+def _flickr(base_url, scale, params):
+    method = params.get("method")
+    if method == "flickr.people.findByUsername":
+        return {"user": {"id": params["username"], "nsid": params["username"]}, "stat": "ok"}
+    elif method == "flickr.people.getInfo":
+        return {"person": {"id": params["user_id"], "nsid": params["user_id"]}, "stat": "ok"}
+    elif method == "flickr.people.getPublicPhotos":
+        per_page = int(params.get("per_page") or 100)
+        page = int(params.get("page", 1))
+        pages = max(1, (scale.photos + per_page - 1) // per_page)
+        photos = [{"id": str(photo_id), "secret": "secret%s" % photo_id}
+                  for photo_id in range(scale.photos - (page - 1) * per_page,
+                                        max(0, scale.photos - page * per_page), -1)]
+        return {"photos": {"page": page, "pages": pages, "perpage": per_page, "total": scale.photos,
+                           "photo": photos}, "stat": "ok"}
+    elif method == "flickr.photos.getInfo":
+        return {"photo": {"id": params["photo_id"], "secret": params.get("secret")}, "stat": "ok"}
+    elif method == "flickr.photos.getSizes":
+        return {"sizes": {"size": [{"label": label, "source": "%s/web/img/photo-%s-%s.jpg"
+                                                               % (base_url, params["photo_id"], label)}
+                                   for label in ("Thumbnail", "Medium", "Large", "Original")]}, "stat": "ok"}
+    return {"stat": "fail", "code": 112, "message": "Method \"%s\" not found" % method}
+
+
+def _page(scale, page_id):
+    parts = ['<html><head><title>Page %s</title>' % page_id,
+             '<link rel="stylesheet" href="/web/css/%s.css">' % (page_id % 10),
+             '<script type="text/javascript" src="/web/js/%s.js"></script>' % (page_id % 10),
+             '</head><body>']
+    for i in range(scale.images_per_page):
+        parts.append('<p><img src="/web/img/page-%s-%s.jpg" alt="Image %s"></p>' % (page_id, i, i))
+    parts.append('<p><a href="/web/doc/%s.pdf">Document</a> <a href="/web/page/%s.html">Next</a></p>'
+                 % (page_id, (page_id + 1) % scale.web_pages))
+    size = sum(len(part) for part in parts)
+    if size < scale.page_size:
+        parts.append("<p>%s</p>" % ("Lorem ipsum dolor sit amet. " * ((scale.page_size - size) // 28 + 1)))
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def _stylesheet(stylesheet_id):
+    rules = ['@import url("/web/css/base.css");'] if stylesheet_id != "base" else []
+    for i in range(5):
+        rules.append(".c%s { background: url(/web/img/css-%s-%s.jpg) no-repeat; color: #333; }"
+                     % (i, stylesheet_id, i))
+    return "\n".join(rules)
@@ -0,0 +1,150 @@
+from __future__ import absolute_import
+import logging
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+import warc as ia_warc
+from socialfeedharvester.fetchables.twitter import TWEET_URL_EXTRACTORS
+from socialfeedharvester.warc import WarcWriter
+
+log = logging.getLogger(__name__)
+
+"""
+Benchmarks extracting the urls linked to by tweets from stream WARC files with each tweet url extractor.
+
+The stream WARC files are either given, e.g., WARC files written by twh, or else a synthetic stream WARC file of
+tweets shaped like those of the Twitter streaming API (users with urls, retweets, and delete notices) is written.
+
+Invoke with:
+
+    python -m benchmarks.tweet_extraction_benchmark [options] [WARC file ...]
+"""
+
+STREAM_URL = "https://stream.twitter.com/1.1/statuses/filter.json"
+
+
+def benchmark(extract, warc_filepaths):
+    """
+    Extracts the urls of the tweets of the response and continuation records of WARC files with an extract function.
+
+    :return: (MB of payload per second, number of urls, number of malformed tweets)
+    """
+    payload_bytes = 0
+    urls = []
+    malformed_count = 0
+    start = time.time()
+    for warc_filepath in warc_filepaths:
+        warc_file = ia_warc.open(warc_filepath)
+        try:
+            for warc_record in warc_file:
+                if warc_record.type in ("continuation", "response"):
+                    payload_bytes += warc_record.header.content_length
+                    malformed_count += extract(warc_record, urls)
+        finally:
+            warc_file.close()
+    seconds = time.time() - start
+    return payload_bytes / 1048576.0 / seconds, len(urls), malformed_count
+
+
+def write_stream_warc(warc_filepath, tweets, tweets_per_record):
+    """
+    Writes a synthetic stream WARC file, as written by twh.
+    """
+    warc_writer = WarcWriter(warc_filepath, compresslevel=6)
+    lines = []
+    segment = 1
+    for tweet_id in range(1, tweets + 1):
+        lines.append(json.dumps(_tweet(tweet_id), separators=(",", ":")) + "\r\n")
+        if tweet_id % 50 == 0:
+            lines.append(json.dumps({"delete": {"status": {"id": tweet_id - 1, "user_id": 1}}}) + "\r\n")
+        if len(lines) >= tweets_per_record or tweet_id == tweets:
+            headers = {"WARC-Target-URI": STREAM_URL}
+            if segment == 1:
+                headers["WARC-Type"] = "response"
+                payload = "HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n" + "".join(lines)
+            else:
+                headers["WARC-Type"] = "continuation"
+                payload = "".join(lines)
+            warc_writer.write_record(ia_warc.WARCRecord(payload=payload, headers=headers))
+            lines = []
+            segment += 1
+    warc_writer.close()
+
+
+def _entities(tweet_id, url_count):
+    return OrderedDict([
+        ("hashtags", [{"text": "benchmark", "indices": [0, 10]}]),
+        ("symbols", []),
+        ("user_mentions", [{"screen_name": "user%s" % (tweet_id % 100), "id": tweet_id % 100, "indices": [11, 20]}]),
+        ("urls", [{"url": "https://t.co/%s%s" % (tweet_id, i),
+                   "expanded_url": "http://example.com/%s/%s" % (tweet_id, i),
+                   "display_url": "example.com/%s/%s" % (tweet_id, i), "indices": [21, 44]}
+                  for i in range(url_count)])
+    ])
+
+
+def _user(user_id):
+    return OrderedDict([
+        ("id", user_id), ("id_str", str(user_id)), ("name", u"Benchmark üser %s" % user_id),
+        ("screen_name", "user%s" % user_id), ("location", "Washington, DC"),
+        ("url", "https://t.co/u%s" % user_id),
+        ("description", "A {benchmark} user with \"quotes\" and [brackets]."),
+        ("entities", OrderedDict([
+            ("url", {"urls": [{"url": "https://t.co/u%s" % user_id,
+                               "expanded_url": "http://user%s.example.com/" % user_id, "indices": [0, 23]}]}),
+            ("description", {"urls": []})])),
+        ("followers_count", 100), ("friends_count", 100), ("statuses_count", 1000),
+        ("created_at", "Mon Jan 05 15:00:00 +0000 2015"), ("profile_background_color", "C0DEED"),
+        ("profile_image_url", "http://pbs.twimg.com/profile_images/%s/normal.jpg" % user_id),
+        ("profile_image_url_https", "https://pbs.twimg.com/profile_images/%s/normal.jpg" % user_id),
+        ("profile_link_color", "0084B4"), ("profile_text_color", "333333"), ("verified", False)
+    ])
+
+
+def _tweet(tweet_id, retweet=True):
+    tweet = OrderedDict([
+        ("created_at", "Mon Jan 05 15:00:00 +0000 2015"), ("id", tweet_id), ("id_str", str(tweet_id)),
+        ("text", u"#benchmark @user%s Tweet — %s {with} \"json\" [syntax] http://t.co/%s" % (
+            tweet_id % 100, tweet_id, tweet_id)),
+        ("source", "<a href=\"http://twitter.com\" rel=\"nofollow\">Twitter Web Client</a>"),
+        ("truncated", False), ("in_reply_to_status_id", None), ("user", _user(tweet_id % 1000)),
+        ("geo", None), ("coordinates", None), ("place", None)])
+    #A third are retweets, which have the entities of the retweeted tweet as well.
+    if retweet and tweet_id % 3 == 0:
+        tweet["retweeted_status"] = _tweet(tweet_id * 1000, retweet=False)
+    tweet["retweet_count"] = 0
+    tweet["favorite_count"] = 0
+    tweet["entities"] = _entities(tweet_id, tweet_id % 3)
+    tweet["favorited"] = False
+    tweet["retweeted"] = False
+    tweet["filter_level"] = "low"
+    tweet["lang"] = "en"
+    tweet["timestamp_ms"] = "1420470000000"
+    return tweet
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark extracting the urls of tweets from stream WARC files.")
+    parser.add_argument("warc_filepaths", nargs="*", metavar="WARC file",
+                        help="Stream WARC files. If omitted, a synthetic stream WARC file.")
+    parser.add_argument("--tweets", type=int, default=50000, help="Number of tweets in the synthetic WARC file.")
+    parser.add_argument("--tweets-per-record", type=int, default=25000)
+    args = parser.parse_args()
+
+    tmp_path = None
+    warc_filepaths = args.warc_filepaths
+    if not warc_filepaths:
+        tmp_path = tempfile.mkdtemp()
+        warc_filepaths = [os.path.join(tmp_path, "stream.warc.gz")]
+        write_stream_warc(warc_filepaths[0], args.tweets, args.tweets_per_record)
+    try:
+        for extractor_name in sorted(TWEET_URL_EXTRACTORS):
+            print "%s: %.2f MB/sec; %s urls; %s malformed" % (
+                (extractor_name,) + benchmark(TWEET_URL_EXTRACTORS[extractor_name], warc_filepaths))
+    finally:
+        if tmp_path:
+            shutil.rmtree(tmp_path)
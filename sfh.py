@@ -1,27 +1,63 @@
 import logging
 import time
+import collections
 import os
+import threading
 import argparse
+import multiprocessing
 import json
 from socialfeedharvester.fetchables.tumblr import Blog
-from socialfeedharvester.fetchables.twitter import TweetWarc, UserTimeline
+from socialfeedharvester.fetchables.twitter import TweetWarcs, UserTimeline
 from socialfeedharvester.fetchables.flickr import User
-from socialfeedharvester.fetchables.resource import Resource, UnknownResource
+from socialfeedharvester.fetchables.resource import Resource, UnknownResource, Html
+from socialfeedharvester.fetchables.link_extractor import LINK_EXTRACTORS
+from socialfeedharvester.fetchables.utilities import fetch_iter
 from config import wait
-from socialfeedharvester.fetchable_queue import FetchableDeque
-from socialfeedharvester.harvest_state_store import DictHarvestStateStore, JsonHarvestStateStore
+from socialfeedharvester.fetchable_queue import FetchableDeque, SqliteFetchableQueue, FairFetchableQueue
+from socialfeedharvester.harvest_state_store import DictHarvestStateStore, JsonHarvestStateStore, SqliteHarvestStateStore
 from socialfeedharvester.fetch_strategy import DefaultFetchStrategy
-from socialfeedharvester.warc import DryRunWarcWriter, WarcWriter
-import socialfeedharvester.utilities as utilities
+from socialfeedharvester.warc import AsyncWarcWriter, DryRunWarcWriter, RotatingWarcWriter, to_revisit_record
+from socialfeedharvester.fetch_pool import FetchPool
+from socialfeedharvester.host_scheduler import HostScheduler
+from socialfeedharvester.url_index import FingerprintUrlIndex, BloomFilterUrlIndex
+from socialfeedharvester.capture_index import DictCaptureIndex, SqliteCaptureIndex
+from socialfeedharvester.redirect_cache import DictRedirectCache, SqliteRedirectCache
+from socialfeedharvester.digest_index import DictDigestIndex, SqliteDigestIndex
+from socialfeedharvester.metrics import MetricsRegistry
+from socialfeedharvester.profiler import NullFetchProfiler, FetchProfiler
+from socialfeedharvester.session_pool import SessionPool
 
 log = logging.getLogger("socialfeedharvester")
 
 
 class SocialFeedHarvester():
     def __init__(self, seeds, auths=None,
-                 fetchable_queue=None, harvest_state_store=None, fetch_strategy=None, warc_writer=None):
+                 fetchable_queue=None, harvest_state_store=None, fetch_strategy=None, warc_writer=None,
+                 host_scheduler=None, url_index=None, capture_index=None, workers=1, resume=False,
+                 checkpoint_interval=None, metrics=None, metrics_filepath=None, profiler=None, session_pool=None,
+                 sniff_content_type=False, redirect_cache=None, digest_index=None, deduplicate=True,
+                 extraction_processes=1):
+        """
+        :param workers: Number of fetchables to fetch concurrently.  If 1, fetchables are fetched serially.
+        :param resume: If True, resume fetching the fetchables persisted in the queue by a previous harvest instead of
+        queueing the seeds.
+        :param checkpoint_interval: Number of seconds between checkpoints of the queue and harvest state.  If None,
+        only checkpoint when the fetch ends.
+        :param metrics: Metrics registry to record metrics of the harvest in.
+        :param metrics_filepath: Filepath to write the metrics to in the Prometheus text format on each checkpoint and
+        when the fetch ends.
+        :param profiler: Fetch profiler to profile fetches with.
+        :param session_pool: Session pool providing the sessions used to fetch resources.
+        :param sniff_content_type: If True, unknown resources are fetched with a single GET and processed according to
+        their content type rather than a HEAD followed by a GET.
+        :param redirect_cache: Redirect cache of urls resolved in this and previous harvests.
+        :param digest_index: Digest index of payloads archived in this and previous harvests.
+        :param deduplicate: If True, revisit records are written instead of response records for payloads that have
+        already been archived.
+        :param extraction_processes: Number of processes to extract the urls of tweets from stream WARC files with.
+        """
         #Queue
-        if fetchable_queue:
+        if fetchable_queue is not None:
             self._fetchable_queue = fetchable_queue
         else:
             log.debug("No fetchable queue provided so using FetchableDeque.")
@@ -49,13 +85,79 @@ class SocialFeedHarvester():
             log.debug("No warc writer provided so using a DryRunWarcWriter")
             self._warc_writer = DryRunWarcWriter()
 
-        #Fetched is list of urls that have already been fetched in this harvest.
-        self._fetched = []
+        #Host scheduler
+        if host_scheduler is not None:
+            self._host_scheduler = host_scheduler
+        else:
+            log.debug("No host scheduler provided so using HostScheduler.")
+            self._host_scheduler = HostScheduler(wait)
+
+        #Url index of urls that have already been fetched in this harvest.
+        if url_index is not None:
+            self._fetched = url_index
+        else:
+            log.debug("No url index provided so using FingerprintUrlIndex.")
+            self._fetched = FingerprintUrlIndex()
+
+        #Capture index of urls captured in this and previous harvests.
+        if capture_index:
+            self._capture_index = capture_index
+        else:
+            log.debug("No capture index provided so using DictCaptureIndex.")
+            self._capture_index = DictCaptureIndex()
+
+        #Redirect cache of urls resolved in this and previous harvests.
+        if redirect_cache is not None:
+            self._redirect_cache = redirect_cache
+        else:
+            log.debug("No redirect cache provided so using DictRedirectCache.")
+            self._redirect_cache = DictRedirectCache()
+
+        #Digest index of payloads archived in this and previous harvests.
+        if digest_index is not None:
+            self._digest_index = digest_index
+        else:
+            log.debug("No digest index provided so using DictDigestIndex.")
+            self._digest_index = DictDigestIndex()
+        self._deduplicate = deduplicate
+
+        #Metrics
+        self.metrics = metrics or MetricsRegistry()
+        self._metrics_filepath = metrics_filepath
+        self._last_gauges = 0
+        #Map of id of fetchable to (time fetch started, depth)
+        self._fetch_started = {}
+
+        #Sessions shared by resources
+        if session_pool is not None:
+            self._session_pool = session_pool
+        else:
+            log.debug("No session pool provided so using SessionPool.")
+            self._session_pool = SessionPool()
+
+        #Profiling
+        self._profiler = profiler or NullFetchProfiler()
+
+        self.sniff_content_type = sniff_content_type
+        self.extraction_processes = extraction_processes
+
+        #Concurrency
+        self._workers = workers
+        #Guards fetched and harvest state store, which may be accessed by fetch workers.
+        self._lock = threading.RLock()
+
+        #Checkpoints
+        self._checkpoint_interval = checkpoint_interval
+        self._last_checkpoint = time.time()
 
         #Auths
         self._auths = auths or {}
 
-        #Queue based on seeds
+        #Queue based on seeds, unless resuming
+        resumed_count = self._fetchable_queue.open(self, resume=resume)
+        if resume and resumed_count:
+            log.info("Resuming previous harvest, so not queueing seeds.")
+            seeds = []
         for seed in seeds:
             seed_type = seed["type"]
             #Remove type from seed
@@ -86,12 +188,20 @@ class SocialFeedHarvester():
         log.debug("Queueing %s.", blog)
         self._queue_fetchables(blog)
 
-    def queue_twitter_stream(self, name):
-        stream_dir = "%s/%s" % (self.data_path, name)
-        for w in os.listdir(stream_dir):
-            tweet_warc = TweetWarc("%s/%s" % (stream_dir, w), self)
-            log.debug("Queueing %s.", tweet_warc)
-            self._queue_fetchables(tweet_warc)
+    def queue_twitter_stream(self, name, data_path):
+        """
+        Queue the WARC files of a stream harvested by twh to have the urls of their tweets fetched.
+
+        :param name: name of the stream.
+        :param data_path: data path of the stream's collection, which contains the links to the stream's WARC files.
+        """
+        #The WARC files are extracted together, so that they can be extracted in parallel.
+        stream_dir = "%s/%s" % (data_path, name)
+        filepaths = ["%s/%s" % (stream_dir, w) for w in sorted(os.listdir(stream_dir))]
+        if filepaths:
+            tweet_warcs = TweetWarcs(filepaths, self)
+            log.debug("Queueing %s.", tweet_warcs)
+            self._queue_fetchables(tweet_warcs)
 
     def queue_resource(self, url):
         resource = Resource(url, self)
@@ -121,60 +231,292 @@ class SocialFeedHarvester():
         log.info("Starting fetch.")
 
         try:
-            last_hostname = None
-            for (fetchable, depth) in ((f, d) for (f, d) in self._fetchable_queue
-                                       if self._fetch_strategy.fetch_decision(f, d)):
-                    sleep_msg = "without sleep"
-                    if last_hostname == fetchable.hostname:
-                        time.sleep(wait)
-                        sleep_msg = "with sleep"
-                    last_hostname = fetchable.hostname
-
-                    log.debug("Fetching %s (depth %s) %s", fetchable, depth, sleep_msg)
-                    (warc_records, linked_fetchables) = fetchable.fetch()
-                    if linked_fetchables:
-                        #Depth incremented except for linked fetchables from UnknownResources
-                        self._queue_fetchables(linked_fetchables,
-                                               depth+1 if not isinstance(fetchable, UnknownResource) else depth)
-                    if warc_records:
-                        for warc_record in warc_records:
-                            log.debug("Writing %s for %s", warc_record.type, fetchable)
-                            self._warc_writer.write_record(warc_record)
-                            #Add to fetched.
-                            if "WARC-Target-URI" in warc_record.header:
-                                self._fetched.append(warc_record.header["WARC-Target-URI"])
-
+            if self._workers > 1:
+                self._fetch_concurrently()
+            else:
+                self._fetch_serially()
         finally:
-            self._warc_writer.close()
+            try:
+                #Allows resuming if fetching was not completed.
+                self.checkpoint()
+            finally:
+                self._warc_writer.close()
+            log.info("Harvest metrics:\n%s", self.metrics.summary())
         log.info("Fetching complete.")
 
         #Save state
         self._harvest_state_store.close()
+        self._capture_index.close()
+        self._redirect_cache.close()
+        self._digest_index.close()
+        self._session_pool.close()
+
+    def checkpoint(self):
+        """
+        Persist the warc records, queue, and harvest state so that an interrupted harvest can be resumed.
+        """
+        log.debug("Checkpointing.")
+        with self.metrics.timer("sfh_checkpoint_seconds"):
+            with self._lock:
+                #Records must be on disk before the fetchables and captures that refer to them are committed.
+                self._warc_writer.flush()
+                self._fetchable_queue.checkpoint()
+                self._harvest_state_store.checkpoint()
+                self._capture_index.checkpoint()
+                self._redirect_cache.checkpoint()
+                self._digest_index.checkpoint()
+        self._last_checkpoint = time.time()
+        self._update_gauges(force=True)
+        if self._metrics_filepath:
+            self.metrics.write_textfile(self._metrics_filepath)
+
+    def _checkpoint_if_due(self):
+        if self._checkpoint_interval is not None \
+                and time.time() - self._last_checkpoint >= self._checkpoint_interval:
+            self.checkpoint()
+
+    def _fetch_serially(self):
+        while True:
+            fetchable_and_depth = self._next_ready_fetchable()
+            if fetchable_and_depth is None:
+                #Nothing queued or held, so done.
+                if not len(self._host_scheduler):
+                    break
+                #Only sleep when every held fetchable is waiting on its host.
+                wait = self._host_scheduler.time_until_ready()
+                if wait is None:
+                    self._stop_with_held_fetchables()
+                    break
+                time.sleep(wait)
+                continue
+            (fetchable, depth) = fetchable_and_depth
+            log.debug("Fetching %s (depth %s)", fetchable, depth)
+            self._fetch_started[id(fetchable)] = (time.time(), depth)
+            succeeded = False
+            try:
+                with self._profiler.profile(fetchable):
+                    #Results of streaming fetchables are processed as they are fetched.
+                    for (warc_records, linked_fetchables) in fetch_iter(fetchable):
+                        self._process_fetch_results(fetchable, depth, warc_records, linked_fetchables)
+                succeeded = True
+            finally:
+                self._host_scheduler.release(fetchable)
+                self._record_fetch(fetchable, succeeded)
+            self._fetchable_queue.task_done(fetchable)
+            self._checkpoint_if_due()
+
+    def _fetch_concurrently(self):
+        log.debug("Fetching with %s workers.", self._workers)
+        pool = FetchPool(self._workers, profiler=self._profiler)
+        try:
+            while True:
+                #Keep the workers busy
+                while pool.has_capacity():
+                    fetchable_and_depth = self._next_ready_fetchable()
+                    if fetchable_and_depth is None:
+                        break
+                    self._fetch_started[id(fetchable_and_depth[0])] = (time.time(), fetchable_and_depth[1])
+                    pool.submit(*fetchable_and_depth)
+                #Nothing queued, held or being fetched, so done.
+                if not pool.pending and not len(self._host_scheduler):
+                    break
+                #Wait for a fetch to complete or a held fetchable's host to be ready.
+                if pool.pending:
+                    result = pool.next_result(timeout=self._host_scheduler.time_until_ready())
+                else:
+                    wait = self._host_scheduler.time_until_ready()
+                    if wait is None:
+                        self._stop_with_held_fetchables()
+                        break
+                    time.sleep(wait)
+                    result = None
+                if result is None:
+                    continue
+                (fetchable, depth, results, exc_info, done) = result
+                if results:
+                    (warc_records, linked_fetchables) = results
+                    with self._profiler.profile(fetchable):
+                        self._process_fetch_results(fetchable, depth, warc_records, linked_fetchables)
+                if done:
+                    self._host_scheduler.release(fetchable)
+                    self._record_fetch(fetchable, exc_info is None)
+                    if exc_info:
+                        raise exc_info[0], exc_info[1], exc_info[2]
+                    self._fetchable_queue.task_done(fetchable)
+                    self._checkpoint_if_due()
+        finally:
+            pool.close()
+
+    def _next_ready_fetchable(self):
+        """
+        Returns the next fetchable and depth whose host is ready or None if there is none.
+
+        Fetchables taken from the queue whose host is not ready are held by the host scheduler.  Once the host scheduler
+        is full, no more fetchables are taken from the queue until held fetchables are ready.
+        """
+        fetchable_and_depth = self._host_scheduler.next_ready()
+        if fetchable_and_depth:
+            return fetchable_and_depth
+        fetchables = iter(self._fetchable_queue)
+        while not self._host_scheduler.is_full():
+            try:
+                (fetchable, depth) = next(fetchables)
+            except StopIteration:
+                break
+            if self._fetch_strategy.fetch_decision(fetchable, depth):
+                self._host_scheduler.add(fetchable, depth)
+                fetchable_and_depth = self._host_scheduler.next_ready()
+                if fetchable_and_depth:
+                    return fetchable_and_depth
+            else:
+                self._fetchable_queue.task_done(fetchable)
+        return None
+
+    def _stop_with_held_fetchables(self):
+        #No fetch is in progress to release a host, so the held fetchables can never be ready, e.g., a host with a
+        #max_per_host of 0.  They are not finished, so are fetched if the harvest is resumed.
+        log.warn("Stopping with %s held fetchables whose hosts will never be ready.", len(self._host_scheduler))
+
+    def _record_fetch(self, fetchable, succeeded):
+        """
+        Records the metrics of a completed fetch.
+        """
+        labels = {"type": fetchable.__class__.__name__, "host": getattr(fetchable, "hostname", None) or ""}
+        self.metrics.observe("sfh_fetch_seconds", time.time() - self._fetch_started.pop(id(fetchable))[0],
+                             **labels)
+        self.metrics.inc("sfh_fetches_total", **labels)
+        if not succeeded:
+            self.metrics.inc("sfh_fetch_errors_total", **labels)
+        self._update_gauges()
+
+    def _update_gauges(self, force=False):
+        #Counting the queue may not be cheap, so at most once a second.
+        if force or time.time() - self._last_gauges >= 1:
+            self.metrics.set("sfh_queue_depth", len(self._fetchable_queue))
+            self.metrics.set("sfh_held_fetchables", len(self._host_scheduler))
+            self.metrics.set("sfh_fetched_urls", len(self._fetched))
+            self._last_gauges = time.time()
+
+    def _process_fetch_results(self, fetchable, depth, warc_records, linked_fetchables):
+        if linked_fetchables:
+            self.metrics.inc("sfh_linked_fetchables_total",
+                             len(linked_fetchables) if isinstance(linked_fetchables, collections.Sequence) else 1,
+                             type=fetchable.__class__.__name__)
+            #Depth incremented except for linked fetchables from UnknownResources that were not fetched themselves,
+            #i.e., the fetchable of the resolved type.
+            self._fetchable_queue.add(linked_fetchables,
+                                      depth if isinstance(fetchable, UnknownResource) and not warc_records else depth+1,
+                                      parent=fetchable)
+        if warc_records:
+            for warc_record in warc_records:
+                if self._deduplicate and warc_record.type == "response":
+                    warc_record = self._to_revisit_record_if_archived(warc_record)
+                log.debug("Writing %s for %s", warc_record.type, fetchable)
+                with self.metrics.timer("sfh_warc_write_seconds"):
+                    self._warc_writer.write_record(warc_record)
+                self.metrics.inc("sfh_warc_records_total", type=warc_record.type)
+                self.metrics.inc("sfh_warc_bytes_total", int(warc_record.header.get("Content-Length", 0)),
+                                 type=warc_record.type)
+                #Add to fetched.
+                if "WARC-Target-URI" in warc_record.header:
+                    self.set_fetched(warc_record.header["WARC-Target-URI"])
+                    if warc_record.type in ("response", "revisit"):
+                        self.set_captured(warc_record.header["WARC-Target-URI"],
+                                          warc_record.header.get("WARC-Payload-Digest"))
+
+    def _to_revisit_record_if_archived(self, warc_record):
+        """
+        Returns a revisit record for a response record if its payload has already been archived.  Otherwise, adds the
+        payload to the digest index and returns the response record.
+        """
+        digest = warc_record.header.get("WARC-Payload-Digest")
+        if digest is None:
+            return warc_record
+        with self._lock:
+            archived = self._digest_index.get(digest)
+            if archived is None:
+                self._digest_index.add(digest, warc_record.header.get("WARC-Target-URI"), warc_record.header.date,
+                                       warc_record.header.record_id)
+                return warc_record
+        revisit_record = to_revisit_record(warc_record, *archived)
+        log.debug("Payload of %s already archived by %s", warc_record.header.get("WARC-Target-URI"), archived[0])
+        self.metrics.inc("sfh_revisit_bytes_saved_total",
+                         int(warc_record.header["Content-Length"]) - int(revisit_record.header["Content-Length"]))
+        return revisit_record
 
     def get_state(self, resource_type, key):
         """
         Get the state of a harvest for a resource from harvest state store.
         """
-        return self._harvest_state_store.get_state(resource_type, key)
+        with self._lock, self.metrics.timer("sfh_state_store_seconds", operation="get_state"):
+            return self._harvest_state_store.get_state(resource_type, key)
 
     def set_state(self, resource_type, key, value):
         """
         Set the state of a harvest for a resource in harvest state store.
         """
-        self._harvest_state_store.set_state(resource_type, key, value)
+        with self._lock, self.metrics.timer("sfh_state_store_seconds", operation="set_state"):
+            self._harvest_state_store.set_state(resource_type, key, value)
 
     def is_fetched(self, url):
         """
         Returns True if the URL has already been fetched in this harvest.
         """
-        return url in self._fetched
+        with self._lock:
+            return url in self._fetched
 
     def set_fetched(self, url):
         """
-        Adds the URL to the list of URLs that have been fetched in this harvest.
+        Adds the URL to the URLs that have been fetched in this harvest.
+        """
+        with self._lock:
+            self._fetched.add(url)
+
+    def is_captured(self, url):
+        """
+        Returns True if the URL has been captured recently enough that it should not be captured again.
+        """
+        with self._lock:
+            return self._capture_index.is_captured(url)
+
+    def set_captured(self, url, digest):
+        """
+        Adds the URL to the capture index.
+        """
+        with self._lock:
+            self._capture_index.add(url, digest)
+
+    def get_redirect(self, url):
+        """
+        Returns the resolution of a url from the redirect cache.
+
+        :return: (final url, status, content type, time resolved in seconds since epoch, archived) or None.
+        """
+        with self._lock:
+            return self._redirect_cache.get(url)
+
+    def set_redirect(self, url, final_url, status, content_type, archived=False):
+        """
+        Adds the resolution of a url to the redirect cache.
+
+        :param archived: True if the redirects were archived.
+        """
+        with self._lock:
+            self._redirect_cache.add(url, final_url, status, content_type, archived=archived)
+
+    def fetch_decision(self, fetchable, parent):
+        """
+        Returns True if the fetch strategy would fetch a fetchable in place of a parent that is being fetched, i.e., at
+        the same depth.
         """
-        if url not in self._fetched:
-            self._fetched.append(url)
+        (_, depth) = self._fetch_started[id(parent)]
+        return self._fetch_strategy.fetch_decision(fetchable, depth)
+
+    def get_session(self, url):
+        """
+        Get the requests session to use to fetch a url.
+        """
+        return self._session_pool.get_session(url)
 
     def get_auth(self, service_name):
         """
@@ -194,8 +536,63 @@ if __name__ == '__main__':
                         help="Name of the collection.")
     parser.add_argument("--dry-run", action="store_true", help="Fetch, but do not persist.")
     parser.add_argument("--ignore-state", action="store_true", help="Ignore an existing persisted state.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Resume a harvest that was interrupted instead of starting from the seeds.")
+    parser.add_argument("--checkpoint-minutes", type=float, default=5,
+                        help="Minutes between checkpoints of the queue and harvest state.")
+    parser.add_argument("--fair", action="store_true",
+                        help="Take fetchables from each seed and host in turn. The harvest cannot be resumed.")
+    parser.add_argument("--prioritize-depth", action="store_true",
+                        help="With --fair, fetch shallower fetchables first.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of fetchables to fetch concurrently.")
+    parser.add_argument("--max-per-host", type=int, default=1,
+                        help="Maximum number of concurrent fetches from the same host.")
+    parser.add_argument("--burst", type=int, default=1,
+                        help="Maximum number of fetches from the same host without waiting.")
+    parser.add_argument("--max-held", type=int, default=10000,
+                        help="Maximum number of fetchables to take from the queue and hold while waiting for their "
+                             "hosts.")
+    parser.add_argument("--timeout", type=float, default=30,
+                        help="Seconds to wait for a connection or data when fetching resources.")
+    parser.add_argument("--sniff-content-type", action="store_true",
+                        help="Fetch unknown resources with a single GET instead of a HEAD followed by a GET.")
+    parser.add_argument("--extraction-processes", type=int, default=multiprocessing.cpu_count(),
+                        help="Number of processes to extract the urls of tweets from stream WARC files with.")
+    parser.add_argument("--recapture-age", type=float,
+                        help="Do not fetch resources captured by a previous harvest within this number of days.")
+    parser.add_argument("--link-extractor", choices=sorted(LINK_EXTRACTORS), default="htmlparser",
+                        help="How to extract links from web pages. htmlparser is faster and falls back to "
+                             "beautifulsoup for pages it can't parse.")
+    parser.add_argument("--no-dedupe", action="store_true",
+                        help="Write response records for payloads already archived, instead of revisit records.")
+    parser.add_argument("--redirect-age", type=float,
+                        help="Resolve shortened urls resolved by a previous harvest longer ago than this number of "
+                             "days again. If omitted, they are not resolved again.")
+    parser.add_argument("--compress-level", type=int, choices=range(1, 10), default=9,
+                        help="Gzip compression level of the WARC, from 1 (fastest) to 9 (smallest).")
+    parser.add_argument("--warc-max-size", type=float,
+                        help="Start a new WARC file once the current WARC file reaches this number of MB.")
+    parser.add_argument("--warc-max-minutes", type=float,
+                        help="Start a new WARC file once the current WARC file has been open this number of minutes.")
+    parser.add_argument("--no-index", action="store_true",
+                        help="Do not write a CDXJ index alongside each WARC file.")
+    parser.add_argument("--warc-queue-size", type=int, default=1000,
+                        help="Number of records to queue for writing to the WARC in the background. If 0, records "
+                             "are written by the fetch workers.")
+    parser.add_argument("--url-index-capacity", type=int,
+                        help="Track fetched urls in a fixed amount of memory sized for this many urls. Some urls "
+                             "may be incorrectly skipped.")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve metrics in the Prometheus text format from this port on localhost.")
+    parser.add_argument("--metrics-file", action="store_true",
+                        help="Write metrics in the Prometheus text format to metrics.prom in the collection path.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile the harvest, writing a pstats dump and a report to the collection path.")
+    parser.add_argument("--profile-top", type=int, default=30, help="Number of functions to list in the report.")
 
     args = parser.parse_args()
+    if args.resume and (args.dry_run or args.fair):
+        parser.error("--resume cannot be used with --dry-run or --fair, since their queue is not persisted.")
 
     #Load seeds
     with open(args.seed_file) as seed_file:
@@ -203,12 +600,27 @@ if __name__ == '__main__':
 
     ww = None
     if not args.dry_run:
-        ww = WarcWriter(utilities.generate_warc_filepath(args.collection_path, args.collection_name))
+        ww = RotatingWarcWriter(args.collection_path, args.collection_name,
+                                max_size=int(args.warc_max_size * 1024 * 1024) if args.warc_max_size else None,
+                                max_minutes=args.warc_max_minutes, compresslevel=args.compress_level,
+                                index=not args.no_index)
+        if args.warc_queue_size:
+            ww = AsyncWarcWriter(ww, queue_size=args.warc_queue_size)
 
     #If ignore_state, then don't load existing harvest state store.
-    #If dry_run, don't persist on close.
-    ss = JsonHarvestStateStore(args.collection_path, load_existing=not args.ignore_state,
-                               persist_on_close=not args.dry_run)
+    #If dry_run, nothing is written to the collection path, but existing state is still used.
+    if not args.dry_run or os.path.exists(os.path.join(args.collection_path, "state.db")):
+        ss = SqliteHarvestStateStore(args.collection_path, load_existing=not args.ignore_state,
+                                     persist_on_close=not args.dry_run)
+    else:
+        ss = JsonHarvestStateStore(args.collection_path, load_existing=not args.ignore_state, persist_on_close=False)
+
+    #Unless fair, queue is persisted so that the harvest can be resumed.
+    fq = None
+    if args.fair:
+        fq = FairFetchableQueue(prioritize_depth=args.prioritize_depth)
+    elif not args.dry_run:
+        fq = SqliteFetchableQueue(args.collection_path)
 
     #Setup a fetch strategy
     fs = None
@@ -216,6 +628,53 @@ if __name__ == '__main__':
         fs = DefaultFetchStrategy(depth2_resource_types=sf["fetch_strategy"].get("depth2_resource_types"),
                                   depth3_resource_types=sf["fetch_strategy"].get("depth3_resource_types"))
 
+    #Setup a host scheduler.  Per host politeness can be overridden in the seed file.
+    hs = HostScheduler(wait, burst=args.burst, max_per_host=args.max_per_host, host_overrides=sf.get("hosts"),
+                       max_held=args.max_held)
+
+    ui = None
+    if args.url_index_capacity:
+        ui = BloomFilterUrlIndex(args.url_index_capacity)
+
+    #Captures are stored alongside state.
+    recapture_age = args.recapture_age * 24 * 60 * 60 if args.recapture_age is not None else None
+    if args.dry_run:
+        ci = DictCaptureIndex(recapture_age=recapture_age)
+    else:
+        ci = SqliteCaptureIndex(args.collection_path, recapture_age=recapture_age)
+
+    Html.link_extractor = staticmethod(LINK_EXTRACTORS[args.link_extractor])
+
+    #Redirects are stored alongside state.
+    redirect_age = args.redirect_age * 24 * 60 * 60 if args.redirect_age is not None else None
+    rc = DictRedirectCache(max_age=redirect_age) if args.dry_run \
+        else SqliteRedirectCache(args.collection_path, max_age=redirect_age)
+
+    #Digests are stored alongside state.
+    di = DictDigestIndex() if args.dry_run else SqliteDigestIndex(args.collection_path)
+
+    #Keep alive connections to each host, up to the number of concurrent fetches from a host.
+    sp = SessionPool(max_connections_per_host=args.max_per_host, timeout=args.timeout)
+
+    fp = FetchProfiler() if args.profile else None
+
+    mr = MetricsRegistry()
+    if args.metrics_port:
+        mr.serve(args.metrics_port)
+
     sfh = SocialFeedHarvester(sf["seeds"], auths=sf["auths"] if "auths" in sf else None,
-                              warc_writer=ww, harvest_state_store=ss, fetch_strategy=fs)
-    sfh.fetch()
+                              fetchable_queue=fq, warc_writer=ww, harvest_state_store=ss, fetch_strategy=fs,
+                              host_scheduler=hs, url_index=ui, capture_index=ci, workers=args.workers,
+                              resume=args.resume, checkpoint_interval=args.checkpoint_minutes * 60, metrics=mr,
+                              metrics_filepath=os.path.join(args.collection_path, "metrics.prom")
+                              if args.metrics_file else None, profiler=fp, session_pool=sp,
+                              sniff_content_type=args.sniff_content_type, redirect_cache=rc, digest_index=di,
+                              extraction_processes=args.extraction_processes,
+                              deduplicate=not args.no_dedupe)
+    if args.profile:
+        try:
+            fp.run(sfh.fetch)
+        finally:
+            fp.write(args.collection_path, top=args.profile_top)
+    else:
+        sfh.fetch()
@@ -0,0 +1,109 @@
+import logging
+import os
+import sqlite3
+import time
+
+log = logging.getLogger(__name__)
+
+"""
+A capture index keeps track of the urls that have been captured across harvests of a collection, including when they
+were captured and the digest of the payload.
+
+It is used to avoid re-capturing urls that have been captured recently.
+
+A capture index should implement the signature of DictCaptureIndex.
+
+The behavior of the capture index after close() is called is unspecified.
+
+checkpoint() may be called periodically to persist the capture index in case the harvest is interrupted.
+"""
+
+
+class DictCaptureIndex():
+    """
+    A capture index implementation backed by a dictionary and not persisted.
+    """
+    def __init__(self, recapture_age=None):
+        """
+        :param recapture_age: Number of seconds after which a url should be captured again.  If None, urls are always
+        captured again.
+        """
+        self.recapture_age = recapture_age
+        self._captures = {}
+
+    def get_capture(self, url):
+        """
+        Retrieves the most recent capture of a url.
+
+        :return: (time captured in seconds since epoch, payload digest) or None.
+        """
+        return self._captures.get(url)
+
+    def is_captured(self, url):
+        """
+        Returns True if the url has been captured within the recapture age.
+        """
+        if self.recapture_age is None:
+            return False
+        capture = self.get_capture(url)
+        return capture is not None and time.time() - capture[0] < self.recapture_age
+
+    def add(self, url, digest, captured=None):
+        """
+        Adds a capture of a url to the capture index.
+
+        :param url: The url that was captured.
+        :param digest: The payload digest of the capture.
+        :param captured: Time captured in seconds since epoch.  If None, now.
+        """
+        self._captures[url] = (captured or time.time(), digest)
+
+    def checkpoint(self):
+        """
+        Persist the capture index without closing it.
+        """
+        pass
+
+    def close(self):
+        """
+        Close the capture index.
+
+        Close should be called when the capture index is no longer needed.
+        """
+        pass
+
+
+class SqliteCaptureIndex(DictCaptureIndex):
+    """
+    A capture index implementation backed by a SQLite database.
+
+    The database is written to <collection_path>/captures.db.
+    """
+    def __init__(self, collection_path, recapture_age=None, persist_on_close=True):
+        DictCaptureIndex.__init__(self, recapture_age=recapture_age)
+        self.db_filepath = os.path.join(collection_path, "captures.db")
+        self.persist_on_close = persist_on_close
+        if not os.path.exists(collection_path):
+            log.debug("Creating %s directory.", collection_path)
+            os.makedirs(collection_path)
+        log.debug("Opening capture index %s", self.db_filepath)
+        #May be used by fetch workers. Callers are responsible for serializing access.
+        self._conn = sqlite3.connect(self.db_filepath, check_same_thread=False)
+        self._conn.execute("create table if not exists captures "
+                           "(url text primary key, captured real not null, digest text)")
+
+    def get_capture(self, url):
+        return self._conn.execute("select captured, digest from captures where url=?", (url,)).fetchone()
+
+    def add(self, url, digest, captured=None):
+        self._conn.execute("insert or replace into captures (url, captured, digest) values (?, ?, ?)",
+                           (url, captured or time.time(), digest))
+
+    def checkpoint(self):
+        if self.persist_on_close:
+            log.debug("Storing capture index to %s", self.db_filepath)
+            self._conn.commit()
+
+    def close(self):
+        self.checkpoint()
+        self._conn.close()
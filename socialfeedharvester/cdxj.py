@@ -0,0 +1,217 @@
+from __future__ import absolute_import
+import logging
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import urlparse
+from collections import OrderedDict
+import warc as ia_warc
+
+log = logging.getLogger(__name__)
+
+"""
+A CDXJ index records where each capture of a WARC file is, so that captures can be found by url with a seek rather
+than by decompressing and scanning the WARC file.
+
+Each line of a CDXJ index is:
+
+    <url key> <timestamp> {"url": ..., "mime": ..., "status": ..., "digest": ..., "length": ..., "offset": ...,
+    "filename": ...}
+
+where the url key is the SURT form of the url, the timestamp is the 14 digit WARC-Date, and offset and length are of
+the (compressed) record in the WARC file.  Lines are sorted, as expected by replay tools such as pywb.
+
+The CDXJ index of a WARC file is written alongside it, e.g., the index of collection-2015-01-05T15:00:00Z.warc.gz is
+collection-2015-01-05T15:00:00Z.cdxj.
+
+WarcWriter writes the index of a WARC file as records are written.  Lines are appended to <index>.tmp as records are
+written, and sorted into the index when the WARC file is closed.  If a harvest is interrupted, the WARC file is left
+without an index, so it is indexed by the index command below.  To index existing WARC files under a collection path,
+invoke with:
+
+    python -m socialfeedharvester.cdxj <collection path> [--processes N]
+"""
+
+#Types of records that are indexed.  Continuations are indexed so that stream payloads can be found.
+INDEXED_TYPES = ("response", "revisit", "resource", "continuation")
+
+_WARC_FILEPATH_RE = re.compile(r"\.warc(\.gz)?$")
+_CONTENT_TYPE_RE = re.compile(r"^content-type:[ \t]*([^;\r\n]*)", flags=re.IGNORECASE | re.MULTILINE)
+#Enough of the payload to include the http headers.
+PAYLOAD_HEAD_SIZE = 64 * 1024
+
+
+class CdxjWriter():
+    """
+    Writes the CDXJ index of a WARC file.
+
+    Lines are appended to a temporary file as they are added and written sorted to the index when closed.
+    """
+    def __init__(self, warc_filepath):
+        """
+        :param warc_filepath: The filepath of the WARC file being indexed.
+        """
+        self.filepath = cdxj_filepath(warc_filepath)
+        self.filename = os.path.basename(warc_filepath)
+        self._tmp_filepath = self.filepath + ".tmp"
+        self._tmp_file = open(self._tmp_filepath, "wb")
+
+    def add(self, header, payload_head, offset, length):
+        """
+        Adds a record to the index, if it is indexed.
+
+        :param header: The WARCHeader of the record.
+        :param payload_head: The start of the payload of the record, including any http headers.
+        :param offset: The offset of the record in the WARC file.
+        :param length: The length of the record in the WARC file.
+        """
+        line = to_cdxj_line(header, payload_head, offset, length, self.filename)
+        if line is not None:
+            self._tmp_file.write(line)
+            self._tmp_file.write("\n")
+
+    def flush(self):
+        """
+        Writes the lines added so far to the temporary file on disk.
+        """
+        self._tmp_file.flush()
+        os.fsync(self._tmp_file.fileno())
+
+    def close(self):
+        self._tmp_file.close()
+        with open(self._tmp_filepath, "rb") as f:
+            lines = f.readlines()
+        log.debug("Writing %s lines to %s.", len(lines), self.filepath)
+        lines.sort()
+        #Sort in the temporary file and rename, so that an index is never incomplete.
+        with open(self._tmp_filepath, "wb") as f:
+            f.writelines(lines)
+        os.rename(self._tmp_filepath, self.filepath)
+
+
+def cdxj_filepath(warc_filepath):
+    """
+    Returns the filepath of the CDXJ index of a WARC file.
+    """
+    filepath, count = _WARC_FILEPATH_RE.subn(".cdxj", warc_filepath)
+    return filepath if count else warc_filepath + ".cdxj"
+
+
+def url_key(url):
+    """
+    Returns the SURT form of a url, e.g., com,example)/path?a=1&b=2 for http://www.example.com/path?b=2&a=1.
+    """
+    parts = urlparse.urlsplit(url.strip())
+    host = (parts.hostname or "").strip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    key = ",".join(reversed(host.split(".")))
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and (parts.scheme, port) not in (("http", 80), ("https", 443)):
+        key += ":%s" % port
+    key += ")" + (parts.path or "/")
+    if parts.query:
+        key += "?" + "&".join(sorted(parts.query.split("&")))
+    return key.lower()
+
+
+def to_cdxj_line(header, payload_head, offset, length, filename):
+    """
+    Returns the CDXJ line for a record or None if the record is not indexed.
+
+    :param header: The WARCHeader of the record.
+    :param payload_head: The start of the payload of the record, including any http headers.
+    :param offset: The offset of the record in the WARC file.
+    :param length: The length of the record in the WARC file.
+    :param filename: The filename of the WARC file.
+    """
+    url = header.get("WARC-Target-URI")
+    if header.type not in INDEXED_TYPES or not url:
+        return None
+    fields = OrderedDict(url=url)
+    if header.type in ("response", "revisit") and payload_head.startswith("HTTP/"):
+        status_line = payload_head.split("\r\n", 1)[0].split()
+        http_header = payload_head[:payload_head.find("\r\n\r\n")]
+        match = _CONTENT_TYPE_RE.search(http_header)
+        if match and match.group(1).strip():
+            fields["mime"] = match.group(1).strip()
+        if len(status_line) > 1:
+            fields["status"] = status_line[1]
+    elif header.type == "resource" and header.get("Content-Type"):
+        fields["mime"] = header["Content-Type"]
+    if header.type == "revisit":
+        fields["mime"] = "warc/revisit"
+    digest = header.get("WARC-Payload-Digest")
+    if digest:
+        fields["digest"] = digest[5:] if digest.startswith("sha1:") else digest
+    fields["length"] = str(length)
+    fields["offset"] = str(offset)
+    fields["filename"] = filename
+    return "%s %s %s" % (url_key(url), re.sub(r"\D", "", header["WARC-Date"])[:14], json.dumps(fields))
+
+
+def index_warc(warc_filepath):
+    """
+    Writes the CDXJ index of an existing WARC file.
+
+    :return: The filepath of the index.
+    """
+    log.info("Indexing %s", warc_filepath)
+    cdxj_writer = CdxjWriter(warc_filepath)
+    warc_file = ia_warc.open(warc_filepath)
+    try:
+        for (warc_record, offset, length) in warc_file.browse():
+            cdxj_writer.add(warc_record.header, warc_record.payload.read(PAYLOAD_HEAD_SIZE), offset, length)
+    finally:
+        warc_file.close()
+    cdxj_writer.close()
+    return cdxj_writer.filepath
+
+
+def index_collection(collection_path, processes=None, reindex=False):
+    """
+    Writes the CDXJ indexes of the WARC files under a collection path, indexing WARC files in parallel.
+
+    :param collection_path: The path of the collection.
+    :param processes: The number of WARC files to index at a time.  If None, the number of cpus.
+    :param reindex: If True, WARC files that already have an index are indexed again.
+    :return: List of filepaths of the indexes written.
+    """
+    warc_filepaths = []
+    for (dirpath, _, filenames) in os.walk(collection_path):
+        for filename in filenames:
+            filepath = os.path.join(dirpath, filename)
+            #Skip seed links to WARC files.
+            if _WARC_FILEPATH_RE.search(filename) and not os.path.islink(filepath) \
+                    and (reindex or not os.path.exists(cdxj_filepath(filepath))):
+                warc_filepaths.append(filepath)
+    log.info("Indexing %s WARC files under %s", len(warc_filepaths), collection_path)
+    if not warc_filepaths:
+        return []
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(index_warc, sorted(warc_filepaths), chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write CDXJ indexes for the WARC files under a collection path.")
+    parser.add_argument("collection_path", help="Filepath of the collection.")
+    parser.add_argument("--processes", type=int, help="Number of WARC files to index at a time. Defaults to the "
+                                                      "number of cpus.")
+    parser.add_argument("--reindex", action="store_true", help="Index WARC files that already have an index again.")
+    parser.add_argument("--debug", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s: %(name)s --> %(message)s',
+                        level=logging.DEBUG if args.debug else logging.INFO)
+
+    for index_filepath in index_collection(args.collection_path, processes=args.processes, reindex=args.reindex):
+        print index_filepath
@@ -0,0 +1,102 @@
+import logging
+import os
+import sqlite3
+
+log = logging.getLogger(__name__)
+
+"""
+A digest index keeps track of the payloads that have been archived across harvests of a collection, by payload
+digest, including the url, date, and record id of the response record that archived each payload.
+
+It is used to write revisit records rather than response records for payloads that have already been archived.
+
+A digest index should implement the signature of DictDigestIndex.
+
+The behavior of the digest index after close() is called is unspecified.
+
+checkpoint() may be called periodically to persist the digest index in case the harvest is interrupted.
+"""
+
+
+class DictDigestIndex():
+    """
+    A digest index implementation backed by a dictionary and not persisted.
+    """
+    def __init__(self):
+        self._digests = {}
+
+    def get(self, digest):
+        """
+        Retrieves the response record that archived a payload.
+
+        :return: (url, WARC-Date, WARC-Record-ID) or None.
+        """
+        return self._digests.get(digest)
+
+    def add(self, digest, url, date, record_id):
+        """
+        Adds the response record that archived a payload to the digest index, unless the payload has already been
+        archived.
+
+        :param digest: The payload digest.
+        :param url: The target uri of the response record.
+        :param date: The WARC-Date of the response record.
+        :param record_id: The WARC-Record-ID of the response record.
+        """
+        self._digests.setdefault(digest, (url, date, record_id))
+
+    def __len__(self):
+        return len(self._digests)
+
+    def checkpoint(self):
+        """
+        Persist the digest index without closing it.
+        """
+        pass
+
+    def close(self):
+        """
+        Close the digest index.
+
+        Close should be called when the digest index is no longer needed.
+        """
+        pass
+
+
+class SqliteDigestIndex(DictDigestIndex):
+    """
+    A digest index implementation backed by a SQLite database.
+
+    The database is written to <collection_path>/digests.db.
+    """
+    def __init__(self, collection_path, persist_on_close=True):
+        DictDigestIndex.__init__(self)
+        self.db_filepath = os.path.join(collection_path, "digests.db")
+        self.persist_on_close = persist_on_close
+        if not os.path.exists(collection_path):
+            log.debug("Creating %s directory.", collection_path)
+            os.makedirs(collection_path)
+        log.debug("Opening digest index %s", self.db_filepath)
+        #May be used by fetch workers. Callers are responsible for serializing access.
+        self._conn = sqlite3.connect(self.db_filepath, check_same_thread=False)
+        self._conn.execute("create table if not exists digests "
+                           "(digest text primary key, url text not null, date text not null, record_id text)")
+
+    def get(self, digest):
+        return self._conn.execute("select url, date, record_id from digests where digest=?", (digest,)).fetchone()
+
+    def add(self, digest, url, date, record_id):
+        self._conn.execute("insert or ignore into digests (digest, url, date, record_id) values (?, ?, ?, ?)",
+                           (digest, url, date, record_id))
+
+    def __len__(self):
+        return self._conn.execute("select count(*) from digests").fetchone()[0]
+
+    def checkpoint(self):
+        if self.persist_on_close:
+            log.debug("Storing digest index to %s", self.db_filepath)
+            self._conn.commit()
+
+    def close(self):
+        self.checkpoint()
+        self._conn.close()
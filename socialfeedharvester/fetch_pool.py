@@ -0,0 +1,111 @@
+import logging
+import threading
+import sys
+import Queue
+from socialfeedharvester.fetchables.utilities import fetch_iter
+from socialfeedharvester.profiler import NullFetchProfiler
+
+log = logging.getLogger(__name__)
+
+"""
+A fetch pool fetches fetchables concurrently using a pool of worker threads.
+
+The fetch pool does not enforce politeness.  Which fetchables are submitted, and when, is left to the caller.
+"""
+
+
+class FetchPool():
+    """
+    A pool of worker threads that fetch fetchables.
+
+    Fetchables are submitted with submit() and results are retrieved with next_result().  Results are returned in the
+    order they are completed, not the order they are submitted.
+
+    Results of streaming fetchables are returned as they are fetched.  To bound memory, workers wait for results to be
+    retrieved when too many are waiting.
+    """
+    def __init__(self, workers, profiler=None):
+        """
+        :param workers: Number of worker threads.
+        :param profiler: Fetch profiler to profile fetches with.
+        """
+        self.workers = workers
+        self._profiler = profiler or NullFetchProfiler()
+        self._submitted = Queue.Queue()
+        self._completed = Queue.Queue(maxsize=workers * 2)
+        self._closing = False
+        #Number of fetchables submitted, but whose results have not been retrieved.
+        self.pending = 0
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._work, name="fetch-worker-%s" % i)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def has_capacity(self):
+        """
+        Returns True if there is an idle worker for another fetchable.
+        """
+        return self.pending < self.workers
+
+    def submit(self, fetchable, depth):
+        """
+        Submits a fetchable to be fetched by a worker.
+        """
+        self.pending += 1
+        self._submitted.put((fetchable, depth))
+
+    def next_result(self, timeout=None):
+        """
+        Blocks until results are available.
+
+        :param timeout: Maximum number of seconds to block or None to block until results are available.
+        :return: fetchable, depth, (warc records, linked fetchables) or None, exc_info if fetch raised an exception or
+        None, True if the fetch is complete.  None if timed out.
+        """
+        try:
+            result = self._completed.get(timeout=timeout)
+        except Queue.Empty:
+            return None
+        if result[4]:
+            self.pending -= 1
+        return result
+
+    def close(self):
+        """
+        Stops the worker threads once they complete their current fetch.
+        """
+        self._closing = True
+        for _ in self._threads:
+            self._submitted.put(None)
+        for thread in self._threads:
+            while thread.is_alive():
+                #Discard results so that workers are not blocked.
+                try:
+                    self._completed.get_nowait()
+                except Queue.Empty:
+                    pass
+                thread.join(0.1)
+
+    def _work(self):
+        while True:
+            item = self._submitted.get()
+            if item is None:
+                return
+            fetchable, depth = item
+            exc_info = None
+            try:
+                log.debug("Fetching %s (depth %s)", fetchable, depth)
+                with self._profiler.profile(fetchable):
+                    results_iter = fetch_iter(fetchable)
+                    for results in results_iter:
+                        if self._closing:
+                            log.debug("Stopping fetch of %s", fetchable)
+                            if hasattr(results_iter, "close"):
+                                results_iter.close()
+                            break
+                        self._completed.put((fetchable, depth, results, None, False))
+            except Exception:
+                exc_info = sys.exc_info()
+            self._completed.put((fetchable, depth, None, exc_info, True))
@@ -1,5 +1,10 @@
 import collections
 import logging
+import importlib
+import inspect
+import json
+import os
+import sqlite3
 
 log = logging.getLogger(__name__)
 
@@ -8,6 +13,9 @@ A fetchable queue provides a queue of fetchables.
 
 A fetchable queue should implement the signature of FetchableDeque.  The ordering of the queue is not significant or
 guaranteed.
+
+A fetchable taken from the queue is not finished until task_done() is called for it.  A persistent queue retains
+unfinished fetchables so that they are fetched again if the harvest is resumed.
 """
 
 
@@ -15,23 +23,34 @@ class FetchableDeque():
     """
     A fetchable queue implementation backed by a Dequeue.
 
-    For production use this will need to be backed by a persistent queue.
+    Not persisted, so a harvest using it cannot be resumed.  See SqliteFetchableQueue.
     """
 
     def __init__(self):
         self.q = collections.deque()
 
-    def add(self, fetchables, depth=1):
+    def open(self, sfh, resume=False):
+        """
+        Prepares the queue for a harvest.  Should be called before any fetchables are added.
+
+        :param sfh: The harvester, which is needed to reconstruct persisted fetchables.
+        :param resume: If True, keep fetchables persisted by a previous harvest.  Otherwise, discard them.
+        :return: Number of fetchables persisted by a previous harvest that are in the queue.
+        """
+        return 0
+
+    def add(self, fetchables, depth=1, parent=None):
         """
         Adds a single fetchable or a sequence of fetchables to the queue.
 
         :param fetchables: Fetchables to add.
         :param depth: Level of links from seed, where 1 is a seed.
+        :param parent: The fetchable taken from the queue that linked to the fetchables, if any.
         """
         if fetchables:
             if isinstance(fetchables, collections.Sequence):
                 for fetchable in fetchables:
-                    self.add(fetchable, depth)
+                    self.add(fetchable, depth, parent=parent)
             else:
                 log.debug("Adding to queue: %s (depth=%s)", fetchables, depth)
                 self.q.append((fetchables, depth))
@@ -45,4 +64,185 @@ class FetchableDeque():
     def next(self):
         if self.q:
             return self.q.popleft()
-        raise StopIteration
\ No newline at end of file
+        raise StopIteration
+
+    def task_done(self, fetchable):
+        """
+        Indicates that a fetchable taken from the queue is finished, either because it was fetched or because it was
+        not fetched.
+        """
+        pass
+
+    def checkpoint(self):
+        """
+        Persists the queue, including fetchables that have been taken from the queue but are not finished.
+        """
+        pass
+
+
+class FairFetchableQueue(FetchableDeque):
+    """
+    A fetchable queue implementation that takes fetchables in turn from each seed and, within a seed, from each host.
+
+    Fetchables linked from a fetchable belong to the same seed as that fetchable, so a seed that links to many
+    fetchables does not delay the fetchables of other seeds.  Taking from each host in turn spreads fetches across
+    hosts, so fewer fetches wait for politeness.
+
+    Optionally, fetchables at lower depths are taken before fetchables at higher depths.
+
+    Not persisted, so a harvest using it cannot be resumed.
+    """
+    def __init__(self, prioritize_depth=False):
+        """
+        :param prioritize_depth: If True, take all fetchables at a depth before any at a higher depth.
+        """
+        FetchableDeque.__init__(self)
+        self.prioritize_depth = prioritize_depth
+        #Map of depth (or None if not prioritizing depth) to map of seed to map of hostname to deque of
+        #(fetchable, depth). Maps are ordered, with the next seed or hostname to take from first.
+        self._levels = {}
+        self._count = 0
+        #Seeds of fetchables taken, but not finished, so that their linked fetchables can be assigned the same seed.
+        self._taken_seeds = {}
+        self._seed_counter = 0
+
+    def add(self, fetchables, depth=1, parent=None):
+        if fetchables:
+            if isinstance(fetchables, collections.Sequence):
+                for fetchable in fetchables:
+                    self.add(fetchable, depth, parent=parent)
+            else:
+                log.debug("Adding to queue: %s (depth=%s)", fetchables, depth)
+                if parent is not None and id(parent) in self._taken_seeds:
+                    seed = self._taken_seeds[id(parent)]
+                else:
+                    #A new seed
+                    self._seed_counter += 1
+                    seed = self._seed_counter
+                level = self._levels.setdefault(depth if self.prioritize_depth else None, collections.OrderedDict())
+                hosts = level.setdefault(seed, collections.OrderedDict())
+                hosts.setdefault(getattr(fetchables, "hostname", None), collections.deque()).append(
+                    (fetchables, depth))
+                self._count += 1
+
+    def __len__(self):
+        return self._count
+
+    def next(self):
+        if not self._count:
+            raise StopIteration
+        level_key = min(self._levels)
+        level = self._levels[level_key]
+        #Take from the first seed and its first host, then move both to the end.
+        (seed, hosts) = level.popitem(last=False)
+        (hostname, fetchables) = hosts.popitem(last=False)
+        (fetchable, depth) = fetchables.popleft()
+        if fetchables:
+            hosts[hostname] = fetchables
+        if hosts:
+            level[seed] = hosts
+        if not level:
+            del self._levels[level_key]
+        self._count -= 1
+        self._taken_seeds[id(fetchable)] = seed
+        return fetchable, depth
+
+    def task_done(self, fetchable):
+        self._taken_seeds.pop(id(fetchable), None)
+
+
+class SqliteFetchableQueue(FetchableDeque):
+    """
+    A fetchable queue implementation backed by a SQLite database.
+
+    The database is written to <collection_path>/queue.db.  Fetchables are stored as descriptors and reconstructed
+    when taken from the queue, so the queue does not hold fetchables in memory.
+
+    Changes are persisted when checkpoint() is called.
+    """
+    def __init__(self, collection_path):
+        FetchableDeque.__init__(self)
+        self.db_filepath = os.path.join(collection_path, "queue.db")
+        if not os.path.exists(collection_path):
+            log.debug("Creating %s directory.", collection_path)
+            os.makedirs(collection_path)
+        log.debug("Opening queue %s", self.db_filepath)
+        self._conn = sqlite3.connect(self.db_filepath)
+        self._conn.execute("create table if not exists queue "
+                           "(id integer primary key autoincrement, descriptor text not null, depth integer not null)")
+        self._sfh = None
+        #Id of the last row taken from the queue
+        self._last_id = 0
+        #Map of id(fetchable) to row ids of fetchables taken, but not finished
+        self._taken = collections.defaultdict(list)
+
+    def open(self, sfh, resume=False):
+        self._sfh = sfh
+        if not resume:
+            self._conn.execute("delete from queue")
+            self._conn.commit()
+        count = len(self)
+        if count:
+            log.info("Resuming with %s fetchables in queue.", count)
+        return count
+
+    def add(self, fetchables, depth=1, parent=None):
+        if fetchables:
+            if isinstance(fetchables, collections.Sequence):
+                for fetchable in fetchables:
+                    self.add(fetchable, depth, parent=parent)
+            else:
+                log.debug("Adding to queue: %s (depth=%s)", fetchables, depth)
+                self._conn.execute("insert into queue (descriptor, depth) values (?, ?)",
+                                   (json.dumps(to_descriptor(fetchables)), depth))
+
+    def __len__(self):
+        return self._conn.execute("select count(*) from queue where id > ?", (self._last_id,)).fetchone()[0]
+
+    def next(self):
+        row = self._conn.execute("select id, descriptor, depth from queue where id > ? order by id limit 1",
+                                 (self._last_id,)).fetchone()
+        if row is None:
+            raise StopIteration
+        (self._last_id, descriptor, depth) = row
+        fetchable = from_descriptor(json.loads(descriptor), self._sfh)
+        self._taken[id(fetchable)].append(self._last_id)
+        return fetchable, depth
+
+    def task_done(self, fetchable):
+        row_ids = self._taken.get(id(fetchable))
+        if row_ids:
+            self._conn.execute("delete from queue where id = ?", (row_ids.pop(0),))
+            if not row_ids:
+                del self._taken[id(fetchable)]
+
+    def checkpoint(self):
+        log.debug("Checkpointing queue to %s", self.db_filepath)
+        self._conn.commit()
+
+
+def to_descriptor(fetchable):
+    """
+    Returns a descriptor of a fetchable that can be serialized as JSON.
+
+    The descriptor contains the class of the fetchable and the values of the arguments of its constructor, which are
+    assumed to be stored as attributes of the same name.
+    """
+    clazz = fetchable.__class__
+    kwargs = {}
+    for arg in inspect.getargspec(clazz.__init__).args[1:]:
+        if arg != "sfh":
+            kwargs[arg] = getattr(fetchable, arg)
+    return {
+        "class": "%s.%s" % (clazz.__module__, clazz.__name__),
+        "kwargs": kwargs
+    }
+
+
+def from_descriptor(descriptor, sfh):
+    """
+    Reconstructs a fetchable from a descriptor.
+    """
+    (module_name, class_name) = descriptor["class"].rsplit(".", 1)
+    clazz = getattr(importlib.import_module(module_name), class_name)
+    return clazz(sfh=sfh, **descriptor["kwargs"])
\ No newline at end of file
@@ -9,4 +9,7 @@ It may also:
 A fetchable should implement the signature of resource.Resource.  This includes the class variables:
 * is_fetchable: indicating whether fetching the resource is supported.
 * hostname: the hostname of the resource to be fetched, to be used for determining delays.
+
+A fetchable that produces many warc records or linked fetchables (e.g., by paging through an API) may also stream them
+by implementing the signature of utilities.StreamingFetchMixin.
 """
\ No newline at end of file
@@ -1,9 +1,8 @@
 import flickrapi
 import logging
-import httplib as http_client
 import json
 import urlparse
-from socialfeedharvester.fetchables.utilities import ClientManager, HttpLibMixin
+from socialfeedharvester.fetchables.utilities import ClientManager, HttpLibMixin, StreamingFetchMixin
 from socialfeedharvester.fetchables.resource import Image
 from socialfeedharvester.fetchables.resource_type import FlickrType
 
@@ -12,7 +11,7 @@ log = logging.getLogger(__name__)
 FLICKR_HOST = "https://api.flickr.com"
 
 
-class User(HttpLibMixin):
+class User(StreamingFetchMixin, HttpLibMixin):
     is_fetchable = True
     hostname = urlparse.urlparse(FLICKR_HOST).hostname
 
@@ -26,7 +25,7 @@ class User(HttpLibMixin):
         #Per_page is intended for testing purposes only.
         self.per_page = per_page
 
-    def fetch(self):
+    def fetch_iter(self):
         #Lookup nsid if don't already know
         if not self.nsid:
             log.debug("Looking up nsid for %s", self.username)
@@ -36,14 +35,12 @@ class User(HttpLibMixin):
                 raise Exception("Could not find nsid for %s" % self.username)
 
         warc_records = []
-        fetchables = []
 
         #Get info on the user
         #Setting format=json will return raw json.
-        raw_json_resp, capture_out = self.wrap_execute(
-            lambda: self.api.people.getInfo(user_id=self.nsid, format='json'),
-            http_client.HTTPConnection)
-        http_headers = self.parse_capture(capture_out)
+        raw_json_resp, capture = self.wrap_execute(
+            lambda: self.api.people.getInfo(user_id=self.nsid, format='json'))
+        http_headers = self.parse_capture(capture)
         #Write request and response
         assert len(http_headers) == 2
         url = FLICKR_HOST + self.parse_url(http_headers[0])
@@ -54,6 +51,7 @@ class User(HttpLibMixin):
         #Write response
         warc_records.append(self.to_warc_record("response", url, http_body=raw_json_resp,
                                           http_header=http_headers[1]))
+        yield warc_records, None
 
         #Get first page of public photos to get number of pages and photos
         json_resp = self.api.people.getPublicPhotos(user_id=self.nsid, format='parsed-json', per_page=self.per_page)
@@ -65,12 +63,14 @@ class User(HttpLibMixin):
         #Going through pages backward
         for page in reversed(range(1,total_pages+1)):
             log.debug("Fetching %s of %s pages.", page, total_pages)
-            raw_json_resp, capture_out = self.wrap_execute(
+            raw_json_resp, capture = self.wrap_execute(
                 lambda: self.api.people.getPublicPhotos(user_id=self.nsid, format='json',
-                                                        per_page=self.per_page, page=page), http_client.HTTPConnection)
-            http_headers = self.parse_capture(capture_out)
+                                                        per_page=self.per_page, page=page))
+            http_headers = self.parse_capture(capture)
 
             json_resp = json.loads(raw_json_resp)
+            warc_records = []
+            fetchables = []
             #Going through photos backwards
             added_fetchables = False
             for photo in reversed(json_resp["photos"]["photo"]):
@@ -97,6 +97,7 @@ class User(HttpLibMixin):
                 #Write response
                 warc_records.append(self.to_warc_record("response", url, http_body=raw_json_resp,
                                                   http_header=http_headers[1]))
+            yield warc_records, fetchables
             if found_last_photo_id:
                 break
 
@@ -105,8 +106,6 @@ class User(HttpLibMixin):
             log.debug("New last photo id is %s", new_last_photo_id)
             self.sfh.set_state(__name__, "%s.last_photo_id" % self.nsid, new_last_photo_id)
 
-        return warc_records, fetchables
-
     def __str__(self):
         return "flickr user %s" % self.nsid
 
@@ -129,10 +128,9 @@ class Photo(HttpLibMixin, FlickrType):
 
         #Get info on the user
         #Setting format=json will return raw json.
-        raw_json_resp, capture_out = self.wrap_execute(
-            lambda: self.api.photos.getInfo(photo_id=self.photo_id, secret=self.secret, format='json'),
-            http_client.HTTPConnection)
-        http_headers = self.parse_capture(capture_out)
+        raw_json_resp, capture = self.wrap_execute(
+            lambda: self.api.photos.getInfo(photo_id=self.photo_id, secret=self.secret, format='json'))
+        http_headers = self.parse_capture(capture)
         #Write request and response
         assert len(http_headers) == 2
         url = FLICKR_HOST + self.parse_url(http_headers[0])
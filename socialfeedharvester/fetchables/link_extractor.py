@@ -0,0 +1,213 @@
+import logging
+import re
+import HTMLParser
+from bs4 import BeautifulSoup
+
+log = logging.getLogger(__name__)
+
+"""
+A link extractor extracts the links to the resources of a web page from its html:  images (including srcset
+candidates and urls in inline styles), stylesheets (including imports in inline styles), scripts, and pdfs.
+
+Links are returned as a list of (link type, url) in document order.  Urls are as they appear in the html, so they may
+be relative.  Data uris are omitted.
+
+A link extractor should implement the signature of extract_links.
+
+The links of stylesheets are extracted with extract_css_links():  @import targets are stylesheets and all other urls
+are images.
+"""
+
+IMAGE = "image"
+STYLESHEET = "stylesheet"
+SCRIPT = "script"
+PDF = "pdf"
+
+_PDF_RE = re.compile(r".pdf$", flags=re.IGNORECASE)
+#Tokens of css that may contain or affect links.  Everything else is skipped.
+_CSS_TOKEN_RE = re.compile(r"""
+    (?P<comment>/\*.*?(?:\*/|\Z))
+    |(?P<string>"(?:[^"\\\n]|\\.)*(?:"|$)|'(?:[^'\\\n]|\\.)*(?:'|$))
+    |(?<![\w-])(?P<url>url\(\s*(?:"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|(?:[^()"'\\\s]|\\.)*)\s*\))
+    |(?P<import>@import\b)
+    |(?P<end>[;{}])
+""", flags=re.IGNORECASE | re.DOTALL | re.VERBOSE | re.MULTILINE)
+_CSS_ESCAPE_RE = re.compile(r"\\(?:([0-9a-fA-F]{1,6})\s?|\n|(.))", flags=re.DOTALL)
+
+
+def extract_links(content):
+    """
+    Extracts links in a single pass over the html without building a document tree.
+
+    If the html is not utf-8 or cannot be parsed, falls back to extract_links_with_beautifulsoup(), which detects the
+    encoding.
+
+    :param content: The html.
+    :return: List of (link type, url).
+    """
+    parser = _LinkParser()
+    try:
+        #HTMLParser can't unescape entities in non-ascii byte strings.
+        parser.feed(content.decode("utf-8") if isinstance(content, str) else content)
+        parser.close()
+    except Exception, e:
+        log.debug("Falling back to BeautifulSoup since parsing failed: %s", e)
+        return extract_links_with_beautifulsoup(content)
+    return parser.links
+
+
+def extract_css_links(css):
+    """
+    Extracts the links of css, e.g., a stylesheet or an inline style, in a single pass over its tokens.
+
+    @import targets are stylesheets.  All other url()s are images.
+
+    :param css: The css.
+    :return: List of (link type, url).
+    """
+    links = []
+    in_import = False
+    for match in _CSS_TOKEN_RE.finditer(css):
+        token_type = match.lastgroup
+        if token_type == "url":
+            _append(links, STYLESHEET if in_import else IMAGE, _css_value(match.group()[4:-1].strip(), css))
+            in_import = False
+        elif token_type == "string":
+            #Only a string following @import is a link.
+            if in_import:
+                _append(links, STYLESHEET, _css_value(match.group(), css))
+                in_import = False
+        elif token_type == "import":
+            in_import = True
+        elif token_type == "end":
+            in_import = False
+    return links
+
+
+def extract_links_with_beautifulsoup(content):
+    """
+    Extracts links by building a document tree with BeautifulSoup.
+
+    This is slower than extract_links(), but more tolerant of malformed html.
+    """
+    doc = BeautifulSoup(content)
+    links = []
+    for elem in doc.find_all(True):
+        links.extend(_element_links(elem.name, _attr_getter(elem), elem.string if elem.name == "style" else None))
+    return links
+
+
+#Link extractors by name.
+LINK_EXTRACTORS = {
+    "htmlparser": extract_links,
+    "beautifulsoup": extract_links_with_beautifulsoup
+}
+
+
+class _LinkParser(HTMLParser.HTMLParser):
+    def __init__(self):
+        HTMLParser.HTMLParser.__init__(self)
+        self.links = []
+        self._in_style = False
+
+    def handle_starttag(self, tag, attrs):
+        self.links.extend(_element_links(tag, _attrs_getter(attrs), None))
+        if tag == "style":
+            self._in_style = True
+
+    def handle_startendtag(self, tag, attrs):
+        self.links.extend(_element_links(tag, _attrs_getter(attrs), None))
+
+    def handle_endtag(self, tag):
+        if tag == "style":
+            self._in_style = False
+
+    def handle_data(self, data):
+        if self._in_style:
+            self.links.extend(extract_css_links(data))
+
+
+def _attrs_getter(attrs):
+    def get(name):
+        for (attr_name, value) in attrs:
+            if attr_name == name:
+                return value
+        return None
+    return get
+
+
+def _attr_getter(elem):
+    def get(name):
+        value = elem.get(name)
+        #BeautifulSoup splits multi-valued attributes, e.g., rel.
+        if isinstance(value, list):
+            return " ".join(value)
+        return value
+    return get
+
+
+def _element_links(tag, get, style_content):
+    links = []
+    if tag == "img":
+        _append(links, IMAGE, get("src"))
+        links.extend(_srcset_links(get("srcset")))
+    elif tag == "source":
+        links.extend(_srcset_links(get("srcset")))
+    elif tag == "link":
+        rel = get("rel")
+        if rel and "stylesheet" in rel.lower().split():
+            _append(links, STYLESHEET, get("href"))
+    elif tag == "script":
+        _append(links, SCRIPT, get("src"))
+    elif tag == "a":
+        href = get("href")
+        if href and _PDF_RE.search(href):
+            _append(links, PDF, href)
+    elif tag == "style" and style_content:
+        links.extend(extract_css_links(style_content))
+    style = get("style")
+    if style:
+        links.extend(extract_css_links(style))
+    return links
+
+
+def _srcset_links(srcset):
+    links = []
+    if srcset:
+        #Comma-separated candidates of a url optionally followed by a descriptor.
+        for candidate in srcset.split(","):
+            parts = candidate.split()
+            if parts:
+                _append(links, IMAGE, parts[0])
+    return links
+
+
+def _css_value(value, css):
+    """
+    Returns the value of a css string or url, without quotes or escapes.
+    """
+    if value[:1] in ("'", '"'):
+        value = value[1:-1] if len(value) > 1 and value[-1] == value[0] else value[1:]
+    if "\\" in value:
+        value = _CSS_ESCAPE_RE.sub(lambda match: _css_unescape(match, isinstance(css, str)), value)
+    return value
+
+
+def _css_unescape(match, encode):
+    if match.group(1):
+        code_point = int(match.group(1), 16)
+        if 0 < code_point < 128:
+            return chr(code_point)
+        #Per the css syntax spec, null, surrogates, and code points beyond unicode are the replacement character.
+        if code_point == 0 or 0xD800 <= code_point <= 0xDFFF or code_point > 0x10FFFF:
+            code_point = 0xFFFD
+        char = ("\\U%08x" % code_point).decode("unicode-escape")
+        return char.encode("utf-8") if encode else char
+    return match.group(2) or ""
+
+
+def _append(links, link_type, url):
+    if url:
+        url = url.strip()
+        if url and not url.lower().startswith("data:"):
+            links.append((link_type, url))
@@ -1,11 +1,9 @@
 from socialfeedharvester.fetchables.utilities import HttpLibMixin
-import requests
 import logging
 import re
-from bs4 import BeautifulSoup
-import cssutils
+from socialfeedharvester.fetchables.link_extractor import extract_links, extract_css_links, IMAGE, STYLESHEET, \
+    SCRIPT, PDF
 import urlparse
-import httplib as http_client
 from socialfeedharvester.fetchables.resource_type import ImageType, DocumentType, WebPageType, AnyResourceType, \
     WebPagePartType
 
@@ -33,27 +31,47 @@ class Resource(HttpLibMixin, AnyResourceType):
     def fetch(self):
             warc_records = []
             linked_fetchables = []
-            if not self.sfh.is_fetched(self.url):
+            if self.sfh.is_captured(self.url):
+                log.debug("%s captured by a previous harvest.", self.url)
+            elif not self.sfh.is_fetched(self.url):
                 #List of responses. Due to redirects, there may be multiple responses.
                 resps = []
 
-                resp, capture_out = self.wrap_execute(
-                    lambda: requests.get(self.url, hooks={"response": lambda r, *args, **kwargs: resps.append(r)}),
-                    http_client.HTTPConnection)
-
-                if resp:
-                    linked_fetchables = self.process_resource(resp.content, resps[-1].url)
-                    for resp in resps:
-                        self.sfh.set_fetched(resp.url)
-                    warc_records = self.to_warc_records(capture_out, resps)
-                else:
-                    log.warn("Getting %s returned %s", self.url, resp.status_code)
-                    self.sfh.set_fetched(self.url)
+                session = self.sfh.get_session(self.url)
+                resp, capture = self.wrap_execute(
+                    lambda: session.get(self.url, hooks={"response": lambda r, *args, **kwargs: resps.append(r)}))
+
+                warc_records, linked_fetchables = self.process_response(resp, resps, capture)
             else:
                 log.debug("%s already fetched.", self.url)
 
             return warc_records, linked_fetchables
 
+    def process_response(self, resp, resps, capture):
+        """
+        Processes the response of getting the resource.
+
+        :param resp: The final response.  If streamed, the content is read.
+        :param resps: List of responses, including redirects.
+        :param capture: HttpCapture of getting the resource.
+        :returns List of warc records, list of linked fetchables.
+        """
+        warc_records = []
+        linked_fetchables = []
+        if resp:
+            linked_fetchables = self.process_resource(resp.content, resps[-1].url)
+            for resp in resps:
+                self.sfh.set_fetched(resp.url)
+            warc_records = self.to_warc_records(capture, resps)
+            if len(resps) > 1:
+                #Redirected, e.g., a shortened url
+                self.sfh.set_redirect(self.url, resps[-1].url, resps[-1].status_code,
+                                      resps[-1].headers.get("content-type"), archived=True)
+        else:
+            log.warn("Getting %s returned %s", self.url, resp.status_code)
+            self.sfh.set_fetched(self.url)
+        return warc_records, linked_fetchables
+
     def process_resource(self, content, url):
         """
         Override this to perform additional processing of the content, e.g., to queue additional fetches.
@@ -79,16 +97,13 @@ class Stylesheet(Resource, WebPagePartType):
 
     def process_resource(self, content, url):
         try:
-            sheet = cssutils.parseString(content, href=url)
+            links = extract_css_links(content)
         except Exception:
             log.warn("Error parsing %s", url)
             return
-
         linked_fetchables = []
-        for img_url in cssutils.getUrls(sheet):
-            #Ignore data: uris
-            if not img_url.startswith("data:"):
-                linked_fetchables.append(Image(urlparse.urljoin(url, img_url), self.sfh))
+        for (link_type, link_url) in links:
+            linked_fetchables.append(_LINK_TYPE_CLASSES[link_type](urlparse.urljoin(url, link_url), self.sfh))
 
         return linked_fetchables
 
@@ -99,36 +114,35 @@ class Script(Resource, WebPagePartType):
 
 
 class Html(Resource, WebPageType):
+    #Link extractor used to find the images, stylesheets, scripts and pdfs of the page.  See link_extractor.
+    link_extractor = staticmethod(extract_links)
+
     def __init__(self, url, sfh):
         Resource.__init__(self, url, sfh)
 
     def process_resource(self, content, url):
         try:
-            doc = BeautifulSoup(content)
+            links = self.link_extractor(content)
         except Exception:
             log.warn("Error parsing %s", url)
             return
         linked_fetchables = []
-        #Images
-        for img in doc.find_all("img", src=True):
-            linked_fetchables.append(Image(urlparse.urljoin(url, img["src"]), self.sfh))
-        #Stylesheets
-        # <link rel='stylesheet' id='phoenix-style-css'  href=
-        for ss in doc.find_all("link", rel="stylesheet", href=True):
-            linked_fetchables.append(Stylesheet(urlparse.urljoin(url, ss["href"]), self.sfh))
-        #Script
-        # <script type='text/javascript' src=
-        for scr in doc.find_all("script", src=True):
-            linked_fetchables.append(Script(urlparse.urljoin(url, scr["src"]), self.sfh))
-        #Pdfs
-        #Really this should all be UnknownResources, but that would mean fetching each link.
-        #Cheating for performance reasons.
-        for lnk in doc.find_all("a", href=re.compile(".pdf$", flags=re.IGNORECASE)):
-            linked_fetchables.append(Pdf(urlparse.urljoin(url, lnk["href"]), self.sfh))
+        for (link_type, link_url) in links:
+            #Really pdfs should be UnknownResources, but that would mean fetching each link.
+            #Cheating for performance reasons.
+            linked_fetchables.append(_LINK_TYPE_CLASSES[link_type](urlparse.urljoin(url, link_url), self.sfh))
 
         return linked_fetchables
 
 
+_LINK_TYPE_CLASSES = {
+    IMAGE: Image,
+    STYLESHEET: Stylesheet,
+    SCRIPT: Script,
+    PDF: Pdf
+}
+
+
 class UnsupportedResource():
     is_fetchable = False
 
@@ -145,12 +159,22 @@ class UnsupportedResource():
         raise NotImplementedError
 
 
-class UnknownResource():
+class UnknownResource(HttpLibMixin):
     """
     A resource whose type is not known.
 
     When fetched, a HEAD is performed for the resource.  If the type can be determined from the content-type header
     and fetching of that type is supported, a new item of that type is queued.
+
+    Alternatively, if the harvester sniffs content types, a single streamed GET is performed for the resource.  If the
+    type can be determined from the content-type header, fetching of that type is supported, and the fetch strategy
+    would fetch that type, the rest of the response is read and processed as that type.  Otherwise, the response is
+    abandoned without reading its body.
+
+    If the resource redirects, e.g., a shortened url, the resolution is added to the redirect cache.  If the resource
+    has been resolved before, neither is performed.  If the redirects have been archived, an item of the type of the
+    final url is queued instead, or nothing if the final url has already been fetched or captured.  Otherwise, the
+    type is taken from the cache and the resource is fetched so that the redirects are archived.
     """
     is_fetchable = True
 
@@ -166,24 +190,101 @@ class UnknownResource():
             return self.__str__()
 
     def fetch(self):
-        fetchable = None
-        if not self.sfh.is_fetched(self.url):
-            resp = requests.head(self.url, allow_redirects=True)
-            if resp:
-                if 'content-type' in resp.headers:
-                    if resp.headers['content-type'].startswith("text/html"):
-                        fetchable = Html(self.url, self.sfh)
-                    elif resp.headers['content-type'].startswith("image/"):
-                        fetchable = Image(self.url, self.sfh)
-                    elif resp.headers['content-type'].startswith("application/pdf"):
-                        fetchable = Pdf(self.url, self.sfh)
-                    else:
-                        log.debug("Content-type of %s is %s", self.url, resp.headers['content-type'])
-                else:
-                    log.warn("%s does not have a content-type header", self.url)
-            else:
-                log.warn("Result of head of %s was %s", self.url, resp.status_code)
+        if self.sfh.is_captured(self.url):
+            log.debug("%s captured by a previous harvest.", self.url)
+        elif not self.sfh.is_fetched(self.url):
+            redirect = self.sfh.get_redirect(self.url)
+            if redirect is not None:
+                return self._fetch_redirected(redirect)
+            if self.sfh.sniff_content_type:
+                return self._fetch_sniffed()
+            return None, self._fetch_head()
         else:
             log.debug("%s already fetched.", self.url)
 
-        return None, fetchable
\ No newline at end of file
+        return None, None
+
+    def _fetch_head(self):
+        resp = self.sfh.get_session(self.url).head(self.url, allow_redirects=True)
+        if resp:
+            self._set_redirect(resp, archived=False)
+            resource_class = self._resource_class(resp.headers.get("content-type"))
+            if resource_class:
+                return resource_class(self.url, self.sfh)
+        else:
+            log.warn("Result of head of %s was %s", self.url, resp.status_code)
+        return None
+
+    def _fetch_sniffed(self):
+        #List of responses. Due to redirects, there may be multiple responses.
+        resps = []
+        session = self.sfh.get_session(self.url)
+        resp, capture = self.wrap_execute(
+            lambda: session.get(self.url, stream=True,
+                                hooks={"response": lambda r, *args, **kwargs: resps.append(r)}))
+        if resp:
+            resource_class = self._resource_class(resp.headers.get("content-type"))
+            if resource_class:
+                fetchable = resource_class(self.url, self.sfh)
+                if self.sfh.fetch_decision(fetchable, self):
+                    log.debug("Fetching %s as %s", self.url, resource_class.__name__)
+                    #Adds the redirect as archived.
+                    return fetchable.process_response(resp, resps, capture)
+            self._set_redirect(resp, archived=False)
+        else:
+            log.warn("Getting %s returned %s", self.url, resp.status_code)
+        _abandon(resp)
+        return None, None
+
+    def _fetch_redirected(self, redirect):
+        (final_url, _, content_type, _, archived) = redirect
+        log.debug("%s previously resolved to %s", self.url, final_url)
+        resource_class = self._resource_class(content_type)
+        if not resource_class:
+            return None, None
+        if archived:
+            #Skip the redirects
+            if self.sfh.is_captured(final_url) or self.sfh.is_fetched(final_url):
+                log.debug("%s already fetched or captured.", final_url)
+                return None, None
+            return None, resource_class(final_url, self.sfh)
+        #Fetch the url, so that the redirects are archived.
+        fetchable = resource_class(self.url, self.sfh)
+        if self.sfh.sniff_content_type:
+            if not self.sfh.fetch_decision(fetchable, self):
+                return None, None
+            return fetchable.fetch()
+        return None, fetchable
+
+    def _set_redirect(self, resp, archived):
+        if resp.history:
+            self.sfh.set_redirect(self.url, resp.url, resp.status_code, resp.headers.get("content-type"),
+                                  archived=archived)
+
+    def _resource_class(self, content_type):
+        """
+        Returns the class of fetchable for a content-type or None if not supported.
+        """
+        if content_type:
+            if content_type.startswith("text/html"):
+                return Html
+            elif content_type.startswith("image/"):
+                return Image
+            elif content_type.startswith("application/pdf"):
+                return Pdf
+            else:
+                log.debug("Content-type of %s is %s", self.url, content_type)
+        else:
+            log.warn("%s does not have a content-type header", self.url)
+        return None
+
+
+def _abandon(resp):
+    """
+    Abandons a streamed response without reading its body.
+    """
+    #Returning the connection to the pool with the body unread would break the next request on it, so close it.
+    connection = getattr(resp.raw, "_connection", None)
+    if connection is not None:
+        connection.close()
+    resp.close()
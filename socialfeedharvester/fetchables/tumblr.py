@@ -8,15 +8,14 @@ import html5lib
 from socialfeedharvester.fetchables.resource import Image, UnknownResource
 import youtube
 import vimeo
-import httplib2 as http_client
 import urlparse
-from socialfeedharvester.fetchables.utilities import HttpLibMixin, ClientManager
+from socialfeedharvester.fetchables.utilities import HttpLibMixin, ClientManager, StreamingFetchMixin
 from socialfeedharvester.utilities import HttLib2ResponseAdapter
 
 log = logging.getLogger(__name__)
 
 
-class Blog():
+class Blog(StreamingFetchMixin):
     is_fetchable = True
 
     def __init__(self, blog_name, sfh, incremental=True, per_page=20):
@@ -36,15 +35,12 @@ class Blog():
     def __str__(self):
         return "blog %s" % (self.blog_name,)
 
-    def fetch(self):
+    def fetch_iter(self):
         #Request blog info to get post_count
         (blog, blog_resp, blog_warc_records) = self.client.blog_info(self.blog_name)
         post_count = blog['blog']['posts']
         last_post_id = self.sfh.get_state(__name__, "%s.last_post_id" % self.blog_name) if self.incremental else False
 
-        warc_records = []
-        fetchables = []
-
         new_last_post_id = None
         for offset in range(0, post_count, self.per_page):
             #Make calls to posts
@@ -52,6 +48,7 @@ class Blog():
             (posts, post_resp, post_warc_records) = self.client.posts(self.blog_name,
                                                                       limit=self.per_page, offset=offset)
 
+            fetchables = []
             add_warc_records = True
             found_last_post_id = False
             for counter, post in enumerate(posts["posts"]):
@@ -66,8 +63,7 @@ class Blog():
                 if new_last_post_id is None:
                     new_last_post_id = post_id
 
-            if add_warc_records:
-                warc_records.extend(post_warc_records)
+            yield post_warc_records if add_warc_records else None, fetchables
 
             if found_last_post_id:
                 break
@@ -75,8 +71,6 @@ class Blog():
         if self.incremental and new_last_post_id:
             self.sfh.set_state(__name__, "%s.last_post_id" % self.blog_name, new_last_post_id)
 
-        return warc_records, fetchables
-
     def _process_post(self, post):
         fetchables = []
         if post['type'] == 'photo':
@@ -134,11 +128,9 @@ class TumblrRequest(pytumblr.TumblrRequest, HttpLibMixin):
         warc_records = []
         try:
             client.follow_redirects = False
-            #http_client.debuglevel = 1
-            ((resp, content), capture_out) = self.wrap_execute(
-                lambda: client.request(url, method="GET", redirections=False),
-                http_client)
-            warc_records = self.to_warc_records(capture_out, [HttLib2ResponseAdapter(resp, content)])
+            ((resp, content), capture) = self.wrap_execute(
+                lambda: client.request(url, method="GET", redirections=False))
+            warc_records = self.to_warc_records(capture, [HttLib2ResponseAdapter(resp, content)])
         except RedirectLimit, e:
             resp, content = e.args
 
@@ -1,8 +1,13 @@
 import logging
+import gzip
+import itertools
 import json
-import httplib as http_client
+import multiprocessing
+import re
+import StringIO
 
 from socialfeedharvester.fetchables import resource
+import socialfeedharvester.cdxj as cdxj
 import warc
 import tweepy
 import tweepy.parsers
@@ -14,58 +19,244 @@ from socialfeedharvester.fetchables.utilities import ClientManager
 log = logging.getLogger(__name__)
 
 
-class TweetWarc():
+class TweetWarcs(utilities.StreamingFetchMixin):
+    """
+    WARC files of tweets written by twh, from which the urls linked to by the tweets are extracted.
+
+    The WARC files are extracted by a pool of sfh.extraction_processes processes, in parallel across WARC files and,
+    for WARC files that have a CDXJ index, across the records of each WARC file.  The urls are yielded as each WARC file
+    or record is extracted.
+
+    WARC files that are symlinks are deleted once extracted.  WARC files that no longer exist, e.g., symlinks deleted
+    before a harvest was interrupted and resumed, are skipped.
+    """
     is_fetchable = True
 
-    def __init__(self, filepath, sfh):
-        self.filepath = filepath
+    def __init__(self, filepaths, sfh):
+        self.filepaths = filepaths
         self.sfh = sfh
 
-    def fetch(self):
-        #Open the warc
-        log.debug("Opening %s", self.filepath)
-        warc_file = warc.WARCFile(filename=self.filepath)
-        fetchables = []
+    def fetch_iter(self):
+        tasks = []
+        #Number of tasks of each WARC file that are not complete
+        remaining = {}
+        for filepath in self.filepaths:
+            if not os.path.exists(filepath):
+                #Already extracted and deleted by an interrupted harvest that is being resumed.
+                log.info("Skipping %s since it no longer exists", filepath)
+                continue
+            file_tasks = extraction_tasks(filepath)
+            log.debug("Extracting %s in %s tasks", filepath, len(file_tasks))
+            tasks.extend(file_tasks)
+            remaining[filepath] = len(file_tasks)
+
+        if not tasks:
+            return
+        processes = min(self.sfh.extraction_processes, len(tasks))
+        pool = multiprocessing.Pool(processes) if processes > 1 else None
         try:
-            for warc_record in warc_file:
-                #Ignore requests
-                if warc_record.type in ("continuation", "response"):
-                    log.debug("Processing record %s (%s)", warc_record.header.record_id, warc_record.type)
-                    past_http_header = True if warc_record.type == "continuation" else False
-                    crlf_count = 0
-                    for line in warc_record.payload:
-                        #Need to skip past http header if a response
-                        if not past_http_header and crlf_count == 2:
-                            past_http_header = True
-                        if line == "\n":
-                            crlf_count += 1
-                        else:
-                            crlf_count = 0
-                        if past_http_header and line != '\n':
-                            try:
-                                tweet = json.loads(unicode(line))
-                            except Exception:
-                                log.warn("Malformed tweet in %s: %s", self.filepath, line)
-                                continue
-                            if 'entities' in tweet and 'urls' in tweet['entities']:
-                                for url in tweet['entities']['urls']:
-                                    fetchables.append(resource.UnknownResource(url['expanded_url'], self.sfh))
-                else:
-                    log.debug("Skipping record %s (%s)", warc_record.header.record_id, warc_record.type)
+            if pool is not None:
+                results = pool.imap_unordered(extract_tweet_urls, tasks)
+            else:
+                results = itertools.imap(extract_tweet_urls, tasks)
+            for (filepath, urls, malformed_count) in results:
+                if malformed_count:
+                    log.warn("%s malformed tweets in %s", malformed_count, filepath)
+                yield None, [resource.UnknownResource(url, self.sfh) for url in urls]
+                remaining[filepath] -= 1
+                if not remaining[filepath] and os.path.islink(filepath):
+                    #If warc is a symlink, delete
+                    log.debug("Deleting symlink %s", filepath)
+                    os.unlink(filepath)
         finally:
-            warc_file.close()
-            #If warc is a symlink, delete
-            if os.path.islink(self.filepath):
-                log.debug("Deleting symlink %s", self.filepath)
-                os.unlink(self.filepath)
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    def __str__(self):
+        return "tweet warcs %s" % ", ".join(self.filepaths)
+
 
-        return None, fetchables
+class TweetWarc(TweetWarcs):
+    """
+    A WARC file of tweets written by twh.
+    """
+    def __init__(self, filepath, sfh):
+        TweetWarcs.__init__(self, [filepath], sfh)
+        self.filepath = filepath
 
     def __str__(self):
         return "tweet warc at %s" % self.filepath
 
 
-class UserTimeline(utilities.HttpLibMixin):
+def extraction_tasks(filepath):
+    """
+    Returns the tasks for extracting the urls linked to by the tweets of a WARC file:  a task for each record in the
+    CDXJ index of the WARC file or, if there is no index, a single task for the whole WARC file.
+
+    :return: List of (filepath, offset, length).  Offset and length are None for the whole WARC file.
+    """
+    #If a symlink, the index is alongside the linked WARC file.
+    warc_filepath = os.path.realpath(filepath)
+    index_filepath = cdxj.cdxj_filepath(warc_filepath)
+    tasks = []
+    if os.path.exists(index_filepath):
+        filename = os.path.basename(warc_filepath)
+        with open(index_filepath) as index_file:
+            for line in index_file:
+                fields = json.loads(line.split(" ", 2)[2])
+                if fields["filename"] == filename:
+                    tasks.append((filepath, int(fields["offset"]), int(fields["length"])))
+    #In the order of the WARC file.
+    tasks.sort()
+    return tasks or [(filepath, None, None)]
+
+
+def extract_tweet_urls(task):
+    """
+    Extracts the urls linked to by the tweets of a WARC file or a record of a WARC file.
+
+    Performed by extraction processes, so malformed tweets are counted rather than logged.
+
+    :param task: (filepath, offset, length).  Offset and length are None for the whole WARC file.
+    :return: (filepath, list of urls, number of malformed tweets)
+    """
+    (filepath, offset, length) = task
+    if offset is None:
+        warc_file = warc.WARCFile(filename=filepath)
+    else:
+        with open(filepath, "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        fileobj = StringIO.StringIO(data)
+        #A gzip member or an uncompressed record.
+        warc_file = warc.WARCFile(fileobj=gzip.GzipFile(fileobj=fileobj) if data[:2] == "\x1f\x8b" else fileobj)
+    urls = []
+    malformed_count = 0
+    try:
+        for warc_record in warc_file:
+            #Ignore requests
+            if warc_record.type in ("continuation", "response"):
+                malformed_count += extract_record_tweet_urls(warc_record, urls)
+    finally:
+        warc_file.close()
+    return filepath, urls, malformed_count
+
+
+def extract_record_tweet_urls(warc_record, urls):
+    """
+    Appends the urls linked to by the tweets of a response or continuation record to urls.
+
+    Works on the raw bytes of the payload, read in large chunks.  Only the entities of each tweet are decoded, unless
+    the entities of a tweet can't be located, in which case the whole tweet is decoded.  Tweets are only checked for
+    being malformed when they are decoded.
+
+    :return: Number of malformed tweets.
+    """
+    malformed_count = 0
+    in_http_header = warc_record.type == "response"
+    buf = ""
+    while True:
+        chunk = warc_record.payload.read(_CHUNK_SIZE)
+        if not chunk:
+            break
+        buf += chunk
+        if in_http_header:
+            #Need to skip past http header if a response
+            header_end = buf.find("\r\n\r\n")
+            if header_end == -1:
+                continue
+            buf = buf[header_end + 4:]
+            in_http_header = False
+        lines = buf.split("\n")
+        #The last line may be incomplete.
+        buf = lines.pop()
+        for line in lines:
+            malformed_count += _extract_tweet_urls(line, urls)
+    if not in_http_header:
+        malformed_count += _extract_tweet_urls(buf, urls)
+    return malformed_count
+
+
+def extract_record_tweet_urls_with_json(warc_record, urls):
+    """
+    Appends the urls linked to by the tweets of a response or continuation record to urls, decoding every tweet.
+
+    This is slower than extract_record_tweet_urls().
+    """
+    malformed_count = 0
+    past_http_header = warc_record.type == "continuation"
+    for line in warc_record.payload:
+        #Need to skip past http header if a response
+        if not past_http_header:
+            past_http_header = line in ("\r\n", "\n")
+            continue
+        if line.strip():
+            try:
+                tweet = json.loads(unicode(line))
+            except Exception:
+                malformed_count += 1
+                continue
+            _append_urls(tweet.get("entities") if isinstance(tweet, dict) else None, urls)
+    return malformed_count
+
+
+#Tweet url extractors by name.
+TWEET_URL_EXTRACTORS = {
+    "bytes": extract_record_tweet_urls,
+    "json": extract_record_tweet_urls_with_json
+}
+
+_CHUNK_SIZE = 1024 * 1024
+_ENTITIES_RE = re.compile(r'"entities"\s*:\s*')
+_JSON_STRING_RE = re.compile(r'"(?:[^"\\]|\\.)*"')
+_json_decoder = json.JSONDecoder()
+
+
+def _extract_tweet_urls(line, urls):
+    """
+    Appends the urls of the entities of a tweet to urls.
+
+    :return: 1 if the tweet is malformed, otherwise 0.
+    """
+    line = line.strip()
+    if not line:
+        return 0
+    if line[0] == "{" and line[-1] == "}":
+        #The entities of the tweet are the last entities at the top-level, following any retweeted or quoted tweet.
+        key = line.rfind('"entities"')
+        if key == -1:
+            #Not a tweet, e.g., a delete or limit notice.
+            return 0
+        match = _ENTITIES_RE.match(line, key)
+        if match:
+            try:
+                (entities, end) = _json_decoder.raw_decode(line, match.end())
+            except ValueError:
+                entities = None
+            #Top-level if the rest of the tweet closes just the tweet.
+            if isinstance(entities, dict):
+                rest = _JSON_STRING_RE.sub("", line[end:])
+                if rest.count("}") - rest.count("{") == 1 and rest.count("]") == rest.count("["):
+                    _append_urls(entities, urls)
+                    return 0
+    #Fall back to decoding the whole tweet.
+    try:
+        tweet = json.loads(line)
+    except ValueError:
+        return 1
+    _append_urls(tweet.get("entities") if isinstance(tweet, dict) else None, urls)
+    return 0
+
+
+def _append_urls(entities, urls):
+    if isinstance(entities, dict):
+        for url in entities.get("urls") or ():
+            if url.get("expanded_url"):
+                urls.append(url["expanded_url"])
+
+
+class UserTimeline(utilities.StreamingFetchMixin, utilities.HttpLibMixin):
     is_fetchable = True
 
     def __init__(self, sfh, user_id=None, screen_name=None, incremental=True, per_page=None):
@@ -85,7 +276,7 @@ class UserTimeline(utilities.HttpLibMixin):
         self.hostname = self.api.host
 
 
-    def fetch(self):
+    def fetch_iter(self):
         self.api.parser = tweepy.parsers.RawParser()
 
         last_tweet_id = self.sfh.get_state(__name__, "%s.last_tweet_id" % (self.user_id or self.screen_name)) \
@@ -93,15 +284,14 @@ class UserTimeline(utilities.HttpLibMixin):
 
 
         page = 1
-        warc_records = []
-        fetchables = []
         new_last_tweet_id = None
         while True:
-            tweets_resp, capture_out = self.wrap_execute(
+            warc_records = []
+            fetchables = []
+            tweets_resp, capture = self.wrap_execute(
                 lambda: self.api.user_timeline(page=page, screen_name=self.screen_name, user_id=self.user_id,
-                                               count=self.per_page, max_id=last_tweet_id),
-                http_client.HTTPConnection)
-            http_headers = self.parse_capture(capture_out)
+                                               count=self.per_page, max_id=last_tweet_id))
+            http_headers = self.parse_capture(capture)
             if tweets_resp != '[]':
                 #Write request and response
                 assert len(http_headers) == 2
@@ -123,6 +313,7 @@ class UserTimeline(utilities.HttpLibMixin):
                     if "media" in tweet["entities"]:
                         for media in tweet["entities"]["media"]:
                             fetchables.append(resource.Image(media["media_url"], self.sfh))
+                yield warc_records, fetchables
 
             else:
                 # All done
@@ -131,8 +322,6 @@ class UserTimeline(utilities.HttpLibMixin):
         if self.incremental and new_last_tweet_id:
             self.sfh.set_state(__name__, "%s.last_tweet_id" % (self.user_id or self.screen_name), str(new_last_tweet_id))
 
-        return warc_records, fetchables
-
     def __str__(self):
         return "user timeline of %s" % (self.screen_name or self.user_id)
 
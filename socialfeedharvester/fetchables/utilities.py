@@ -1,7 +1,11 @@
 from __future__ import absolute_import
 import warc as ia_warc
-import sys
-import StringIO
+import httplib
+import threading
+from socialfeedharvester.warc import PayloadBuffer, payload_digest
+
+#Captures in progress for each thread.
+_captures = threading.local()
 
 
 class ClientManager():
@@ -28,62 +32,174 @@ class ClientManager():
         return self._clients[key]
 
 
+class StreamingFetchMixin():
+    """
+    Mixin for fetchables that stream the results of fetching.
+
+    A streaming fetchable implements fetch_iter(), which yields (warc records, linked fetchables) as they are fetched,
+    e.g., for each page of an API, rather than holding all of them until fetching is complete.  fetch() collects
+    everything that is yielded.
+    """
+    def fetch(self):
+        warc_records = []
+        linked_fetchables = []
+        for (page_warc_records, page_linked_fetchables) in self.fetch_iter():
+            if page_warc_records:
+                warc_records.extend(page_warc_records)
+            if page_linked_fetchables:
+                linked_fetchables.extend(page_linked_fetchables)
+        return warc_records, linked_fetchables
+
+
+def fetch_iter(fetchable):
+    """
+    Returns an iterator of (warc records, linked fetchables) for a fetchable.
+
+    The results of streaming fetchables are returned as they are fetched.  Otherwise, the results of fetch() are
+    returned at once.
+    """
+    if hasattr(fetchable, "fetch_iter"):
+        return fetchable.fetch_iter()
+    return iter((fetchable.fetch(),))
+
+
+class HttpCapture():
+    """
+    Captures the raw request and response headers of the HTTP requests made by the current thread.
+
+    Capturing is performed at the connection level (httplib.HTTPConnection and httplib.HTTPResponse), so it works for
+    any HTTP client built on httplib, e.g., requests and httplib2.  Since only the requests of the current thread are
+    captured, captures may be performed concurrently by different threads.
+
+    Use as a context manager:
+
+        with HttpCapture() as capture:
+            requests.get(url)
+        capture.http_headers
+    """
+    def __init__(self):
+        #List of [request bytes, response header bytes or None]
+        self.exchanges = []
+
+    def __enter__(self):
+        _install_capture()
+        if not hasattr(_captures, "stack"):
+            _captures.stack = []
+        _captures.stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _captures.stack.remove(self)
+        return False
+
+    @property
+    def http_headers(self):
+        """
+        The request and response headers, alternating.
+
+        A request header includes everything sent for the request, including any body.  A response header includes
+        the status line and the headers, but not the terminating blank line.
+        """
+        http_headers = []
+        for (request, response_header) in self.exchanges:
+            http_headers.append(request)
+            if response_header is not None:
+                http_headers.append(response_header[:-2] if response_header.endswith("\r\n\r\n")
+                                    else response_header)
+        return http_headers
+
+    def _sent(self, data):
+        if self.exchanges and self.exchanges[-1][1] is None:
+            #Part of the current request, e.g., the body
+            self.exchanges[-1][0] += data
+        else:
+            self.exchanges.append([data, None])
+
+    def _received(self, response_header):
+        if self.exchanges and self.exchanges[-1][1] is None:
+            self.exchanges[-1][1] = response_header
+
+
+def _active_captures():
+    return getattr(_captures, "stack", None)
+
+
+class _RecordingFile():
+    """
+    Wraps a file, recording the lines that are read.
+    """
+    def __init__(self, fp):
+        self._fp = fp
+        self.lines = []
+
+    def readline(self, *args):
+        line = self._fp.readline(*args)
+        self.lines.append(line)
+        return line
+
+    def __getattr__(self, name):
+        return getattr(self._fp, name)
+
+
+_installed = False
+_send = httplib.HTTPConnection.send
+_begin = httplib.HTTPResponse.begin
+
+
+def _capturing_send(self, data):
+    captures = _active_captures()
+    if captures:
+        #Bodies sent from files are not captured.
+        if isinstance(data, basestring):
+            recorded = data.encode("utf-8") if isinstance(data, unicode) else data
+            for capture in captures:
+                capture._sent(recorded)
+    return _send(self, data)
+
+
+def _capturing_begin(self):
+    captures = _active_captures()
+    if not captures or self.msg is not None:
+        return _begin(self)
+    fp = self.fp
+    self.fp = _RecordingFile(fp)
+    try:
+        return _begin(self)
+    finally:
+        recording_fp = self.fp
+        #Closing the response sets fp to None.
+        if recording_fp is not None:
+            self.fp = fp
+        for capture in captures:
+            capture._received("".join(recording_fp.lines if recording_fp is not None else []))
+
+
+def _install_capture():
+    #Installed once, process-wide.  When nothing is being captured, the originals are called.
+    global _installed
+    if not _installed:
+        httplib.HTTPConnection.send = _capturing_send
+        httplib.HTTPResponse.begin = _capturing_begin
+        _installed = True
+
+
 class HttpLibMixin():
-    def wrap_execute(self, exec_func, debuggable):
+    def wrap_execute(self, exec_func):
         """
-        Enables debugging on debuggable, calls an API function, and captures output.
+        Calls an API function, capturing the HTTP requests and responses.
+
         :param exec_func: the API function.
-        :param debuggable: the http client that debug is to be set on.
-        :return: results of the function, captured stdout as a StringIO.
+        :return: results of the function, HttpCapture.
         """
-
-        #When debuglevel is set httplib outputs details to stdout.
-        #This captures stdout.
-        capture_out = StringIO.StringIO()
-        sys.stdout = capture_out
-        #sys.stdout = Tee([capture_out, sys.__stdout__])
-        debuggable.debuglevel = 1
-        try:
+        with HttpCapture() as capture:
             return_values = exec_func()
-        finally:
-            #Stop capturing stdout
-            sys.stdout = sys.__stdout__
-            debuggable.debuglevel = 0
-        return return_values, capture_out
+        return return_values, capture
 
-    def parse_capture(self, capture_out):
+    def parse_capture(self, capture):
         """
-        Transform the captured stdout into a series of request and response headers
+        Returns the captured request and response headers, alternating.
         """
-
-        http_headers = []
-        #Reset to the beginning of capture_out
-        capture_out.seek(0)
-        response_header = None
-        for line in capture_out:
-            if line.startswith("send:"):
-                #Push last req and resp
-                if response_header:
-                    #Response record
-                    http_headers.append(response_header)
-                    response_header = None
-                start = line.find("GET")
-                if start == -1:
-                    start = line.find("POST")
-                assert start != -1
-                request_header = line[start:-2].replace("\\r\\n", "\r\n")
-                #Request record
-                http_headers.append(request_header)
-            elif line.startswith("reply:"):
-                #Start of the response header
-                response_header = line[8:-6] + "\r\n"
-            elif line.startswith("header:"):
-                #Append additional headers to response header
-                response_header += line[8:-2] + "\r\n"
-        #Push the last response
-        http_headers.append(response_header)
-
-        return http_headers
+        return capture.http_headers
 
     def parse_url(self, http_header):
         """
@@ -91,14 +207,16 @@ class HttpLibMixin():
 
         Note that this excludes the protocol, host, and port.
         """
-        assert http_header.startswith("GET")
+        #GET or POST
+        start_pos = http_header.find(" ")
+        assert start_pos != -1
         end_pos = http_header.find(" HTTP/")
         assert end_pos != -1
-        return http_header[4:end_pos]
+        return http_header[start_pos+1:end_pos]
 
 
-    def to_warc_records(self, capture_out, resps):
-        http_headers = self.parse_capture(capture_out)
+    def to_warc_records(self, capture, resps):
+        http_headers = self.parse_capture(capture)
         warc_records = []
         response_counter = 0
         counter = 0
@@ -126,10 +244,18 @@ class HttpLibMixin():
             warc_headers.update(headers)
         if concurrent_to_warc_record:
             warc_headers["WARC-Concurrent-To"] = concurrent_to_warc_record.header.record_id
+        if isinstance(http_body, PayloadBuffer):
+            #Streamed from the buffer when written.
+            warc_headers.setdefault("WARC-Payload-Digest", http_body.payload_digest())
+            prefix = http_header + "\r\n" if http_header else ""
+            warc_headers["Content-Length"] = str(len(prefix) + http_body.length)
+            return ia_warc.WARCRecord(payload=http_body.open(prefix), headers=warc_headers)
         payload = None
         if http_header:
             payload = http_header
         if http_body:
+                #The warc library's default digest is of the whole block, rather than the payload.
+                warc_headers.setdefault("WARC-Payload-Digest", payload_digest(http_body))
                 if payload:
                     payload += "\r\n" + http_body
                 else:
@@ -2,6 +2,7 @@ import logging
 import codecs
 import os
 import json
+import sqlite3
 
 log = logging.getLogger(__name__)
 
@@ -13,6 +14,8 @@ For example, it might be used to keep track of the last tweet fetched from a use
 A harvest state store should implement the signature of DictHarvestStateStore.
 
 The behavior of the harvest state store after close() is called is unspecified.
+
+checkpoint() may be called periodically to persist the state in case the harvest is interrupted.
 """
 
 
@@ -60,6 +63,12 @@ class DictHarvestStateStore():
                 if not self._state[resource_type]:
                     del self._state[resource_type]
 
+    def checkpoint(self):
+        """
+        Persist the harvest state store without closing it.
+        """
+        pass
+
     def close(self):
         """
         Close the harvest state store.
@@ -86,8 +95,88 @@ class JsonHarvestStateStore(DictHarvestStateStore):
 
         self.persist_on_close = persist_on_close
 
-    def close(self):
+    def checkpoint(self):
         if self.persist_on_close:
             log.debug("Storing harvest state to %s", self.state_filepath)
-            with codecs.open(self.state_filepath, 'w') as state_file:
+            #Write to a temporary file and rename so that an interruption does not leave a partial state file.
+            tmp_filepath = self.state_filepath + ".tmp"
+            with codecs.open(tmp_filepath, 'w') as state_file:
                 json.dump(self._state, state_file)
+            os.rename(tmp_filepath, self.state_filepath)
+
+    def close(self):
+        self.checkpoint()
+
+
+class SqliteHarvestStateStore(DictHarvestStateStore):
+    """
+    A harvest state store implementation backed by a SQLite database.
+
+    The database is written to <collection_path>/state.db.  Changes are committed only when checkpoint() is called
+    and on close, so that the harvester can commit them together with the fetchable queue.  Loading does not require
+    reading all of the state.
+
+    If there is no state in the database, but there is a <collection_path>/state.json from JsonHarvestStateStore, the
+    state is imported from it.
+    """
+    def __init__(self, collection_path, load_existing=True, persist_on_close=True):
+        """
+        :param load_existing: If False, ignore existing state.
+        :param persist_on_close: If False, changes are never committed, so existing state is left as it is.
+        """
+        DictHarvestStateStore.__init__(self)
+        self.db_filepath = os.path.join(collection_path, "state.db")
+        self.persist_on_close = persist_on_close
+        self._uncommitted = 0
+        if not os.path.exists(collection_path):
+            log.debug("Creating %s directory.", collection_path)
+            os.makedirs(collection_path)
+        log.debug("Opening state %s", self.db_filepath)
+        #May be used by fetch workers. Callers are responsible for serializing access.
+        self._conn = sqlite3.connect(self.db_filepath, check_same_thread=False)
+        self._conn.execute("create table if not exists state "
+                           "(resource_type text not null, key text not null, value text not null, "
+                           "primary key (resource_type, key))")
+        self._conn.commit()
+        #Deleting and importing are changes like any other, so are not committed unless persisting.
+        if not load_existing:
+            self._conn.execute("delete from state")
+            self._uncommitted += 1
+        elif not self._conn.execute("select count(*) from state").fetchone()[0]:
+            self._import_json(os.path.join(collection_path, "state.json"))
+
+    def _import_json(self, state_filepath):
+        if os.path.exists(state_filepath):
+            log.info("Importing state from %s", state_filepath)
+            with codecs.open(state_filepath, "r") as state_file:
+                state = json.load(state_file)
+            for resource_type, values in state.items():
+                for key, value in values.items():
+                    self._conn.execute("insert into state (resource_type, key, value) values (?, ?, ?)",
+                                       (resource_type, key, json.dumps(value)))
+                    self._uncommitted += 1
+
+    def get_state(self, resource_type, key):
+        row = self._conn.execute("select value from state where resource_type=? and key=?",
+                                 (resource_type, key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_state(self, resource_type, key, value):
+        log.debug("Setting state for %s with key %s to %s", resource_type, key, value)
+        if value is not None:
+            self._conn.execute("insert or replace into state (resource_type, key, value) values (?, ?, ?)",
+                               (resource_type, key, json.dumps(value)))
+        else:
+            #Clearing value
+            self._conn.execute("delete from state where resource_type=? and key=?", (resource_type, key))
+        self._uncommitted += 1
+
+    def checkpoint(self):
+        if self.persist_on_close and self._uncommitted:
+            log.debug("Committing %s changes to harvest state in %s", self._uncommitted, self.db_filepath)
+            self._conn.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        self.checkpoint()
+        self._conn.close()
@@ -0,0 +1,141 @@
+import logging
+import collections
+import time
+
+log = logging.getLogger(__name__)
+
+"""
+A host scheduler determines when a fetchable may be fetched based on the host of the fetchable.
+
+Fetchables whose host is not ready are held by the host scheduler until the host is ready, allowing fetchables for
+other hosts to be fetched in the meantime.  Held fetchables are kept in memory, so no more fetchables should be added
+once the host scheduler is full.
+
+A host scheduler should implement the signature of HostScheduler.
+"""
+
+
+class HostScheduler():
+    """
+    A host scheduler that limits the rate of fetches for each host with a token bucket and the number of concurrent
+    fetches for each host.
+
+    Each host has a bucket of burst tokens which is refilled at a rate of one token every wait seconds.  A fetch
+    requires a token.  Thus, with a burst of 1, fetches from the same host are started at least wait seconds apart.
+
+    Fetchables without a hostname are always ready.
+    """
+    def __init__(self, wait, burst=1, max_per_host=1, host_overrides=None, max_held=10000):
+        """
+        :param wait: Seconds to refill a token.
+        :param burst: Maximum number of tokens for a host.
+        :param max_per_host: Maximum number of concurrent fetches from the same host.
+        :param host_overrides: Map of hostnames to maps of wait, burst, and/or max_per_host that override the defaults
+        for that host, e.g., {"api.twitter.com": {"wait": 5}}.
+        :param max_held: Number of held fetchables at which the host scheduler is full.  If None, never full.
+        """
+        self.wait = wait
+        self.burst = burst
+        self.max_per_host = max_per_host
+        self.host_overrides = host_overrides or {}
+        self.max_held = max_held
+        #Map of hostname to (tokens, time tokens were last refilled)
+        self._buckets = {}
+        #Map of hostname to number of fetches in progress
+        self._active = collections.defaultdict(int)
+        #Map of hostname to deque of (fetchable, depth) waiting for host
+        self._held = collections.OrderedDict()
+        self._held_count = 0
+
+    def __len__(self):
+        """
+        Returns the number of fetchables held by the scheduler.
+        """
+        return self._held_count
+
+    def is_full(self):
+        """
+        Returns True if no more fetchables should be added until held fetchables are ready.
+        """
+        return self.max_held is not None and self._held_count >= self.max_held
+
+    def add(self, fetchable, depth):
+        """
+        Adds a fetchable to be scheduled.
+        """
+        hostname = _hostname(fetchable)
+        if hostname not in self._held:
+            self._held[hostname] = collections.deque()
+        self._held[hostname].append((fetchable, depth))
+        self._held_count += 1
+
+    def next_ready(self):
+        """
+        Returns the next fetchable and depth whose host is ready or None.
+
+        The fetchable is considered started.  release() should be called when the fetch is complete.
+        """
+        now = time.time()
+        for hostname, held in self._held.items():
+            if self._take(hostname, now):
+                fetchable_and_depth = held.popleft()
+                self._held_count -= 1
+                if not held:
+                    del self._held[hostname]
+                return fetchable_and_depth
+        return None
+
+    def release(self, fetchable):
+        """
+        Indicates that fetching the fetchable is complete.
+        """
+        hostname = _hostname(fetchable)
+        if hostname is not None:
+            self._active[hostname] -= 1
+
+    def time_until_ready(self):
+        """
+        Returns the number of seconds until a held fetchable may be ready or None if there are no held fetchables that
+        will become ready without a fetch being released.
+        """
+        now = time.time()
+        waits = [self._time_until_token(hostname, now) for hostname in self._held
+                 if hostname is None or self._active[hostname] < self._setting(hostname, "max_per_host")]
+        return min(waits) if waits else None
+
+    def _setting(self, hostname, name):
+        return self.host_overrides.get(hostname, {}).get(name, getattr(self, name))
+
+    def _refill(self, hostname, now):
+        wait = self._setting(hostname, "wait")
+        burst = self._setting(hostname, "burst")
+        (tokens, last_refill) = self._buckets.get(hostname, (burst, now))
+        if wait > 0:
+            tokens = min(burst, tokens + (now - last_refill) / float(wait))
+        else:
+            tokens = burst
+        self._buckets[hostname] = (tokens, now)
+        return tokens
+
+    def _take(self, hostname, now):
+        if hostname is None:
+            return True
+        if self._active[hostname] >= self._setting(hostname, "max_per_host"):
+            return False
+        tokens = self._refill(hostname, now)
+        if tokens < 1:
+            return False
+        log.debug("Taking token for %s", hostname)
+        self._buckets[hostname] = (tokens - 1, now)
+        self._active[hostname] += 1
+        return True
+
+    def _time_until_token(self, hostname, now):
+        if hostname is None:
+            return 0
+        tokens = self._refill(hostname, now)
+        return max(0, (1 - tokens) * self._setting(hostname, "wait"))
+
+
+def _hostname(fetchable):
+    return getattr(fetchable, "hostname", None)
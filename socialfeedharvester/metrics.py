@@ -0,0 +1,213 @@
+import logging
+import bisect
+import os
+import threading
+import time
+import BaseHTTPServer
+
+log = logging.getLogger(__name__)
+
+"""
+A metrics registry collects counters, gauges, and histograms describing a harvest, e.g., the number of fetches and the
+time spent fetching for each type of fetchable and host.
+
+Metrics are identified by a name and labels.  They can be exported in the Prometheus text exposition format, either
+as a file or from a local HTTP endpoint, and summarized at the end of a harvest.
+"""
+
+#Upper bounds in seconds of the buckets of latency histograms.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class MetricsRegistry():
+    """
+    A thread-safe registry of metrics.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        :param buckets: Upper bounds of the buckets of histograms.
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        #Map of name to map of labels to value
+        self._counters = {}
+        self._gauges = {}
+        #Map of name to map of labels to [bucket counts, count, sum, max]
+        self._histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        """
+        Increments a counter.
+        """
+        key = _labels_key(labels)
+        with self._lock:
+            values = self._counters.setdefault(name, {})
+            values[key] = values.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        """
+        Sets a gauge.
+        """
+        with self._lock:
+            self._gauges.setdefault(name, {})[_labels_key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        """
+        Records an observation, e.g., a latency in seconds, in a histogram.
+        """
+        key = _labels_key(labels)
+        with self._lock:
+            values = self._histograms.setdefault(name, {})
+            if key not in values:
+                values[key] = [[0] * len(self.buckets), 0, 0.0, 0.0]
+            histogram = values[key]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram[0][index] += 1
+            histogram[1] += 1
+            histogram[2] += value
+            histogram[3] = max(histogram[3], value)
+
+    def timer(self, name, **labels):
+        """
+        Returns a context manager that records the seconds spent in the context in a histogram.
+        """
+        return _Timer(self, name, labels)
+
+    def get(self, name, **labels):
+        """
+        Returns the value of a counter or gauge or the (count, sum) of a histogram or None.
+        """
+        key = _labels_key(labels)
+        with self._lock:
+            if key in self._counters.get(name, {}):
+                return self._counters[name][key]
+            if key in self._gauges.get(name, {}):
+                return self._gauges[name][key]
+            if key in self._histograms.get(name, {}):
+                histogram = self._histograms[name][key]
+                return histogram[1], histogram[2]
+        return None
+
+    def total(self, name):
+        """
+        Returns the sum of the values of a counter or gauge across labels.
+        """
+        with self._lock:
+            return sum(self._counters.get(name, self._gauges.get(name, {})).values())
+
+    def to_prometheus(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for (metric_type, metrics) in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted(metrics):
+                    lines.append("# TYPE %s %s" % (name, metric_type))
+                    for (key, value) in sorted(metrics[name].items()):
+                        lines.append("%s%s %s" % (name, _format_labels(key), _format_value(value)))
+            for name in sorted(self._histograms):
+                lines.append("# TYPE %s histogram" % name)
+                for (key, (bucket_counts, count, total, _)) in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for (bucket, bucket_count) in zip(self.buckets, bucket_counts):
+                        cumulative += bucket_count
+                        lines.append("%s_bucket%s %s" % (name, _format_labels(key + (("le", repr(bucket)),)),
+                                                         cumulative))
+                    lines.append("%s_bucket%s %s" % (name, _format_labels(key + (("le", "+Inf"),)), count))
+                    lines.append("%s_sum%s %s" % (name, _format_labels(key), _format_value(total)))
+                    lines.append("%s_count%s %s" % (name, _format_labels(key), count))
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def write_textfile(self, filepath):
+        """
+        Writes the metrics in the Prometheus text exposition format to a file, e.g., for the node exporter's textfile
+        collector.
+
+        The file is replaced atomically so that a partial file is never read.
+        """
+        tmp_filepath = filepath + ".tmp"
+        with open(tmp_filepath, "w") as metrics_file:
+            metrics_file.write(self.to_prometheus())
+        os.rename(tmp_filepath, filepath)
+
+    def serve(self, port, host="127.0.0.1"):
+        """
+        Serves the metrics in the Prometheus text exposition format from a local HTTP endpoint in a daemon thread.
+
+        :return: The HTTP server.  Call shutdown() to stop serving.
+        """
+        registry = self
+
+        class MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.to_prometheus()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                log.debug(format, *args)
+
+        server = BaseHTTPServer.HTTPServer((host, port), MetricsHandler)
+        thread = threading.Thread(target=server.serve_forever, name="metrics")
+        thread.daemon = True
+        thread.start()
+        log.info("Serving metrics at http://%s:%s/", host, server.server_port)
+        return server
+
+    def summary(self):
+        """
+        Returns a human-readable summary of the metrics.
+
+        Histograms are listed with the labels accounting for the most time first.
+        """
+        lines = []
+        with self._lock:
+            for name in sorted(self._histograms):
+                lines.append(name)
+                for (key, (_, count, total, maximum)) in sorted(self._histograms[name].items(),
+                                                                key=lambda (k, h): h[2], reverse=True):
+                    lines.append("  %-60s count=%s total=%.3f mean=%.3f max=%.3f"
+                                 % (_format_labels(key) or "{}", count, total, total / count, maximum))
+            for metrics in (self._counters, self._gauges):
+                for name in sorted(metrics):
+                    lines.append(name)
+                    for (key, value) in sorted(metrics[name].items(), key=lambda (k, v): v, reverse=True):
+                        lines.append("  %-60s %s" % (_format_labels(key) or "{}", _format_value(value)))
+        return "\n".join(lines)
+
+
+class _Timer():
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.registry.observe(self.name, time.time() - self.start, **self.labels)
+        return False
+
+
+def _labels_key(labels):
+    return tuple(sorted((name, unicode(value)) for (name, value) in labels.items()))
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+    return "{%s}" % ",".join('%s="%s"' % (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                             for (name, value) in key)
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
@@ -0,0 +1,209 @@
+import logging
+import cProfile
+import pstats
+import threading
+import time
+import os
+import StringIO
+
+log = logging.getLogger(__name__)
+
+"""
+A fetch profiler profiles a harvest, attributing the time spent to the class of the fetchable being fetched.
+
+While a fetchable is being fetched and its results processed, the thread doing so is profiled by a profile for the
+fetchable's class.  Otherwise, the thread is profiled by a profile for the harvester itself, e.g., queueing and
+scheduling.
+
+The time in each profile is further broken down by category, based on the module of each function:  network (HTTP
+clients and sockets), parsing (HTML, CSS, and JSON), warc (WARC serialization and compression), and other.
+
+A fetch profiler should implement the signature of NullFetchProfiler.
+"""
+
+HARVESTER = "(harvester)"
+
+#Categories of functions, by substrings of the filename or name of the function.  The first matching category is used.
+CATEGORIES = (
+    ("network", ("/socket.py", "/ssl.py", "/httplib.py", "/requests/", "/urllib3/", "/httplib2/", "/oauthlib/",
+                 "'_socket.", "'_ssl.", "select.", "<method 'recv", "<method 'send", "<method 'connect")),
+    ("parsing", ("/bs4/", "/HTMLParser.py", "/markupbase.py", "/json/", "/simplejson/", "/html5lib/",
+                 "/lxml/", "process_resource", "'_json.", "'lxml.")),
+    ("warc", ("/warc/", "/socialfeedharvester/warc.py", "/gzip.py", "'zlib.", "crc32")),
+)
+
+
+class NullFetchProfiler():
+    """
+    A fetch profiler that does not profile.
+    """
+    def profile(self, fetchable):
+        """
+        Returns a context manager that profiles the current thread while a fetchable is being fetched or its results
+        processed.
+        """
+        return _NullContext()
+
+    def run(self, func, *args, **kwargs):
+        """
+        Calls a function, profiling the current thread for the harvester.
+
+        :return: The return value of the function.
+        """
+        return func(*args, **kwargs)
+
+
+class FetchProfiler(NullFetchProfiler):
+    """
+    A fetch profiler using cProfile.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        #Map of (profile name, thread id) to cProfile.Profile
+        self._profiles = {}
+        self._local = threading.local()
+
+    def profile(self, fetchable):
+        return _ProfileContext(self, fetchable.__class__.__name__)
+
+    def run(self, func, *args, **kwargs):
+        with _ProfileContext(self, HARVESTER):
+            return func(*args, **kwargs)
+
+    def _get_profile(self, name):
+        key = (name, threading.current_thread().ident)
+        with self._lock:
+            if key not in self._profiles:
+                self._profiles[key] = cProfile.Profile()
+            return self._profiles[key]
+
+    def _switch(self, profile):
+        """
+        Makes profile the active profile of the current thread.
+
+        :return: The previously active profile or None.
+        """
+        previous = getattr(self._local, "active", None)
+        if previous is not None:
+            previous.disable()
+        if profile is not None:
+            profile.enable()
+        self._local.active = profile
+        return previous
+
+    def stats(self, name=None):
+        """
+        Returns the pstats.Stats of a profile, combining threads, or None if there are none.
+
+        :param name: Name of the profile, e.g., the fetchable class name.  If None, all profiles are combined.
+        """
+        with self._lock:
+            profiles = [profile for ((profile_name, _), profile) in self._profiles.items()
+                        if name is None or profile_name == name]
+        stats = None
+        for profile in profiles:
+            profile.create_stats()
+            if not profile.stats:
+                continue
+            if stats is None:
+                stats = pstats.Stats(profile, stream=StringIO.StringIO())
+            else:
+                stats.add(profile)
+        return stats
+
+    def names(self):
+        """
+        Returns the names of the profiles.
+        """
+        with self._lock:
+            return sorted(set(name for (name, _) in self._profiles))
+
+    def report(self, top=30):
+        """
+        Returns a readable report of the time attributed to each profile and category and of the top functions.
+
+        :param top: Number of functions to list.
+        """
+        out = StringIO.StringIO()
+        out.write("%-30s %10s" % ("profile", "total"))
+        for (category, _) in CATEGORIES:
+            out.write(" %10s" % category)
+        out.write(" %10s\n" % "other")
+        rows = []
+        for name in self.names():
+            stats = self.stats(name)
+            if stats is not None:
+                rows.append((name, stats.total_tt, categorize(stats)))
+        for (name, total, categories) in sorted(rows, key=lambda row: row[1], reverse=True):
+            out.write("%-30s %10.3f" % (name, total))
+            for (category, _) in CATEGORIES + (("other", None),):
+                out.write(" %10.3f" % categories[category])
+            out.write("\n")
+
+        stats = self.stats()
+        if stats is not None:
+            for sort in ("cumulative", "tottime"):
+                out.write("\nTop %s functions by %s:\n" % (top, sort))
+                stats.stream = out
+                stats.sort_stats(sort).print_stats(top)
+        return out.getvalue()
+
+    def write(self, path, name="profile", top=30):
+        """
+        Writes a pstats dump of all profiles and a readable report.
+
+        :param path: Directory to write to, e.g., the collection path.
+        :param name: Prefix of the filenames.
+        :param top: Number of functions to list in the report.
+        :return: Filepath of the pstats dump, filepath of the report.
+        """
+        if not os.path.exists(path):
+            os.makedirs(path)
+        filepath = os.path.join(path, "%s-%s" % (name, time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())))
+        stats = self.stats()
+        if stats is not None:
+            stats.dump_stats(filepath + ".pstats")
+        with open(filepath + ".txt", "w") as report_file:
+            report_file.write(self.report(top=top))
+        log.info("Wrote profile to %s.pstats and %s.txt", filepath, filepath)
+        return filepath + ".pstats", filepath + ".txt"
+
+
+def categorize(stats):
+    """
+    Returns a map of category to the time spent in the functions (excluding subfunctions) of that category.
+    """
+    categories = dict((category, 0.0) for (category, _) in CATEGORIES + (("other", None),))
+    for ((filename, _, func_name), (_, _, tottime, _, _)) in stats.stats.items():
+        categories[_category(filename.replace("\\", "/") + func_name)] += tottime
+    return categories
+
+
+def _category(function):
+    for (category, patterns) in CATEGORIES:
+        for pattern in patterns:
+            if pattern in function:
+                return category
+    return "other"
+
+
+class _ProfileContext():
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.previous = self.profiler._switch(self.profiler._get_profile(self.name))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.profiler._switch(self.previous)
+        return False
+
+
+class _NullContext():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
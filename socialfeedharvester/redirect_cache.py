@@ -0,0 +1,131 @@
+import logging
+import os
+import sqlite3
+import time
+
+log = logging.getLogger(__name__)
+
+"""
+A redirect cache keeps track of where urls redirect to across harvests of a collection, e.g., the final urls of
+shortened urls such as t.co or bit.ly links, along with the status and content type of the final response, when the
+url was resolved, and whether the redirects have been archived.
+
+It is used to avoid resolving the same urls again, both within a harvest and across harvests.
+
+A redirect cache should implement the signature of DictRedirectCache.
+
+The behavior of the redirect cache after close() is called is unspecified.
+
+checkpoint() may be called periodically to persist the redirect cache in case the harvest is interrupted.
+"""
+
+
+class DictRedirectCache():
+    """
+    A redirect cache implementation backed by a dictionary and not persisted.
+    """
+    def __init__(self, max_age=None):
+        """
+        :param max_age: Number of seconds after which a url should be resolved again.  If None, urls are not resolved
+        again.
+        """
+        self.max_age = max_age
+        self._redirects = {}
+
+    def get(self, url):
+        """
+        Retrieves the resolution of a url, unless resolved longer ago than the max age.
+
+        :return: (final url, status, content type, time resolved in seconds since epoch, archived) or None.
+        """
+        redirect = self._get(url)
+        if redirect is not None and self.max_age is not None and time.time() - redirect[3] >= self.max_age:
+            return None
+        return redirect
+
+    def _get(self, url):
+        return self._redirects.get(url)
+
+    def add(self, url, final_url, status, content_type, archived=False, resolved=None):
+        """
+        Adds the resolution of a url to the redirect cache.
+
+        Once the redirects from a url to a final url have been archived, they remain archived until the url resolves
+        to a different final url.
+
+        :param url: The url that was resolved.
+        :param final_url: The url that was redirected to.
+        :param status: The status of the response of the final url.
+        :param content_type: The content type of the response of the final url or None.
+        :param archived: True if the redirects were archived.
+        :param resolved: Time resolved in seconds since epoch.  If None, now.
+        """
+        previous = self._get(url)
+        if previous is not None and previous[0] == final_url and previous[4]:
+            archived = True
+        self._put(url, (final_url, status, content_type, resolved or time.time(), archived))
+
+    def _put(self, url, redirect):
+        self._redirects[url] = redirect
+
+    def __len__(self):
+        return len(self._redirects)
+
+    def checkpoint(self):
+        """
+        Persist the redirect cache without closing it.
+        """
+        pass
+
+    def close(self):
+        """
+        Close the redirect cache.
+
+        Close should be called when the redirect cache is no longer needed.
+        """
+        pass
+
+
+class SqliteRedirectCache(DictRedirectCache):
+    """
+    A redirect cache implementation backed by a SQLite database.
+
+    The database is written to <collection_path>/redirects.db.
+    """
+    def __init__(self, collection_path, max_age=None, persist_on_close=True):
+        DictRedirectCache.__init__(self, max_age=max_age)
+        self.db_filepath = os.path.join(collection_path, "redirects.db")
+        self.persist_on_close = persist_on_close
+        if not os.path.exists(collection_path):
+            log.debug("Creating %s directory.", collection_path)
+            os.makedirs(collection_path)
+        log.debug("Opening redirect cache %s", self.db_filepath)
+        #May be used by fetch workers. Callers are responsible for serializing access.
+        self._conn = sqlite3.connect(self.db_filepath, check_same_thread=False)
+        self._conn.execute("create table if not exists redirects "
+                           "(url text primary key, final_url text not null, status integer, content_type text, "
+                           "resolved real not null, archived integer not null)")
+
+    def _get(self, url):
+        row = self._conn.execute("select final_url, status, content_type, resolved, archived from redirects "
+                                 "where url=?", (url,)).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], row[2], row[3], bool(row[4])
+
+    def _put(self, url, redirect):
+        self._conn.execute("insert or replace into redirects "
+                           "(url, final_url, status, content_type, resolved, archived) values (?, ?, ?, ?, ?, ?)",
+                           (url,) + redirect)
+
+    def __len__(self):
+        return self._conn.execute("select count(*) from redirects").fetchone()[0]
+
+    def checkpoint(self):
+        if self.persist_on_close:
+            log.debug("Storing redirect cache to %s", self.db_filepath)
+            self._conn.commit()
+
+    def close(self):
+        self.checkpoint()
+        self._conn.close()
@@ -0,0 +1,90 @@
+import logging
+import cookielib
+import threading
+import urlparse
+import requests
+import requests.adapters
+
+log = logging.getLogger(__name__)
+
+"""
+A session pool provides requests sessions that are shared across a harvest, so that connections to a host are kept
+alive and reused rather than opening a new connection for every resource.
+
+A session pool should implement the signature of SessionPool.
+"""
+
+
+class SessionPool():
+    """
+    A session pool with a session for each host.
+
+    Each session keeps alive up to max_connections_per_host connections to its host and blocks rather than open more.
+    Requests time out after timeout seconds unless a timeout is provided.
+
+    Cookies are not retained, so that each resource is fetched as if by a new client.
+
+    Sessions may be used concurrently by fetch workers.
+    """
+    def __init__(self, max_connections_per_host=1, timeout=30, max_retries=0):
+        """
+        :param max_connections_per_host: Maximum number of connections to a host.
+        :param timeout: Seconds to wait for a connection or data before giving up.  None to wait forever.
+        :param max_retries: Number of times to retry failed connections.
+        """
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        #Map of hostname to session
+        self._sessions = {}
+
+    def get_session(self, url):
+        """
+        Returns the session for the host of a url.
+        """
+        hostname = urlparse.urlparse(url).hostname
+        with self._lock:
+            if hostname not in self._sessions:
+                log.debug("Creating session for %s", hostname)
+                self._sessions[hostname] = self._create_session()
+            return self._sessions[hostname]
+
+    def _create_session(self):
+        session = _TimeoutSession(self.timeout)
+        session.cookies.set_policy(cookielib.DefaultCookiePolicy(allowed_domains=[]))
+        for prefix in ("http://", "https://"):
+            #Redirects may be to other hosts, so allow a few pools.
+            session.mount(prefix, requests.adapters.HTTPAdapter(pool_connections=4,
+                                                                pool_maxsize=self.max_connections_per_host,
+                                                                max_retries=self.max_retries,
+                                                                pool_block=True))
+        return session
+
+    def __len__(self):
+        """
+        Returns the number of sessions.
+        """
+        return len(self._sessions)
+
+    def close(self):
+        """
+        Closes the sessions and their connections.
+        """
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+
+
+class _TimeoutSession(requests.Session):
+    """
+    A session with a default timeout.
+    """
+    def __init__(self, timeout):
+        requests.Session.__init__(self)
+        self.timeout = timeout
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return requests.Session.request(self, *args, **kwargs)
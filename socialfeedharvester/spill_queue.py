@@ -0,0 +1,148 @@
+import logging
+import collections
+import cPickle as pickle
+import tempfile
+import threading
+import Queue
+
+log = logging.getLogger(__name__)
+
+"""
+A spill queue is a FIFO queue for handing items from a producer that must not be held up, e.g., a thread reading from
+a streaming connection, to a consumer that may fall behind, e.g., a thread compressing and writing to disk.
+
+Items are kept in memory up to a maximum number.  When the queue is full, further items are spilled to temporary
+files, so that put() does not block.  put() only blocks when the items waiting in the spill files reach a maximum
+size.  Items are always returned in the order they were put, so once items are spilled, all following items are
+spilled until the spill files are drained.
+
+Spilled items are written to a series of spill files of up to a segment size.  A spill file is removed once its items
+have been taken, so the spill files on disk never much exceed the items waiting in them, even if the consumer keeps up
+with the producer without catching up.
+
+Items must be picklable.
+"""
+
+
+class SpillQueue():
+    """
+    A thread-safe FIFO queue that spills to temporary files when full.
+    """
+    def __init__(self, maxsize=10000, max_spill_size=1024 * 1024 * 1024, spill_dir=None,
+                 segment_size=64 * 1024 * 1024):
+        """
+        :param maxsize: The maximum number of items to keep in memory.
+        :param max_spill_size: The maximum number of bytes of items waiting in the spill files.  If None, unbounded.
+        :param spill_dir: The directory to create the spill files in.  If None, the default temporary directory.
+        :param segment_size: The number of bytes after which to start a new spill file.
+        """
+        self.maxsize = maxsize
+        self.max_spill_size = max_spill_size
+        self.spill_dir = spill_dir
+        self.segment_size = segment_size
+        #The number of items ever spilled.
+        self.spilled_count = 0
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        #Spill files, oldest first.  Items are taken from the first and put to the last.
+        self._segments = collections.deque()
+        self._spill_count = 0
+
+    def put(self, item):
+        with self._cond:
+            if not self._spill_count and len(self._items) < self.maxsize:
+                self._items.append(item)
+            else:
+                if self.max_spill_size is not None and self.spill_size >= self.max_spill_size:
+                    log.warn("Spill files are full, so waiting for %s items to be taken.", self.qsize())
+                    while self.spill_size >= self.max_spill_size:
+                        self._cond.wait()
+                self._spill(item)
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """
+        Removes and returns the next item, waiting for one if necessary.
+
+        :param timeout: The number of seconds to wait for an item.  If None, waits until there is one.
+        :raises Queue.Empty: if there is no item after timeout seconds.
+        """
+        with self._cond:
+            if timeout is None:
+                while not self.qsize():
+                    self._cond.wait()
+            elif not self.qsize():
+                self._cond.wait(timeout)
+                if not self.qsize():
+                    raise Queue.Empty
+            if self._items:
+                item = self._items.popleft()
+            else:
+                item = self._unspill()
+            self._cond.notify_all()
+            return item
+
+    def qsize(self):
+        """
+        Returns the number of items in the queue, including spilled items.
+        """
+        return len(self._items) + self._spill_count
+
+    @property
+    def spill_size(self):
+        """
+        The number of bytes of items waiting in the spill files.
+        """
+        return sum(segment.write_offset - segment.read_offset for segment in self._segments)
+
+    @property
+    def spill_files_size(self):
+        """
+        The number of bytes of the spill files on disk, including items already taken.
+        """
+        return sum(segment.write_offset for segment in self._segments)
+
+    def close(self):
+        """
+        Discards any items in the queue and removes the spill files.
+        """
+        with self._cond:
+            self._items.clear()
+            while self._segments:
+                self._segments.popleft().file.close()
+            self._spill_count = 0
+
+    def _spill(self, item):
+        if not self._spill_count:
+            log.warn("Queue is full, so spilling items to disk.")
+        if not self._segments or self._segments[-1].write_offset >= self.segment_size:
+            self._segments.append(_SpillSegment(tempfile.TemporaryFile(prefix="spill-", dir=self.spill_dir)))
+        segment = self._segments[-1]
+        segment.file.seek(segment.write_offset)
+        pickle.dump(item, segment.file, pickle.HIGHEST_PROTOCOL)
+        segment.write_offset = segment.file.tell()
+        segment.count += 1
+        self._spill_count += 1
+        self.spilled_count += 1
+
+    def _unspill(self):
+        segment = self._segments[0]
+        segment.file.seek(segment.read_offset)
+        item = pickle.load(segment.file)
+        segment.read_offset = segment.file.tell()
+        segment.count -= 1
+        self._spill_count -= 1
+        if not segment.count:
+            #Drained, so remove the spill file.
+            self._segments.popleft().file.close()
+            if not self._spill_count:
+                log.info("Spill files drained.")
+        return item
+
+
+class _SpillSegment():
+    def __init__(self, spill_file):
+        self.file = spill_file
+        self.read_offset = 0
+        self.write_offset = 0
+        self.count = 0
@@ -0,0 +1,89 @@
+import logging
+import hashlib
+import math
+import struct
+
+log = logging.getLogger(__name__)
+
+"""
+A url index keeps track of the urls that have been fetched in a harvest.
+
+A url index should implement the signature of FingerprintUrlIndex.
+"""
+
+
+class FingerprintUrlIndex():
+    """
+    A url index implementation backed by a set of url fingerprints.
+
+    A fingerprint is the first 8 bytes of the SHA1 of the url, which is much more compact than the url.  The chance of
+    two different urls having the same fingerprint is negligible.
+    """
+    def __init__(self):
+        self._fingerprints = set()
+
+    def add(self, url):
+        """
+        Adds a url to the index.
+        """
+        self._fingerprints.add(_sha1(url)[:8])
+
+    def __contains__(self, url):
+        return _sha1(url)[:8] in self._fingerprints
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+
+class BloomFilterUrlIndex():
+    """
+    A url index implementation backed by a bloom filter.
+
+    The memory used is fixed, regardless of the number of urls added.  However, there is a chance that a url that has
+    not been added will be reported as contained, in which case the url will not be fetched.  That chance is the
+    error rate as long as no more than capacity urls are added and increases after that.
+    """
+    def __init__(self, capacity, error_rate=0.0001):
+        """
+        :param capacity: Expected number of urls.
+        :param error_rate: Acceptable rate of false positives.
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bit_count = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self._hash_count = max(1, int(round(self._bit_count * math.log(2) / capacity)))
+        self._bits = bytearray((self._bit_count + 7) // 8)
+        self._count = 0
+        log.debug("Bloom filter with %s bits and %s hashes", self._bit_count, self._hash_count)
+
+    def add(self, url):
+        """
+        Adds a url to the index.
+        """
+        if url not in self:
+            self._count += 1
+        for bit in self._bit_positions(url):
+            self._bits[bit >> 3] |= 1 << (bit & 7)
+
+    def __contains__(self, url):
+        for bit in self._bit_positions(url):
+            if not self._bits[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+
+    def __len__(self):
+        """
+        Returns the approximate number of urls added.
+        """
+        return self._count
+
+    def _bit_positions(self, url):
+        #Double hashing to derive hash_count positions from a single digest.
+        (h1, h2) = struct.unpack("<QQ", _sha1(url)[:16])
+        return ((h1 + i * h2) % self._bit_count for i in range(self._hash_count))
+
+
+def _sha1(url):
+    if isinstance(url, unicode):
+        url = url.encode("utf-8")
+    return hashlib.sha1(url).digest()
@@ -25,11 +25,14 @@ class Tee(object):
         map(lambda out: out.write(data), self.outs)
 
 
-def generate_warc_filepath(data_path, collection=None, warc_type=None):
+def generate_warc_filepath(data_path, collection=None, warc_type=None, sequence=None):
     t = time.gmtime()
     name = collection or os.path.basename(data_path.rstrip("/"))
     if warc_type:
         name += "-" + warc_type
+    timestamp = time.strftime('%Y-%m-%dT%H:%M:%SZ', t)
+    if sequence is not None:
+        timestamp += "-%05d" % sequence
     return "%s/%s/%s/%s/%s/%s-%s.warc.gz" % (
         data_path,
         time.strftime('%Y', t),
@@ -37,5 +40,5 @@ def generate_warc_filepath(data_path, collection=None, warc_type=None):
         time.strftime('%d', t),
         time.strftime('%H', t),
         name,
-        time.strftime('%Y-%m-%dT%H:%M:%SZ', t)
+        timestamp
     )
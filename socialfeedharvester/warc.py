@@ -1,7 +1,18 @@
 from __future__ import absolute_import
 import logging
 import os
+import base64
+import hashlib
+import Queue
+import socket
+import sys
+import tempfile
+import threading
+import time
+import zlib
 import warc as ia_warc
+import socialfeedharvester.utilities as utilities
+from socialfeedharvester.cdxj import CdxjWriter, PAYLOAD_HEAD_SIZE as CDXJ_PAYLOAD_HEAD_SIZE
 
 log = logging.getLogger(__name__)
 
@@ -10,18 +21,40 @@ A warc record writer persists warc records.  How those warc records are persiste
 
 A warc record writer should implement the signature of WarcWriter.  close() should be called when the warc record writer
 is no longer needed.
+
+flush() persists the records written so far, e.g., before the harvester checkpoints its queue and indexes, so that a
+record is never referred to without having been written.
 """
 
+REVISIT_PROFILE = "http://netpreserve.org/warc/1.0/revisit/identical-payload-digest"
+SOFTWARE = "social-feed-harvester"
+
 
 class WarcWriter():
     """
-    A warc record writer that writes to a WARC file using the warc library.
+    A warc record writer that writes to a WARC file.
+
+    If the filepath ends with .gz, each record is compressed as a separate gzip member, so that records can be read
+    independently.
+
+    The payload of a record may be a file-like object, e.g., a PayloadBuffer, in which case it is streamed to the WARC
+    file rather than held in memory.  The Content-Length header of the record must then be provided.
     """
-    def __init__(self, filepath):
+    def __init__(self, filepath, compresslevel=9, buffer_size=1024 * 1024, warcinfo_fields=None, index=False):
         """
         :param filepath:  The filepath of the WARC file.
+        :param compresslevel:  The gzip compression level, from 1 (fastest) to 9 (smallest).
+        :param buffer_size:  The number of bytes to buffer before writing to the WARC file.
+        :param warcinfo_fields:  List of (name, value) of warc fields.  If not None, a warcinfo record with these fields
+        is written first.
+        :param index:  If True, a CDXJ index of the WARC file is written alongside it.
         """
         self.filepath = filepath
+        self.compresslevel = compresslevel
+        self._compress = filepath.endswith(".gz")
+        #Number of bytes written to the WARC file
+        self.size = 0
+        self.opened = time.time()
         log.info("Writing to %s", self.filepath)
 
         #Create the directory
@@ -31,17 +64,279 @@ class WarcWriter():
             os.makedirs(filepath_parent)
 
         #Open warc
-        self._warc_file = ia_warc.open(self.filepath, "w")
+        self._warc_file = open(self.filepath, "wb", buffer_size)
+        self._cdxj_writer = CdxjWriter(self.filepath) if index else None
+        if warcinfo_fields is not None:
+            self.write_record(to_warcinfo_record(os.path.basename(self.filepath), warcinfo_fields))
 
     def close(self):
         log.debug("Closing %s.", self.filepath)
         self._warc_file.close()
+        if self._cdxj_writer is not None:
+            self._cdxj_writer.close()
+
+    def flush(self):
+        """
+        Writes the buffered records to disk.
+        """
+        self._warc_file.flush()
+        os.fsync(self._warc_file.fileno())
+        if self._cdxj_writer is not None:
+            self._cdxj_writer.flush()
 
     def write_record(self, warc_record):
         """
         :param warc_record:  The warc record to be written.  Should be type compatible with WARCRecord in the warc library.
         """
-        self._warc_file.write_record(warc_record)
+        offset = self.size
+        #wbits of 31 produces a gzip member.
+        compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, 31) if self._compress else None
+        buf = _ByteBuffer()
+        warc_record.header.write_to(buf)
+        self._write("".join(buf.chunks), compressor)
+        payload = warc_record.payload or ""
+        if hasattr(payload, "read"):
+            payload_head = payload.read(CDXJ_PAYLOAD_HEAD_SIZE)
+            chunk = payload_head
+            while chunk:
+                self._write(chunk, compressor)
+                chunk = payload.read(_CHUNK_SIZE)
+        else:
+            if isinstance(payload, unicode):
+                payload = payload.encode("utf-8")
+            payload_head = payload[:CDXJ_PAYLOAD_HEAD_SIZE]
+            self._write(payload, compressor)
+        self._write("\r\n\r\n", compressor)
+        if compressor is not None:
+            self._write(compressor.flush())
+        if self._cdxj_writer is not None:
+            self._cdxj_writer.add(warc_record.header, payload_head, offset, self.size - offset)
+
+    def _write(self, data, compressor=None):
+        if compressor is not None:
+            data = compressor.compress(data)
+        self._warc_file.write(data)
+        self.size += len(data)
+
+
+class RotatingWarcWriter():
+    """
+    A warc record writer that writes to a series of WARC files, starting a new WARC file once the current WARC file
+    reaches a maximum size or has been open for a maximum number of minutes.
+
+    The WARC files are named by generate_warc_filepath() with a sequence number and each begins with a warcinfo record.
+    A WARC file is only started when there is a record to write, so the last WARC file is never empty.  Rotation is
+    checked before each record is written, so the records of a single fetch may be split across WARC files.
+    """
+    def __init__(self, data_path, collection=None, warc_type=None, max_size=None, max_minutes=None, compresslevel=9,
+                 index=False):
+        """
+        :param data_path:  The path under which to write WARC files.
+        :param collection:  The name of the collection, used to name WARC files.
+        :param warc_type:  The type of WARC, used to name WARC files.
+        :param max_size:  The number of bytes after which to start a new WARC file.  If None, not rotated by size.
+        :param max_minutes:  The number of minutes after which to start a new WARC file.  If None, not rotated by time.
+        :param compresslevel:  The gzip compression level, from 1 (fastest) to 9 (smallest).
+        :param index:  If True, a CDXJ index of each WARC file is written alongside it.
+        """
+        self.data_path = data_path
+        self.collection = collection
+        self.warc_type = warc_type
+        self.max_size = max_size
+        self.max_minutes = max_minutes
+        self.compresslevel = compresslevel
+        self.index = index
+        #Filepaths of the WARC files written, in order
+        self.filepaths = []
+        self._warc_writer = None
+
+    def write_record(self, warc_record):
+        if self._warc_writer is not None and self._should_rotate():
+            log.debug("Rotating %s.", self._warc_writer.filepath)
+            self._warc_writer.close()
+            self._warc_writer = None
+        if self._warc_writer is None:
+            self._warc_writer = WarcWriter(utilities.generate_warc_filepath(self.data_path, self.collection,
+                                                                            warc_type=self.warc_type,
+                                                                            sequence=len(self.filepaths)),
+                                           compresslevel=self.compresslevel,
+                                           warcinfo_fields=warcinfo_fields(self.collection), index=self.index)
+            self.filepaths.append(self._warc_writer.filepath)
+        self._warc_writer.write_record(warc_record)
+
+    def close(self):
+        if self._warc_writer is not None:
+            self._warc_writer.close()
+            self._warc_writer = None
+
+    def flush(self):
+        if self._warc_writer is not None:
+            self._warc_writer.flush()
+
+    def _should_rotate(self):
+        if self.max_size is not None and self._warc_writer.size >= self.max_size:
+            return True
+        return self.max_minutes is not None and time.time() - self._warc_writer.opened >= self.max_minutes * 60
+
+
+class AsyncWarcWriter():
+    """
+    A warc record writer that writes records with another warc record writer in a background thread, so that
+    serializing, compressing, and writing records does not hold up fetching.
+
+    Records are handed to the background thread through a bounded queue.  write_record() only blocks when the queue
+    is full.  flush() waits for the queued records to be written and then flushes the other warc record writer.  close()
+    waits for the queued records to be written and then closes the other warc record writer.
+
+    If writing a record fails, the error is raised by the next call to write_record() or close().
+    """
+    def __init__(self, warc_writer, queue_size=1000):
+        """
+        :param warc_writer:  The warc record writer to write records with.
+        :param queue_size:  The maximum number of records waiting to be written.
+        """
+        self.warc_writer = warc_writer
+        self._queue = Queue.Queue(maxsize=queue_size)
+        self._exc_info = None
+        self._thread = threading.Thread(target=self._write_records, name="warc-writer")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write_record(self, warc_record):
+        self._raise_if_failed()
+        self._queue.put(warc_record)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join()
+        self._raise_if_failed()
+
+    def flush(self):
+        self._raise_if_failed()
+        if self._thread.is_alive():
+            flush_request = _FlushRequest()
+            self._queue.put(flush_request)
+            flush_request.done.wait()
+        self._raise_if_failed()
+
+    def qsize(self):
+        """
+        Returns the approximate number of records waiting to be written.
+        """
+        return self._queue.qsize()
+
+    def _write_records(self):
+        try:
+            while True:
+                warc_record = self._queue.get()
+                if warc_record is _CLOSE:
+                    break
+                if isinstance(warc_record, _FlushRequest):
+                    if self._exc_info is None:
+                        try:
+                            self.warc_writer.flush()
+                        except Exception:
+                            log.exception("Error flushing")
+                            self._exc_info = sys.exc_info()
+                    warc_record.done.set()
+                elif self._exc_info is None:
+                    try:
+                        self.warc_writer.write_record(warc_record)
+                    except Exception:
+                        log.exception("Error writing %s", warc_record.header.record_id)
+                        self._exc_info = sys.exc_info()
+        finally:
+            self.warc_writer.close()
+
+    def _raise_if_failed(self):
+        if self._exc_info is not None:
+            exc_info = self._exc_info
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+
+#Marks the end of the records.
+_CLOSE = object()
+
+
+class _FlushRequest():
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+class PayloadBuffer():
+    """
+    Buffers a payload as it is received, e.g., tweets from the streaming api, in memory up to a maximum size and then
+    in a temporary file, so that memory stays bounded regardless of the size of the payload.
+
+    The length and digest of the payload are kept as it is received, so that a warc record can be streamed from the
+    buffer without reading it more than once.
+    """
+    def __init__(self, max_memory_size=8 * 1024 * 1024):
+        """
+        :param max_memory_size: The number of bytes to buffer in memory before buffering in a temporary file.
+        """
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory_size)
+        self._digest = hashlib.sha1()
+        #Number of bytes buffered
+        self.length = 0
+
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode("utf-8")
+        self._file.write(data)
+        self._digest.update(data)
+        self.length += len(data)
+
+    def payload_digest(self):
+        """
+        Returns the digest of the payload, in the form used for WARC-Payload-Digest.
+        """
+        return "sha1:" + base64.b32encode(self._digest.digest())
+
+    def open(self, prefix=""):
+        """
+        Returns a file-like object for reading a block:  the prefix, e.g., http headers, followed by the payload.
+        """
+        self._file.seek(0)
+        return _PrefixedReader(prefix, self._file)
+
+    def close(self):
+        """
+        Discards the payload, deleting the temporary file, if any.
+        """
+        self._file.close()
+
+
+class _PrefixedReader():
+    def __init__(self, prefix, fileobj):
+        self._prefix = prefix
+        self._fileobj = fileobj
+
+    def read(self, size=-1):
+        if not self._prefix:
+            return self._fileobj.read(size)
+        if size < 0:
+            data = self._prefix + self._fileobj.read()
+            self._prefix = ""
+        else:
+            data = self._prefix[:size]
+            self._prefix = self._prefix[size:]
+        return data
+
+
+class _ByteBuffer():
+    """
+    Collects what a warc header writes, encoding unicode, e.g., header values, as utf-8.
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data.encode("utf-8") if isinstance(data, unicode) else data)
 
 
 class DryRunWarcWriter():
@@ -54,5 +349,71 @@ class DryRunWarcWriter():
     def close(self):
         pass
 
+    def flush(self):
+        pass
+
     def write_record(self, warc_record):
         pass
+
+
+def warcinfo_fields(collection=None):
+    """
+    Returns the warc fields describing WARC files written by this harvester, for a warcinfo record.
+
+    :param collection:  The name of the collection.
+    :return: List of (name, value)
+    """
+    fields = [("software", SOFTWARE),
+              ("hostname", socket.gethostname()),
+              ("format", "WARC File Format 1.0"),
+              ("conformsTo", "http://bibnum.bnf.fr/WARC/WARC_ISO_28500_version1_latestdraft.pdf")]
+    if collection:
+        fields.append(("isPartOf", collection))
+    return fields
+
+
+def to_warcinfo_record(filename, fields):
+    """
+    Returns a warcinfo record for a WARC file.
+
+    :param filename: The filename of the WARC file.
+    :param fields: List of (name, value) of warc fields.
+    """
+    payload = "".join("%s: %s\r\n" % (name, value) for (name, value) in fields)
+    return ia_warc.WARCRecord(payload=payload, headers={"WARC-Type": "warcinfo", "WARC-Filename": filename})
+
+
+def payload_digest(payload):
+    """
+    Returns the digest of a payload, in the form used for WARC-Payload-Digest.
+    """
+    return "sha1:" + base64.b32encode(hashlib.sha1(payload).digest())
+
+
+def to_revisit_record(warc_record, refers_to_uri, refers_to_date, refers_to_record_id=None):
+    """
+    Returns a revisit record (identical payload digest profile) for a response record whose payload has already been
+    archived.
+
+    The revisit record has the http headers of the response, but not the payload.
+
+    :param warc_record: The response record.
+    :param refers_to_uri: The target uri of the response record that archived the payload.
+    :param refers_to_date: The date of the response record that archived the payload.
+    :param refers_to_record_id: The record id of the response record that archived the payload.
+    """
+    #Header names of WARCHeaders are lower case.
+    headers = dict(warc_record.header.items())
+    for header in ("warc-record-id", "content-length"):
+        headers.pop(header, None)
+    headers["warc-type"] = "revisit"
+    headers["warc-profile"] = REVISIT_PROFILE
+    headers["warc-refers-to-target-uri"] = refers_to_uri
+    headers["warc-refers-to-date"] = refers_to_date
+    if refers_to_record_id:
+        headers["warc-refers-to"] = refers_to_record_id
+    headers["content-type"] = "application/http; msgtype=response"
+    #Just the http headers, ending with the blank line
+    header_end = warc_record.payload.find("\r\n\r\n")
+    payload = warc_record.payload[:header_end + 4] if header_end != -1 else warc_record.payload
+    return ia_warc.WARCRecord(payload=payload, headers=headers)
@@ -1,5 +1,12 @@
 import logging
+import sys
 import unittest
+try:
+    import config
+except ImportError:
+    #Tests use the sample config unless a local config.py has been made.
+    import sample_config
+    sys.modules["config"] = sample_config
 try:
     from test_config import *
     test_config_available = True
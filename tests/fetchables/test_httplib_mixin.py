@@ -1,5 +1,9 @@
 from tests import TestCase
-from socialfeedharvester.fetchables.utilities import HttpLibMixin
+from socialfeedharvester.fetchables.utilities import HttpLibMixin, HttpCapture
+import BaseHTTPServer
+import httplib
+import threading
+import requests
 
 
 class TestClientManager(TestCase):
@@ -15,3 +19,114 @@ class TestClientManager(TestCase):
                             Accept-Encoding: gzip, deflate
                             Accept: */*
                             User-Agent: python-requests/2.3.0 CPython/2.7.8 Darwin/13.4.0"""))
+
+    def test_parse_url_post(self):
+        self.assertEqual("/1.1/statuses/filter.json?delimited=length",
+                         self.mixin.parse_url("POST /1.1/statuses/filter.json?delimited=length HTTP/1.1\r\n"
+                                              "Host: stream.twitter.com\r\n\r\ntrack=test"))
+
+
+class TestHttpCapture(TestCase):
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), _Handler)
+        self.url = "http://127.0.0.1:%s" % self.server.server_port
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_capture(self):
+        mixin = HttpLibMixin()
+        resps = []
+        resp, capture = mixin.wrap_execute(
+            lambda: requests.get(self.url + "/redirect", hooks={"response": lambda r, *args, **kwargs: resps.append(r)}))
+        http_headers = mixin.parse_capture(capture)
+        self.assertEqual(4, len(http_headers))
+        self.assertTrue(http_headers[0].startswith("GET /redirect HTTP/1.1\r\n"))
+        self.assertTrue(http_headers[0].endswith("\r\n\r\n"))
+        self.assertTrue(http_headers[1].startswith("HTTP/1.0 302 Found\r\n"))
+        self.assertIn("Location: %s/page\r\n" % self.url, http_headers[1])
+        self.assertTrue(http_headers[2].startswith("GET /page HTTP/1.1\r\n"))
+        self.assertTrue(http_headers[3].startswith("HTTP/1.0 200 OK\r\n"))
+        self.assertTrue(http_headers[3].endswith("Content-Length: 5\r\n"))
+
+        warc_records = mixin.to_warc_records(capture, resps)
+        self.assertEqual(["request", "response", "request", "response"], [r.type for r in warc_records])
+        self.assertTrue(warc_records[3].payload.endswith("Content-Length: 5\r\n\r\nhello"))
+
+    def test_post(self):
+        mixin = HttpLibMixin()
+        resp, capture = mixin.wrap_execute(lambda: requests.post(self.url + "/page", data={"track": "test"}))
+        http_headers = mixin.parse_capture(capture)
+        self.assertEqual(2, len(http_headers))
+        self.assertTrue(http_headers[0].startswith("POST /page HTTP/1.1\r\n"))
+        self.assertTrue(http_headers[0].endswith("\r\n\r\ntrack=test"))
+        self.assertEqual("/page", mixin.parse_url(http_headers[0]))
+
+    def test_body_sent_separately(self):
+        mixin = HttpLibMixin()
+
+        def post():
+            conn = httplib.HTTPConnection(*self.server.server_address)
+            conn.putrequest("POST", "/page")
+            conn.putheader("Content-Length", "10")
+            conn.endheaders()
+            #Body sent after the header, as httplib does for bodies that are not strings, e.g., files.
+            conn.send("track=test")
+            return conn.getresponse().read()
+        resp, capture = mixin.wrap_execute(post)
+        http_headers = mixin.parse_capture(capture)
+        self.assertEqual(2, len(http_headers))
+        self.assertTrue(http_headers[0].startswith("POST /page HTTP/1.1\r\n"))
+        self.assertTrue(http_headers[0].endswith("\r\n\r\ntrack=test"))
+        self.assertTrue(http_headers[1].startswith("HTTP/1.0 200 OK\r\n"))
+
+    def test_concurrent(self):
+        results = {}
+
+        def fetch(path):
+            with HttpCapture() as capture:
+                for _ in range(10):
+                    requests.get(self.url + path)
+            results[path] = capture.http_headers
+
+        threads = [threading.Thread(target=fetch, args=("/page%s" % i,)) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for i in range(3):
+            self.assertEqual(20, len(results["/page%s" % i]))
+            for request_header in results["/page%s" % i][::2]:
+                self.assertTrue(request_header.startswith("GET /page%s HTTP/1.1\r\n" % i))
+
+    def test_not_capturing(self):
+        with HttpCapture() as capture:
+            pass
+        requests.get(self.url + "/page")
+        self.assertEqual([], capture.http_headers)
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "http://%s:%s/page" % self.server.server_address)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        else:
+            self.send_response(200)
+            self.send_header("Content-Length", "5")
+            self.end_headers()
+            self.wfile.write("hello")
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.getheader("Content-Length")))
+        self.do_GET()
+
+    def log_message(self, format, *args):
+        pass
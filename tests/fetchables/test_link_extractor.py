@@ -0,0 +1,102 @@
+from tests import TestCase
+from mock import patch
+from socialfeedharvester.fetchables.link_extractor import *
+import socialfeedharvester.fetchables.link_extractor as link_extractor
+
+CONTENT = """
+<html>
+    <head>
+        <link rel='stylesheet' href='/style.css' type='text/css' media='all' />
+        <link rel='alternate stylesheet' href='/alternate.css' />
+        <link rel='icon' href='/favicon.ico' />
+        <script type='text/javascript' src='/load?scripts=true&amp;c=1'></script>
+        <script>var notALink = "<img src='/script.jpg'>";</script>
+        <style>
+            @import url("/import.css");
+            @import '/import2.css';
+            body { background: url(/background.png) no-repeat; }
+        </style>
+    </head>
+    <body>
+        <img src="/image.png" srcset="/image-2x.png 2x, /image-3x.png 3x">
+        <img alt="No source" />
+        <img src="data:image/gif;base64,R0lGODlhAQABAAAAACw=" />
+        <picture><source srcset="/picture.webp"></picture>
+        <div style="background-image: url('/div.jpg')">
+        <a href="/report.PDF">Report</a>
+        <a href="/another/page">Another page</a>
+    </body>
+</html>
+"""
+
+LINKS = [(STYLESHEET, "/style.css"),
+         (STYLESHEET, "/alternate.css"),
+         (SCRIPT, "/load?scripts=true&c=1"),
+         (STYLESHEET, "/import.css"),
+         (STYLESHEET, "/import2.css"),
+         (IMAGE, "/background.png"),
+         (IMAGE, "/image.png"),
+         (IMAGE, "/image-2x.png"),
+         (IMAGE, "/image-3x.png"),
+         (IMAGE, "/picture.webp"),
+         (IMAGE, "/div.jpg"),
+         (PDF, "/report.PDF")]
+
+
+class TestLinkExtractor(TestCase):
+
+    def test_extract_links(self):
+        self.assertEqual(LINKS, extract_links(CONTENT))
+
+    def test_extract_links_with_beautifulsoup(self):
+        self.assertEqual(LINKS, extract_links_with_beautifulsoup(CONTENT))
+
+    def test_entities(self):
+        self.assertEqual([(IMAGE, u"/caf\xe9&.jpg")], extract_links("<img src='/caf\xc3\xa9&amp;.jpg'>"))
+
+    @patch.object(link_extractor, "extract_links_with_beautifulsoup")
+    def test_fallback(self, mock_extract):
+        mock_extract.return_value = [(IMAGE, "/image.png")]
+        #Not utf-8
+        self.assertEqual([(IMAGE, "/image.png")], extract_links("<img src='/caf\xe9.jpg'>"))
+        mock_extract.assert_called_once_with("<img src='/caf\xe9.jpg'>")
+
+
+class TestExtractCssLinks(TestCase):
+
+    def test_extract_css_links(self):
+        css = r"""
+        @charset "utf-8";
+        @import url("/import.css") screen;
+        @import '/import2.css';
+        @IMPORT url(/import3.css);
+        /* background: url(/comment.png); @import "/comment.css"; */
+        .a { background: URL( '/quoted.png' ) no-repeat; }
+        .b { background-image: url(/unquoted.png), url("data:image/gif;base64,R0lGODlhAQABAAAAACw="); }
+        .c { content: "url(/string.png)"; }
+        .d { background: url(/escaped\(1\).png); }
+        .e { background: url("/hex\2e png"); }
+        .f { background: myurl(/not-a-url.png); }
+        @font-face { src: url(/font.woff2) format("woff2"), url('/font.woff') format("woff"); }
+        """
+        self.assertEqual([(STYLESHEET, "/import.css"),
+                          (STYLESHEET, "/import2.css"),
+                          (STYLESHEET, "/import3.css"),
+                          (IMAGE, "/quoted.png"),
+                          (IMAGE, "/unquoted.png"),
+                          (IMAGE, "/escaped(1).png"),
+                          (IMAGE, "/hex.png"),
+                          (IMAGE, "/font.woff2"),
+                          (IMAGE, "/font.woff")], extract_css_links(css))
+
+    def test_escapes(self):
+        self.assertEqual([(IMAGE, "/caf\xc3\xa9.png")], extract_css_links(r".a { background: url('/caf\e9 .png'); }"))
+        self.assertEqual([(IMAGE, u"/caf\u00e9.png")], extract_css_links(ur".a { background: url('/caf\e9 .png'); }"))
+        #Null, surrogates, and beyond unicode are the replacement character.
+        self.assertEqual([(IMAGE, "/\xef\xbf\xbd\xef\xbf\xbd\xef\xbf\xbd.png")],
+                         extract_css_links(r".a { background: url(/\0\d800\110000.png); }"))
+
+    def test_malformed(self):
+        #Unterminated comment, string and url
+        self.assertEqual([(IMAGE, "/1.png")], extract_css_links('.a { background: url(/1.png); content: "abc\n'
+                                                                 '.b { background: url(/2.png /* url(/3.png)'))
@@ -1,7 +1,12 @@
 from tests import TestCase
-from mock import MagicMock
+from mock import MagicMock, patch
 from socialfeedharvester.fetchables.resource import *
 from sfh import SocialFeedHarvester
+from socialfeedharvester.session_pool import SessionPool
+import BaseHTTPServer
+import threading
+import time
+import requests
 
 
 class TestHttp(TestCase):
@@ -36,6 +41,8 @@ class TestHttp(TestCase):
     def test_redirect(self):
         #1.usa.gov is a shortened url service.  Need to test that linked fetchables are relative to unshortened url.
         self.mock_sfh.is_fetched.return_value = False
+        self.mock_sfh.is_captured.return_value = False
+        self.mock_sfh.get_session.return_value = requests.Session()
 
         html = Html("http://1.usa.gov/1OVPWl4", self.mock_sfh)
         (warc_records, fetchables) = html.fetch()
@@ -80,6 +87,149 @@ class TestStylesheet(TestCase):
         self.assertIn(CompareResource(Image, "http://1.test.com/inc/gr/bannerbg.jpg"), fetchables)
         self.assertIn(CompareResource(Image, "http://1.test.com/inc/gr/left.gif"), fetchables)
 
+    def test_process_resource_import(self):
+        stylesheet = Stylesheet("http://test.com/static/test.css", None)
+        fetchables = stylesheet.process_resource('@import url("base.css");\n.a { background: url(a.png); }',
+                                                 "http://test.com/static/test.css")
+        self.assertEqual([CompareResource(Stylesheet, "http://test.com/static/base.css"),
+                          CompareResource(Image, "http://test.com/static/a.png")], fetchables)
+
+    @patch("socialfeedharvester.fetchables.resource.extract_css_links")
+    def test_process_resource_error(self, mock_extract):
+        mock_extract.side_effect = ValueError("Parsing failed")
+        stylesheet = Stylesheet("http://test.com/static/test.css", None)
+        self.assertIsNone(stylesheet.process_resource(".a { background: url(a.png); }",
+                                                      "http://test.com/static/test.css"))
+
+
+class TestUnknownResource(TestCase):
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.requests = []
+        self.url = "http://127.0.0.1:%s" % self.server.server_port
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.pool = SessionPool(timeout=5)
+
+        self.mock_sfh = MagicMock(spec=SocialFeedHarvester)
+        self.mock_sfh.is_fetched.return_value = False
+        self.mock_sfh.is_captured.return_value = False
+        self.mock_sfh.get_session.side_effect = self.pool.get_session
+        self.mock_sfh.fetch_decision.return_value = True
+        self.mock_sfh.get_redirect.return_value = None
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_head(self):
+        self.mock_sfh.sniff_content_type = False
+        (warc_records, fetchable) = UnknownResource(self.url + "/redirect", self.mock_sfh).fetch()
+        self.assertIsNone(warc_records)
+        self.assertEqual(CompareResource(Html, self.url + "/redirect"), fetchable)
+        self.assertEqual(["HEAD /redirect", "HEAD /page.html"], self.server.requests)
+        self.mock_sfh.set_redirect.assert_called_once_with(self.url + "/redirect", self.url + "/page.html", 200,
+                                                           "text/html", archived=False)
+
+    def test_sniff(self):
+        self.mock_sfh.sniff_content_type = True
+        unknown_resource = UnknownResource(self.url + "/redirect", self.mock_sfh)
+        (warc_records, fetchables) = unknown_resource.fetch()
+        self.assertEqual(["request", "response", "request", "response"], [r.type for r in warc_records])
+        self.assertTrue(warc_records[3].payload.endswith("<img src='/image.jpg'></html>"))
+        self.assertEqual([CompareResource(Image, self.url + "/image.jpg")], fetchables)
+        self.assertEqual(["GET /redirect", "GET /page.html"], self.server.requests)
+        self.assertEqual(CompareResource(Html, self.url + "/redirect"),
+                         self.mock_sfh.fetch_decision.call_args[0][0])
+        self.assertIs(unknown_resource, self.mock_sfh.fetch_decision.call_args[0][1])
+        self.mock_sfh.set_fetched.assert_any_call(self.url + "/page.html")
+        self.mock_sfh.set_redirect.assert_called_once_with(self.url + "/redirect", self.url + "/page.html", 200,
+                                                           "text/html", archived=True)
+
+    def test_sniff_unsupported(self):
+        self.mock_sfh.sniff_content_type = True
+        self.assertEqual((None, None), UnknownResource(self.url + "/data.bin", self.mock_sfh).fetch())
+        #The abandoned connection is not reused.
+        self.assertEqual("<html>", self.pool.get_session(self.url).get(self.url + "/page.html").content[:6])
+
+    def test_sniff_not_fetched(self):
+        self.mock_sfh.sniff_content_type = True
+        self.mock_sfh.fetch_decision.return_value = False
+        self.assertEqual((None, None), UnknownResource(self.url + "/image.jpg", self.mock_sfh).fetch())
+        self.assertFalse(self.mock_sfh.set_fetched.called)
+
+
+    def test_redirected(self):
+        self.mock_sfh.sniff_content_type = False
+        self.mock_sfh.get_redirect.return_value = (self.url + "/page.html", 200, "text/html", time.time(), True)
+        (warc_records, fetchable) = UnknownResource(self.url + "/redirect", self.mock_sfh).fetch()
+        self.assertIsNone(warc_records)
+        #Skips the redirect
+        self.assertEqual(CompareResource(Html, self.url + "/page.html"), fetchable)
+        self.assertEqual([], self.server.requests)
+
+    def test_redirected_already_fetched(self):
+        self.mock_sfh.sniff_content_type = False
+        self.mock_sfh.get_redirect.return_value = (self.url + "/page.html", 200, "text/html", time.time(), True)
+        self.mock_sfh.is_fetched.side_effect = lambda url: url == self.url + "/page.html"
+        self.assertEqual((None, None), UnknownResource(self.url + "/redirect", self.mock_sfh).fetch())
+
+    def test_redirected_not_archived(self):
+        self.mock_sfh.sniff_content_type = False
+        self.mock_sfh.get_redirect.return_value = (self.url + "/page.html", 200, "text/html", time.time(), False)
+        (warc_records, fetchable) = UnknownResource(self.url + "/redirect", self.mock_sfh).fetch()
+        #Fetches the redirect, but without a HEAD.
+        self.assertEqual(CompareResource(Html, self.url + "/redirect"), fetchable)
+        self.assertEqual([], self.server.requests)
+
+    def test_redirected_unsupported(self):
+        self.mock_sfh.sniff_content_type = True
+        self.mock_sfh.get_redirect.return_value = (self.url + "/data.bin", 200, "application/octet-stream",
+                                                   time.time(), False)
+        self.assertEqual((None, None), UnknownResource(self.url + "/redirect", self.mock_sfh).fetch())
+        self.assertEqual([], self.server.requests)
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    #Keep-alive
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def _respond(self, send_body):
+        self.server.requests.append("%s %s" % (self.command, self.path))
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/page.html")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        elif self.path == "/page.html":
+            (content_type, body) = ("text/html", "<html><img src='/image.jpg'></html>")
+        elif self.path == "/image.jpg":
+            (content_type, body) = ("image/jpeg", "\xff" * 100000)
+        else:
+            (content_type, body) = ("application/octet-stream", "\x00" * 1000000)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            try:
+                self.wfile.write(body)
+            except IOError:
+                #Client abandoned the response.
+                pass
+
+    def log_message(self, format, *args):
+        pass
+
 
 class CompareResource():
     def __init__(self, clazz, url):
@@ -1,5 +1,12 @@
 import tests
+import json
+import os
+import shutil
+import tempfile
+import warc as ia_warc
 import socialfeedharvester.fetchables.twitter as twitter
+import socialfeedharvester.cdxj as cdxj
+from socialfeedharvester.warc import WarcWriter
 from mock import MagicMock
 from sfh import SocialFeedHarvester
 from socialfeedharvester.fetchables.resource import Image, UnknownResource
@@ -86,3 +93,123 @@ class TestTwitter(tests.TestCase):
         self.mock_sfh.set_state.assert_called_once_with("socialfeedharvester.fetchables.twitter",
                                                         "jlittman_dev.last_tweet_id",
                                                         "577866396094242816")
+
+
+class TestTweetWarcs(tests.TestCase):
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+        self.mock_sfh = MagicMock(spec=SocialFeedHarvester)
+        self.mock_sfh.extraction_processes = 2
+
+    def tearDown(self):
+        shutil.rmtree(self.data_path)
+
+    def write_warc(self, name, first_tweet_id, index=True):
+        filepath = os.path.join(self.data_path, "%s.warc.gz" % name)
+        warc_writer = WarcWriter(filepath, index=index)
+        headers = {"WARC-Type": "response", "WARC-Target-URI": "https://stream.twitter.com/1.1/statuses/sample.json"}
+        warc_writer.write_record(ia_warc.WARCRecord(
+            payload="HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n", headers=headers))
+        for tweet_id in range(first_tweet_id, first_tweet_id + 4, 2):
+            headers = {"WARC-Type": "continuation",
+                       "WARC-Target-URI": "https://stream.twitter.com/1.1/statuses/sample.json"}
+            payload = "".join(json.dumps({"id": i, "entities": {"urls": [
+                {"expanded_url": "http://example.com/%s" % i}]}}) + "\r\n" for i in (tweet_id, tweet_id + 1))
+            warc_writer.write_record(ia_warc.WARCRecord(payload=payload + "{malformed\r\n", headers=headers))
+        warc_writer.close()
+        return filepath
+
+    def fetch_urls(self, fetchable):
+        urls = []
+        for (warc_records, fetchables) in fetchable.fetch_iter():
+            self.assertIsNone(warc_records)
+            urls.extend(f.url for f in fetchables)
+        return sorted(urls)
+
+    def test_extraction_tasks(self):
+        filepath = self.write_warc("indexed", 1)
+        tasks = twitter.extraction_tasks(filepath)
+        #A task for the response and each continuation, in order.
+        self.assertEqual(3, len(tasks))
+        self.assertEqual(sorted(tasks), tasks)
+
+        os.remove(cdxj.cdxj_filepath(filepath))
+        self.assertEqual([(filepath, None, None)], twitter.extraction_tasks(filepath))
+
+    def test_extract_tweet_urls(self):
+        filepath = self.write_warc("indexed", 1)
+        (_, urls, malformed_count) = twitter.extract_tweet_urls((filepath, None, None))
+        self.assertEqual(["http://example.com/%s" % i for i in range(1, 5)], urls)
+        self.assertEqual(2, malformed_count)
+
+        (_, offset, length) = twitter.extraction_tasks(filepath)[1]
+        self.assertEqual((filepath, ["http://example.com/1", "http://example.com/2"], 1),
+                         twitter.extract_tweet_urls((filepath, offset, length)))
+
+    def test_fetch(self):
+        stream_path = os.path.join(self.data_path, "stream")
+        os.makedirs(stream_path)
+        link_filepath = os.path.join(stream_path, "indexed.warc.gz")
+        os.symlink(self.write_warc("indexed", 1), link_filepath)
+        filepath = self.write_warc("not_indexed", 5, index=False)
+
+        tweet_warcs = twitter.TweetWarcs([link_filepath, filepath], self.mock_sfh)
+        self.assertEqual(["http://example.com/%s" % i for i in range(1, 9)], self.fetch_urls(tweet_warcs))
+
+        #Symlink deleted
+        self.assertFalse(os.path.exists(link_filepath))
+        self.assertTrue(os.path.exists(filepath))
+
+        #Resumed, so the deleted symlink is skipped.
+        self.assertEqual(["http://example.com/%s" % i for i in range(5, 9)], self.fetch_urls(tweet_warcs))
+
+    def test_fetch_serially(self):
+        self.mock_sfh.extraction_processes = 1
+        tweet_warc = twitter.TweetWarc(self.write_warc("indexed", 1), self.mock_sfh)
+        self.assertEqual(["http://example.com/%s" % i for i in range(1, 5)], self.fetch_urls(tweet_warc))
+
+    def test_extract_record_tweet_urls(self):
+        def tweet(tweet_id, **kwargs):
+            tweet = {"id": tweet_id, "text": u"{\"entities\": [\u00fcrls]}",
+                     "user": {"entities": {"url": {"urls": [{"expanded_url": "http://user.example.com/"}]}}},
+                     "entities": {"urls": [{"expanded_url": "http://example.com/%s" % tweet_id}]}}
+            tweet.update(kwargs)
+            return tweet
+        lines = [
+            #Entities last, following a retweet
+            '{"id": 1, "retweeted_status": %s, "entities": {"urls": [{"expanded_url": "http://example.com/1"}]}}'
+            % json.dumps(tweet(2)),
+            #Entities first, so the last entities are the retweet's
+            '{"entities": {"urls": [{"expanded_url": "http://example.com/3"}]}, "retweeted_status": %s}'
+            % json.dumps(tweet(4)),
+            json.dumps(tweet(5)),
+            json.dumps(tweet(6, entities={"urls": []})),
+            '{"delete": {"status": {"id": 1}}}',
+            "",
+            "{malformed",
+            json.dumps(tweet(7))
+        ]
+        filepath = os.path.join(self.data_path, "tweets.warc.gz")
+        warc_writer = WarcWriter(filepath)
+        headers = {"WARC-Type": "response", "WARC-Target-URI": "https://stream.twitter.com/1.1/statuses/sample.json"}
+        warc_writer.write_record(ia_warc.WARCRecord(
+            payload="HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n" + "\r\n".join(lines),
+            headers=headers))
+        warc_writer.close()
+
+        expected_urls = ["http://example.com/%s" % i for i in (1, 3, 5, 7)]
+        for (extractor_name, extract) in twitter.TWEET_URL_EXTRACTORS.items():
+            for chunk_size in (7, 1024 * 1024):
+                self.patch_chunk_size(chunk_size)
+                urls = []
+                for warc_record in ia_warc.open(filepath):
+                    self.assertEqual(1, extract(warc_record, urls), extractor_name)
+                self.assertEqual(expected_urls, urls, extractor_name)
+
+    def patch_chunk_size(self, chunk_size):
+        original_chunk_size = twitter._CHUNK_SIZE
+        twitter._CHUNK_SIZE = chunk_size
+
+        def restore():
+            twitter._CHUNK_SIZE = original_chunk_size
+        self.addCleanup(restore)
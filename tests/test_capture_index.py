@@ -0,0 +1,53 @@
+from socialfeedharvester.capture_index import DictCaptureIndex, SqliteCaptureIndex
+from tests import TestCase
+import tempfile
+import os
+import shutil
+import time
+
+
+class TestDictCaptureIndex(TestCase):
+
+    def test_is_captured(self):
+        index = DictCaptureIndex(recapture_age=60)
+        self.assertFalse(index.is_captured("http://example.com/1"))
+        index.add("http://example.com/1", "sha1:1234")
+        index.add("http://example.com/2", "sha1:5678", captured=time.time() - 120)
+        self.assertTrue(index.is_captured("http://example.com/1"))
+        #Captured longer ago than the recapture age
+        self.assertFalse(index.is_captured("http://example.com/2"))
+        self.assertEqual("sha1:5678", index.get_capture("http://example.com/2")[1])
+
+    def test_no_recapture_age(self):
+        index = DictCaptureIndex()
+        index.add("http://example.com/1", "sha1:1234")
+        self.assertFalse(index.is_captured("http://example.com/1"))
+
+
+class TestSqliteCaptureIndex(TestCase):
+
+    def setUp(self):
+        self.collection_path = tempfile.mkdtemp()
+        self.index = SqliteCaptureIndex(self.collection_path, recapture_age=60)
+
+    def tearDown(self):
+        if os.path.exists(self.collection_path):
+            shutil.rmtree(self.collection_path)
+
+    def test_persist(self):
+        self.index.add("http://example.com/1", "sha1:1234")
+        self.assertTrue(self.index.is_captured("http://example.com/1"))
+        self.index.close()
+
+        #Create a new index and test for capture
+        self.index = SqliteCaptureIndex(self.collection_path, recapture_age=60)
+        self.assertTrue(self.index.is_captured("http://example.com/1"))
+        self.assertEqual("sha1:1234", self.index.get_capture("http://example.com/1")[1])
+        self.assertIsNone(self.index.get_capture("http://example.com/2"))
+
+    def test_not_persist(self):
+        index = SqliteCaptureIndex(self.collection_path, persist_on_close=False)
+        index.add("http://example.com/1", "sha1:1234")
+        index.close()
+
+        self.assertIsNone(self.index.get_capture("http://example.com/1"))
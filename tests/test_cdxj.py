@@ -0,0 +1,110 @@
+from __future__ import absolute_import
+from tests import TestCase
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import socialfeedharvester.cdxj as cdxj
+import socialfeedharvester.warc as sfh_warc
+import warc as ia_warc
+
+
+class TestCdxj(TestCase):
+
+    def setUp(self):
+        self.collection_path = tempfile.mkdtemp()
+        self.warc_filepath = os.path.join(self.collection_path, "test-2015-01-05T15:00:00Z.warc.gz")
+
+    def tearDown(self):
+        shutil.rmtree(self.collection_path)
+
+    def write_warc(self):
+        warc_writer = sfh_warc.WarcWriter(self.warc_filepath, warcinfo_fields=sfh_warc.warcinfo_fields("test"),
+                                          index=True)
+        http_response = "HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n\r\n<html></html>"
+        headers = {"WARC-Type": "request", "WARC-Target-URI": "http://www.example.com/b",
+                   "WARC-Date": "2015-01-05T15:00:00Z"}
+        warc_writer.write_record(ia_warc.WARCRecord(payload="GET /b HTTP/1.1\r\n\r\n", headers=headers))
+        headers = {"WARC-Type": "response", "WARC-Target-URI": "http://www.example.com/b",
+                   "WARC-Date": "2015-01-05T15:00:00Z", "WARC-Payload-Digest": "sha1:ABC"}
+        warc_writer.write_record(ia_warc.WARCRecord(payload=http_response, headers=headers))
+        headers = {"WARC-Type": "revisit", "WARC-Target-URI": "http://example.com:8080/a?z=1&y=2",
+                   "WARC-Date": "2015-01-05T15:00:01Z", "WARC-Payload-Digest": "sha1:ABC"}
+        warc_writer.write_record(ia_warc.WARCRecord(payload="HTTP/1.1 200 OK\r\n\r\n", headers=headers))
+        warc_writer.close()
+        return cdxj.cdxj_filepath(self.warc_filepath)
+
+    def test_flush(self):
+        warc_writer = sfh_warc.WarcWriter(self.warc_filepath, index=True)
+        headers = {"WARC-Type": "response", "WARC-Target-URI": "http://example.com/",
+                   "WARC-Date": "2015-01-05T15:00:00Z"}
+        warc_writer.write_record(ia_warc.WARCRecord(payload="HTTP/1.1 200 OK\r\n\r\n", headers=headers))
+        warc_writer.flush()
+        cdxj_filepath = cdxj.cdxj_filepath(self.warc_filepath)
+        #Written as records are written, but not the index until closed.
+        with open(cdxj_filepath + ".tmp") as f:
+            self.assertTrue(f.read().startswith("com,example)/ 20150105150000 "))
+        self.assertFalse(os.path.exists(cdxj_filepath))
+
+        warc_writer.close()
+        self.assertTrue(os.path.exists(cdxj_filepath))
+        self.assertFalse(os.path.exists(cdxj_filepath + ".tmp"))
+
+    def test_url_key(self):
+        self.assertEqual("com,example)/path?a=1&b=2", cdxj.url_key("http://www.Example.com/Path?b=2&a=1"))
+        self.assertEqual("com,example)/", cdxj.url_key("https://example.com"))
+        self.assertEqual("com,example:8080)/", cdxj.url_key("http://example.com:8080/"))
+        self.assertEqual("com,example)/", cdxj.url_key("http://example.com:80/"))
+
+    def test_cdxj_filepath(self):
+        self.assertEqual("/data/test.cdxj", cdxj.cdxj_filepath("/data/test.warc.gz"))
+        self.assertEqual("/data/test.cdxj", cdxj.cdxj_filepath("/data/test.warc"))
+
+    def test_write(self):
+        cdxj_filepath = self.write_warc()
+        self.assertEqual(os.path.join(self.collection_path, "test-2015-01-05T15:00:00Z.cdxj"), cdxj_filepath)
+        with open(cdxj_filepath) as f:
+            lines = f.read().splitlines()
+
+        #Sorted.  No warcinfo or request.
+        self.assertEqual(2, len(lines))
+        (key, timestamp, fields) = lines[0].split(" ", 2)
+        self.assertEqual("com,example)/b", key)
+        self.assertEqual("20150105150000", timestamp)
+        fields = json.loads(fields)
+        self.assertEqual({"url": "http://www.example.com/b", "mime": "text/html", "status": "200", "digest": "ABC",
+                          "length": fields["length"], "offset": fields["offset"],
+                          "filename": "test-2015-01-05T15:00:00Z.warc.gz"}, fields)
+        (key, timestamp, fields) = lines[1].split(" ", 2)
+        self.assertEqual("com,example:8080)/a?y=2&z=1", key)
+        self.assertEqual("warc/revisit", json.loads(fields)["mime"])
+
+        #Seek to the record
+        with open(self.warc_filepath, "rb") as f:
+            f.seek(int(json.loads(lines[0].split(" ", 2)[2])["offset"]))
+            warc_record = ia_warc.WARCFile(fileobj=gzip.GzipFile(fileobj=f)).read_record()
+            self.assertEqual("response", warc_record.type)
+            self.assertEqual("http://www.example.com/b", warc_record["WARC-Target-URI"])
+
+    def test_index_warc(self):
+        cdxj_filepath = self.write_warc()
+        with open(cdxj_filepath) as f:
+            written_lines = f.read()
+        os.remove(cdxj_filepath)
+
+        #Same index as written with the WARC
+        self.assertEqual(cdxj_filepath, cdxj.index_warc(self.warc_filepath))
+        with open(cdxj_filepath) as f:
+            self.assertEqual(written_lines, f.read())
+
+    def test_index_collection(self):
+        cdxj_filepath = self.write_warc()
+        os.remove(cdxj_filepath)
+        os.symlink(self.warc_filepath, os.path.join(self.collection_path, "seed.warc.gz"))
+
+        self.assertEqual([cdxj_filepath], cdxj.index_collection(self.collection_path, processes=2))
+        self.assertTrue(os.path.exists(cdxj_filepath))
+        #Already indexed
+        self.assertEqual([], cdxj.index_collection(self.collection_path, processes=2))
+        self.assertEqual([cdxj_filepath], cdxj.index_collection(self.collection_path, processes=2, reindex=True))
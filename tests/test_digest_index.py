@@ -0,0 +1,47 @@
+from socialfeedharvester.digest_index import DictDigestIndex, SqliteDigestIndex
+from tests import TestCase
+import tempfile
+import os
+import shutil
+
+
+class TestDictDigestIndex(TestCase):
+
+    def test_get(self):
+        index = DictDigestIndex()
+        self.assertIsNone(index.get("sha1:1234"))
+        index.add("sha1:1234", "http://example.com/1", "2015-01-05T15:00:00Z", "<urn:uuid:1>")
+        #Already archived, so not replaced.
+        index.add("sha1:1234", "http://example.com/2", "2015-01-06T15:00:00Z", "<urn:uuid:2>")
+        self.assertEqual(("http://example.com/1", "2015-01-05T15:00:00Z", "<urn:uuid:1>"), index.get("sha1:1234"))
+        self.assertEqual(1, len(index))
+
+
+class TestSqliteDigestIndex(TestCase):
+
+    def setUp(self):
+        self.collection_path = tempfile.mkdtemp()
+        self.index = SqliteDigestIndex(self.collection_path)
+
+    def tearDown(self):
+        if os.path.exists(self.collection_path):
+            shutil.rmtree(self.collection_path)
+
+    def test_persist(self):
+        self.index.add("sha1:1234", "http://example.com/1", "2015-01-05T15:00:00Z", "<urn:uuid:1>")
+        self.index.add("sha1:1234", "http://example.com/2", "2015-01-06T15:00:00Z", "<urn:uuid:2>")
+        self.index.close()
+
+        #Create a new index and test for digest
+        self.index = SqliteDigestIndex(self.collection_path)
+        self.assertEqual(("http://example.com/1", "2015-01-05T15:00:00Z", "<urn:uuid:1>"),
+                         tuple(self.index.get("sha1:1234")))
+        self.assertIsNone(self.index.get("sha1:5678"))
+        self.assertEqual(1, len(self.index))
+
+    def test_not_persist(self):
+        index = SqliteDigestIndex(self.collection_path, persist_on_close=False)
+        index.add("sha1:1234", "http://example.com/1", "2015-01-05T15:00:00Z", "<urn:uuid:1>")
+        index.close()
+
+        self.assertIsNone(self.index.get("sha1:1234"))
@@ -0,0 +1,48 @@
+from socialfeedharvester.fetch_pool import FetchPool
+from tests import TestCase
+from mock import MagicMock
+from socialfeedharvester.fetchables.resource import Image
+
+
+class TestFetchPool(TestCase):
+
+    def setUp(self):
+        self.pool = FetchPool(2)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_fetch(self):
+        mock_f1 = MagicMock(spec=Image, name="f1")
+        mock_f1.fetch.return_value = (None, None)
+        mock_f2 = MagicMock(spec=Image, name="f2")
+        mock_f2.fetch.side_effect = Exception("Fetch failed")
+
+        self.assertTrue(self.pool.has_capacity())
+        self.pool.submit(mock_f1, 1)
+        self.pool.submit(mock_f2, 2)
+        self.assertFalse(self.pool.has_capacity())
+
+        results = [self.pool.next_result() for _ in range(3)]
+        self.assertEqual(0, self.pool.pending)
+        self.assertIn((mock_f1, 1, (None, None), None, False), results)
+        self.assertIn((mock_f1, 1, None, None, True), results)
+        (f, d, r, e, done) = [result for result in results if result[0] == mock_f2][0]
+        self.assertEqual(2, d)
+        self.assertIsNone(r)
+        self.assertEqual("Fetch failed", str(e[1]))
+        self.assertTrue(done)
+
+    def test_fetch_streaming(self):
+        mock_f1 = MagicMock(name="f1")
+        mock_f1.fetch_iter.return_value = iter(((None, (1,)), (None, (2,))))
+        self.pool.submit(mock_f1, 1)
+
+        self.assertEqual((mock_f1, 1, (None, (1,)), None, False), self.pool.next_result())
+        self.assertEqual(1, self.pool.pending)
+        self.assertEqual((mock_f1, 1, (None, (2,)), None, False), self.pool.next_result())
+        self.assertEqual((mock_f1, 1, None, None, True), self.pool.next_result())
+        self.assertEqual(0, self.pool.pending)
+
+    def test_next_result_timeout(self):
+        self.assertIsNone(self.pool.next_result(timeout=0.01))
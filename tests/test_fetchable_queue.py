@@ -1,6 +1,12 @@
-from socialfeedharvester.fetchable_queue import FetchableDeque
-from socialfeedharvester.fetchables.resource import UnsupportedResource
+from socialfeedharvester.fetchable_queue import FetchableDeque, SqliteFetchableQueue, FairFetchableQueue, \
+    to_descriptor, from_descriptor
+from socialfeedharvester.fetchables.resource import UnsupportedResource, Image, Html
+from socialfeedharvester.fetchables.tumblr import Blog
 from tests import TestCase
+import tempfile
+import os
+import shutil
+import json
 
 
 class TestDequeQueue(TestCase):
@@ -34,3 +40,113 @@ class TestDequeQueue(TestCase):
                 #Note this is a seed
                 self.q.add(UnsupportedResource("http://example.com/3", None), depth=2)
         self.assertEqual(3, 3, "Did not iterate over the correct number of fetchables.")
+
+
+class TestFairFetchableQueue(TestCase):
+
+    def setUp(self):
+        self.q = FairFetchableQueue()
+
+    def test_seed_fair(self):
+        seed1 = Html("http://example.com/1.html", None)
+        seed2 = Html("http://example.org/2.html", None)
+        self.q.add((seed1, seed2))
+        self.assertEqual((seed1, 1), self.q.next())
+        #Seed 1 links to many images
+        self.q.add([Image("http://example.com/%s.jpg" % i, None) for i in range(3)], depth=2, parent=seed1)
+        self.q.task_done(seed1)
+        self.assertEqual(4, len(self.q))
+        #Seed 2 is not delayed by the images of seed 1
+        self.assertEqual((seed2, 1), self.q.next())
+        self.q.add(Image("http://example.org/a.jpg", None), depth=2, parent=seed2)
+        self.q.task_done(seed2)
+        urls = [f.url for (f, d) in self.q]
+        self.assertEqual(["http://example.com/0.jpg", "http://example.org/a.jpg",
+                          "http://example.com/1.jpg", "http://example.com/2.jpg"], urls)
+        self.assertEqual(0, len(self.q))
+
+    def test_host_fair(self):
+        seed = Html("http://example.com/1.html", None)
+        self.q.add(seed)
+        self.q.next()
+        self.q.add((Image("http://example.com/1.jpg", None),
+                    Image("http://example.com/2.jpg", None),
+                    Image("http://example.org/3.jpg", None)), depth=2, parent=seed)
+        urls = [f.url for (f, d) in self.q]
+        self.assertEqual(["http://example.com/1.jpg", "http://example.org/3.jpg", "http://example.com/2.jpg"], urls)
+
+    def test_prioritize_depth(self):
+        q = FairFetchableQueue(prioritize_depth=True)
+        seed = Html("http://example.com/1.html", None)
+        q.add(seed)
+        q.next()
+        q.add(Image("http://example.com/1.jpg", None), depth=3, parent=seed)
+        q.add(Image("http://example.com/2.jpg", None), depth=2, parent=seed)
+        q.add(Image("http://example.org/3.jpg", None), depth=1)
+        self.assertEqual([1, 2, 3], [d for (f, d) in q])
+
+
+class TestSqliteFetchableQueue(TestCase):
+
+    def setUp(self):
+        self.collection_path = tempfile.mkdtemp()
+        self.q = SqliteFetchableQueue(self.collection_path)
+        self.q.open(None)
+
+    def tearDown(self):
+        if os.path.exists(self.collection_path):
+            shutil.rmtree(self.collection_path)
+
+    def test_iteration(self):
+        self.q.add((Image("http://example.com/1.jpg", None),
+                    Html("http://example.com/2.html", None)))
+        self.q.add(UnsupportedResource("http://example.com/3", None), depth=2)
+        self.assertEqual(3, len(self.q))
+        fetchables = list(self.q)
+        self.assertEqual(0, len(self.q))
+        self.assertEqual(3, len(fetchables))
+        (fetchable, depth) = fetchables[0]
+        self.assertIsInstance(fetchable, Image)
+        self.assertEqual("http://example.com/1.jpg", fetchable.url)
+        self.assertEqual(1, depth)
+        (fetchable, depth) = fetchables[2]
+        self.assertIsInstance(fetchable, UnsupportedResource)
+        self.assertEqual(2, depth)
+
+    def test_resume(self):
+        self.q.add((Image("http://example.com/1.jpg", None),
+                    Image("http://example.com/2.jpg", None),
+                    Image("http://example.com/3.jpg", None)))
+        (fetchable1, _) = self.q.next()
+        self.q.task_done(fetchable1)
+        #Taken, but not finished
+        self.q.next()
+        self.q.checkpoint()
+        #Not checkpointed
+        self.q.add(Image("http://example.com/4.jpg", None))
+
+        q = SqliteFetchableQueue(self.collection_path)
+        self.assertEqual(2, q.open(None, resume=True))
+        self.assertEqual(["http://example.com/2.jpg", "http://example.com/3.jpg"], [f.url for (f, d) in q])
+
+    def test_not_resume(self):
+        self.q.add(Image("http://example.com/1.jpg", None))
+        self.q.checkpoint()
+
+        q = SqliteFetchableQueue(self.collection_path)
+        self.assertEqual(0, q.open(None))
+        self.assertEqual(0, len(q))
+
+
+class TestDescriptor(TestCase):
+
+    def test_descriptor(self):
+        descriptor = to_descriptor(Blog("libraryjournal", None, incremental=False, per_page=5))
+        self.assertEqual({"class": "socialfeedharvester.fetchables.tumblr.Blog",
+                          "kwargs": {"blog_name": "libraryjournal", "incremental": False, "per_page": 5}},
+                         descriptor)
+        blog = from_descriptor(json.loads(json.dumps(descriptor)), None)
+        self.assertIsInstance(blog, Blog)
+        self.assertEqual("libraryjournal", blog.blog_name)
+        self.assertFalse(blog.incremental)
+        self.assertEqual(5, blog.per_page)
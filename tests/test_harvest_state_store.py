@@ -1,4 +1,4 @@
-from socialfeedharvester.harvest_state_store import JsonHarvestStateStore
+from socialfeedharvester.harvest_state_store import JsonHarvestStateStore, SqliteHarvestStateStore
 from tests import TestCase
 import tempfile
 import os
@@ -40,3 +40,78 @@ class TestJsonHarvestStateStore(TestCase):
         #Create a new store and test for value
         self.store = JsonHarvestStateStore(self.collection_path)
         self.assertEqual("value1", self.store.get_state("resource_type1", "key1"), "Retrieved state not value1")
+
+    def test_checkpoint(self):
+        self.store.set_state("resource_type1", "key1", "value1")
+        self.store.checkpoint()
+
+        #Create a new store without closing and test for value
+        store = JsonHarvestStateStore(self.collection_path)
+        self.assertEqual("value1", store.get_state("resource_type1", "key1"), "Retrieved state not value1")
+
+
+class TestSqliteHarvestStateStore(TestCase):
+
+    def setUp(self):
+        self.collection_path = tempfile.mkdtemp()
+        self.store = SqliteHarvestStateStore(self.collection_path)
+
+    def tearDown(self):
+        if os.path.exists(self.collection_path):
+            shutil.rmtree(self.collection_path)
+
+    def test_set_state(self):
+        self.assertIsNone(self.store.get_state("resource_type1", "key1"), "Has state before state is set")
+        self.store.set_state("resource_type1", "key1", "value1")
+        self.assertEqual("value1", self.store.get_state("resource_type1", "key1"), "Retrieved state not value1")
+        self.store.set_state("resource_type1", "key1", "value2")
+        self.assertEqual("value2", self.store.get_state("resource_type1", "key1"), "Retrieved state not value2")
+        self.store.set_state("resource_type1", "key1", None)
+        self.assertIsNone(self.store.get_state("resource_type1", "key1"), "Has state after state is cleared")
+
+    def test_checkpoint(self):
+        self.store.set_state("resource_type1", "key1", "value1")
+        store = SqliteHarvestStateStore(self.collection_path)
+        self.assertIsNone(store.get_state("resource_type1", "key1"), "Has state before checkpoint")
+        store.close()
+
+        self.store.checkpoint()
+        store = SqliteHarvestStateStore(self.collection_path)
+        self.assertEqual("value1", store.get_state("resource_type1", "key1"), "Retrieved state not value1")
+        store.close()
+
+    def test_persist(self):
+        self.store.set_state("resource_type1", "key1", "value1")
+        self.store.close()
+
+        self.store = SqliteHarvestStateStore(self.collection_path)
+        self.assertEqual("value1", self.store.get_state("resource_type1", "key1"), "Retrieved state not value1")
+        self.store.close()
+
+        #Ignore existing state without persisting, e.g., a dry run
+        self.store = SqliteHarvestStateStore(self.collection_path, load_existing=False, persist_on_close=False)
+        self.assertIsNone(self.store.get_state("resource_type1", "key1"), "Has state when ignoring state")
+        self.store.close()
+        self.store = SqliteHarvestStateStore(self.collection_path)
+        self.assertEqual("value1", self.store.get_state("resource_type1", "key1"), "State erased when not persisting")
+        self.store.close()
+
+        #Ignore existing state
+        self.store = SqliteHarvestStateStore(self.collection_path, load_existing=False)
+        self.assertIsNone(self.store.get_state("resource_type1", "key1"), "Has state when ignoring state")
+        self.store.close()
+        self.store = SqliteHarvestStateStore(self.collection_path)
+        self.assertIsNone(self.store.get_state("resource_type1", "key1"), "Has state after ignoring state")
+
+    def test_migrate(self):
+        collection_path = os.path.join(self.collection_path, "migrate")
+        os.mkdir(collection_path)
+        store = JsonHarvestStateStore(collection_path)
+        store.set_state("resource_type1", "key1", "value1")
+        store.close()
+
+        #An empty database, e.g., left by a dry run, does not prevent importing.
+        SqliteHarvestStateStore(collection_path, persist_on_close=False).close()
+        store = SqliteHarvestStateStore(collection_path)
+        self.assertEqual("value1", store.get_state("resource_type1", "key1"), "Retrieved state not value1")
+        store.close()
@@ -0,0 +1,75 @@
+from socialfeedharvester.host_scheduler import HostScheduler
+from socialfeedharvester.fetchables.resource import UnsupportedResource, Image
+from tests import TestCase
+
+
+class TestHostScheduler(TestCase):
+
+    def setUp(self):
+        self.scheduler = HostScheduler(10, host_overrides={"example.org": {"wait": 0, "max_per_host": 2}})
+
+    def test_next_ready(self):
+        f1 = Image("http://example.com/1.jpg", None)
+        f2 = Image("http://example.com/2.jpg", None)
+        f3 = Image("http://example.net/3.jpg", None)
+        self.scheduler.add(f1, 1)
+        self.scheduler.add(f2, 1)
+        self.scheduler.add(f3, 2)
+        self.assertEqual(3, len(self.scheduler))
+
+        self.assertEqual((f1, 1), self.scheduler.next_ready())
+        self.scheduler.release(f1)
+        #f2 has to wait for example.com, but f3 is ready
+        self.assertEqual((f3, 2), self.scheduler.next_ready())
+        self.scheduler.release(f3)
+        self.assertIsNone(self.scheduler.next_ready())
+        self.assertEqual(1, len(self.scheduler))
+        self.assertGreater(self.scheduler.time_until_ready(), 9)
+
+    def test_burst(self):
+        scheduler = HostScheduler(10, burst=2)
+        f1 = Image("http://example.com/1.jpg", None)
+        f2 = Image("http://example.com/2.jpg", None)
+        f3 = Image("http://example.com/3.jpg", None)
+        scheduler.add(f1, 1)
+        scheduler.add(f2, 1)
+        scheduler.add(f3, 1)
+        self.assertEqual((f1, 1), scheduler.next_ready())
+        scheduler.release(f1)
+        self.assertEqual((f2, 1), scheduler.next_ready())
+        scheduler.release(f2)
+        self.assertIsNone(scheduler.next_ready())
+
+    def test_max_per_host(self):
+        f1 = Image("http://example.org/1.jpg", None)
+        f2 = Image("http://example.org/2.jpg", None)
+        f3 = Image("http://example.org/3.jpg", None)
+        self.scheduler.add(f1, 1)
+        self.scheduler.add(f2, 1)
+        self.scheduler.add(f3, 1)
+        self.assertEqual((f1, 1), self.scheduler.next_ready())
+        self.assertEqual((f2, 1), self.scheduler.next_ready())
+        #At max per host
+        self.assertIsNone(self.scheduler.next_ready())
+        self.assertIsNone(self.scheduler.time_until_ready())
+        self.scheduler.release(f1)
+        self.assertEqual((f3, 1), self.scheduler.next_ready())
+
+    def test_no_hostname(self):
+        f1 = UnsupportedResource("http://example.com/1", None)
+        f2 = UnsupportedResource("http://example.com/2", None)
+        self.scheduler.add(f1, 1)
+        self.scheduler.add(f2, 1)
+        self.assertEqual((f1, 1), self.scheduler.next_ready())
+        self.assertEqual((f2, 1), self.scheduler.next_ready())
+        self.assertIsNone(self.scheduler.time_until_ready())
+
+    def test_max_held(self):
+        scheduler = HostScheduler(10, max_held=2)
+        scheduler.add(Image("http://example.com/1.jpg", None), 1)
+        self.assertFalse(scheduler.is_full())
+        scheduler.add(Image("http://example.com/2.jpg", None), 1)
+        self.assertTrue(scheduler.is_full())
+        scheduler.next_ready()
+        self.assertFalse(scheduler.is_full())
+        self.assertFalse(HostScheduler(10, max_held=None).is_full())
@@ -0,0 +1,60 @@
+from socialfeedharvester.metrics import MetricsRegistry
+from tests import TestCase
+import tempfile
+import os
+import shutil
+import urllib2
+
+
+class TestMetricsRegistry(TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry(buckets=(0.1, 1.0))
+
+    def test_metrics(self):
+        self.registry.inc("fetches_total", type="Image", host="example.com")
+        self.registry.inc("fetches_total", 2, type="Image", host="example.com")
+        self.registry.set("queue_depth", 5)
+        self.registry.observe("fetch_seconds", 0.05, type="Image")
+        self.registry.observe("fetch_seconds", 0.5, type="Image")
+        self.registry.observe("fetch_seconds", 5, type="Image")
+        with self.registry.timer("write_seconds"):
+            pass
+
+        self.assertEqual(3, self.registry.get("fetches_total", type="Image", host="example.com"))
+        self.registry.inc("fetches_total", type="Html", host="example.com")
+        self.assertEqual(4, self.registry.total("fetches_total"))
+        self.assertIsNone(self.registry.get("fetches_total", type="Image"))
+        self.assertEqual(5, self.registry.get("queue_depth"))
+        self.assertEqual((3, 5.55), self.registry.get("fetch_seconds", type="Image"))
+        self.assertEqual(1, self.registry.get("write_seconds")[0])
+
+        prometheus = self.registry.to_prometheus()
+        self.assertIn('fetches_total{host="example.com",type="Image"} 3\n', prometheus)
+        self.assertIn("queue_depth 5\n", prometheus)
+        self.assertIn('fetch_seconds_bucket{type="Image",le="0.1"} 1\n'
+                      'fetch_seconds_bucket{type="Image",le="1.0"} 2\n'
+                      'fetch_seconds_bucket{type="Image",le="+Inf"} 3\n'
+                      'fetch_seconds_sum{type="Image"} 5.55\n'
+                      'fetch_seconds_count{type="Image"} 3\n', prometheus)
+
+        self.assertIn("count=3 total=5.550", self.registry.summary())
+
+    def test_write_textfile(self):
+        self.registry.set("queue_depth", 5)
+        path = tempfile.mkdtemp()
+        try:
+            filepath = os.path.join(path, "metrics.prom")
+            self.registry.write_textfile(filepath)
+            with open(filepath) as metrics_file:
+                self.assertIn("queue_depth 5\n", metrics_file.read())
+        finally:
+            shutil.rmtree(path)
+
+    def test_serve(self):
+        self.registry.set("queue_depth", 5)
+        server = self.registry.serve(0)
+        try:
+            self.assertIn("queue_depth 5\n", urllib2.urlopen("http://127.0.0.1:%s/" % server.server_port).read())
+        finally:
+            server.shutdown()
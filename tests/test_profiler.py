@@ -0,0 +1,43 @@
+from socialfeedharvester.profiler import FetchProfiler, HARVESTER, categorize
+from socialfeedharvester.fetchables.resource import Html, Image
+from tests import TestCase
+import tempfile
+import os
+import shutil
+import json
+
+
+class TestFetchProfiler(TestCase):
+
+    def setUp(self):
+        self.profiler = FetchProfiler()
+
+    def test_profile(self):
+        html = Html("http://example.com/", None)
+        image = Image("http://example.com/1.jpg", None)
+
+        def harvest():
+            with self.profiler.profile(html):
+                json.loads(json.dumps(range(1000)))
+            with self.profiler.profile(image):
+                sum(range(1000))
+
+        self.profiler.run(harvest)
+
+        self.assertEqual([HARVESTER, "Html", "Image"], self.profiler.names())
+        self.assertIn("loads", [func_name for (_, _, func_name) in self.profiler.stats("Html").stats])
+        self.assertNotIn("loads", [func_name for (_, _, func_name) in self.profiler.stats("Image").stats])
+        self.assertGreater(categorize(self.profiler.stats("Html"))["parsing"], 0)
+        report = self.profiler.report(top=5)
+        self.assertIn("parsing", report)
+        self.assertIn("Html", report)
+
+    def test_write(self):
+        path = tempfile.mkdtemp()
+        try:
+            self.profiler.run(sum, range(1000))
+            (pstats_filepath, report_filepath) = self.profiler.write(path)
+            self.assertTrue(os.path.exists(pstats_filepath))
+            self.assertTrue(os.path.exists(report_filepath))
+        finally:
+            shutil.rmtree(path)
@@ -0,0 +1,62 @@
+from socialfeedharvester.redirect_cache import DictRedirectCache, SqliteRedirectCache
+from tests import TestCase
+import tempfile
+import os
+import shutil
+import time
+
+
+class TestDictRedirectCache(TestCase):
+
+    def test_get(self):
+        cache = DictRedirectCache(max_age=60)
+        self.assertIsNone(cache.get("http://t.co/1"))
+        cache.add("http://t.co/1", "http://example.com/1", 200, "text/html")
+        cache.add("http://t.co/2", "http://example.com/2", 200, "text/html", resolved=time.time() - 120)
+        (final_url, status, content_type, _, archived) = cache.get("http://t.co/1")
+        self.assertEqual("http://example.com/1", final_url)
+        self.assertEqual(200, status)
+        self.assertEqual("text/html", content_type)
+        self.assertFalse(archived)
+        #Resolved longer ago than the max age
+        self.assertIsNone(cache.get("http://t.co/2"))
+        self.assertEqual(2, len(cache))
+
+    def test_archived(self):
+        cache = DictRedirectCache()
+        cache.add("http://t.co/1", "http://example.com/1", 200, "text/html", archived=True)
+        #Resolving again does not unarchive
+        cache.add("http://t.co/1", "http://example.com/1", 200, "text/html")
+        self.assertTrue(cache.get("http://t.co/1")[4])
+        #Unless resolved to a different url
+        cache.add("http://t.co/1", "http://example.com/2", 200, "text/html")
+        self.assertFalse(cache.get("http://t.co/1")[4])
+
+
+class TestSqliteRedirectCache(TestCase):
+
+    def setUp(self):
+        self.collection_path = tempfile.mkdtemp()
+        self.cache = SqliteRedirectCache(self.collection_path)
+
+    def tearDown(self):
+        if os.path.exists(self.collection_path):
+            shutil.rmtree(self.collection_path)
+
+    def test_persist(self):
+        self.cache.add("http://t.co/1", "http://example.com/1", 200, "image/jpeg", archived=True)
+        self.cache.close()
+
+        #Create a new cache and test for redirect
+        self.cache = SqliteRedirectCache(self.collection_path)
+        self.assertEqual(("http://example.com/1", 200, "image/jpeg", True),
+                         self.cache.get("http://t.co/1")[0:3] + self.cache.get("http://t.co/1")[4:])
+        self.assertIsNone(self.cache.get("http://t.co/2"))
+        self.assertEqual(1, len(self.cache))
+
+    def test_not_persist(self):
+        cache = SqliteRedirectCache(self.collection_path, persist_on_close=False)
+        cache.add("http://t.co/1", "http://example.com/1", 200, "text/html")
+        cache.close()
+
+        self.assertIsNone(self.cache.get("http://t.co/1"))
@@ -0,0 +1,55 @@
+from socialfeedharvester.session_pool import SessionPool
+from tests import TestCase
+import BaseHTTPServer
+import threading
+
+
+class TestSessionPool(TestCase):
+
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.connections = set()
+        self.url = "http://127.0.0.1:%s" % self.server.server_port
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.pool = SessionPool(timeout=5)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_get_session(self):
+        session = self.pool.get_session("http://example.com/1.jpg")
+        self.assertIs(session, self.pool.get_session("https://example.com/2.jpg"))
+        self.assertIsNot(session, self.pool.get_session("http://example.org/1.jpg"))
+        self.assertEqual(2, len(self.pool))
+
+    def test_keep_alive(self):
+        session = self.pool.get_session(self.url)
+        for i in range(3):
+            resp = session.get("%s/%s" % (self.url, i))
+            self.assertEqual("hello", resp.content)
+        #All requests on the same connection
+        self.assertEqual(1, len(self.server.connections))
+
+    def test_no_cookies(self):
+        session = self.pool.get_session(self.url)
+        session.get(self.url)
+        self.assertEqual(0, len(session.cookies))
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        self.send_response(200)
+        self.send_header("Content-Length", "5")
+        self.send_header("Set-Cookie", "session=1234")
+        self.end_headers()
+        self.wfile.write("hello")
+
+    def log_message(self, format, *args):
+        pass
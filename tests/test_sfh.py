@@ -2,10 +2,12 @@ from tests import TestCase, TUMBLR_API_KEY
 from sfh import SocialFeedHarvester
 import tempfile
 from mock import MagicMock, call
-from socialfeedharvester.fetchable_queue import FetchableDeque
+from socialfeedharvester.fetchable_queue import FetchableDeque, SqliteFetchableQueue
 from socialfeedharvester.fetch_strategy import DefaultFetchStrategy
+from socialfeedharvester.host_scheduler import HostScheduler
 from socialfeedharvester.fetchables.tumblr import Blog
-from socialfeedharvester.fetchables.resource import UnknownResource
+from socialfeedharvester.fetchables.resource import UnknownResource, Resource, Image
+from socialfeedharvester.fetchables.utilities import HttpLibMixin
 from socialfeedharvester.warc import WarcWriter
 
 
@@ -32,22 +34,22 @@ class TestSocialFeedHarvester(TestCase):
     def test_fetch(self):
 
         #Fetchable 1 should not be called because False is returned as the fetch decision.
-        mock_f1 = MagicMock(spec=Blog, name="f1")
+        mock_f1 = MagicMock(spec=Resource, name="f1")
         #Fetchable 2 should be called, but does not return any warc records or additional fetchables.
-        mock_f2 = MagicMock(spec=Blog, name="f2")
+        mock_f2 = MagicMock(spec=Resource, name="f2")
         mock_f2.fetch.return_value = (None, None)
         #Fetchable 4 returns 2 warc records, which should be passed to warc writer.
         mock_wr1 = MagicMock(name="warc record1")
         mock_wr2 = MagicMock(name="warc record2")
-        mock_f4 = MagicMock(spec=Blog, name="f4")
+        mock_f4 = MagicMock(spec=Resource, name="f4")
         mock_f4.fetch.return_value = ((mock_wr1, mock_wr2), None)
         #Fetchable 3 should be called and return fetchable 4.
-        mock_f3 = MagicMock(spec=Blog, name="f3")
+        mock_f3 = MagicMock(spec=Resource, name="f3")
         mock_f3.fetch.return_value = (None, (mock_f4,))
 
         #Fetchable 5 is an UnknownResource which will return fetchable 6.
         #Fetchable 6 should be at depth 1 (instead of 2).
-        mock_f6 = MagicMock(spec=Blog, name="f6")
+        mock_f6 = MagicMock(spec=Resource, name="f6")
         mock_f6.fetch.return_value = (None, None)
         mock_f5 = MagicMock(spec=UnknownResource, name="f5")
         mock_f5.fetch.return_value = (None, (mock_f6,))
@@ -82,8 +84,223 @@ class TestSocialFeedHarvester(TestCase):
                           call.fetch_decision(mock_f6, 1)], mock_fs.mock_calls)
         self.assertEqual([call.write_record(mock_wr1),
                           call.write_record(mock_wr2),
+                          call.flush(),
                           call.close()], mock_ww.mock_calls)
 
+    def test_fetch_sniffed(self):
+        #Fetchable 1 is an UnknownResource which is fetched as fetchable 2 and returns fetchable 3.
+        #Fetchable 3 should be at depth 2.
+        mock_wr = MagicMock(name="warc record")
+        mock_f2 = MagicMock(spec=Resource, name="f2")
+        mock_f3 = MagicMock(spec=Resource, name="f3")
+        mock_f3.fetch.return_value = (None, None)
+        mock_f1 = MagicMock(spec=UnknownResource, name="f1")
+
+        mock_fs = MagicMock(spec=DefaultFetchStrategy)
+        mock_fs.fetch_decision.return_value = True
+
+        sfh = SocialFeedHarvester([], fetch_strategy=mock_fs, warc_writer=MagicMock(spec=WarcWriter),
+                                  sniff_content_type=True)
+
+        def fetch():
+            self.assertTrue(sfh.fetch_decision(mock_f2, mock_f1))
+            return (mock_wr,), (mock_f3,)
+        mock_f1.fetch.side_effect = fetch
+
+        sfh._fetchable_queue.add((mock_f1,))
+        sfh.fetch()
+
+        self.assertTrue(mock_f3.fetch.called)
+        self.assertEqual([call.fetch_decision(mock_f1, 1),
+                          call.fetch_decision(mock_f2, 1),
+                          call.fetch_decision(mock_f3, 2)], mock_fs.mock_calls)
+
+    def test_deduplicate(self):
+        mixin = HttpLibMixin()
+        mock_f1 = MagicMock(spec=Resource, name="f1")
+        mock_f1.fetch.return_value = ((mixin.to_warc_record("response", "http://example.com/1",
+                                                            http_header="HTTP/1.1 200 OK\r\n", http_body="hello"),),
+                                      None)
+        mock_f2 = MagicMock(spec=Resource, name="f2")
+        mock_f2.fetch.return_value = ((mixin.to_warc_record("response", "http://example.com/2",
+                                                            http_header="HTTP/1.1 200 OK\r\n", http_body="hello"),),
+                                      None)
+        mock_fs = MagicMock(spec=DefaultFetchStrategy)
+        mock_fs.fetch_decision.return_value = True
+        mock_ww = MagicMock(spec=WarcWriter)
+
+        sfh = SocialFeedHarvester([], fetch_strategy=mock_fs, warc_writer=mock_ww)
+        sfh._fetchable_queue.add((mock_f1, mock_f2))
+        sfh.fetch()
+
+        (response_record, revisit_record) = [c[1][0] for c in mock_ww.write_record.mock_calls]
+        self.assertEqual("response", response_record.type)
+        self.assertEqual("revisit", revisit_record.type)
+        self.assertEqual("http://example.com/1", revisit_record["WARC-Refers-To-Target-URI"])
+        self.assertEqual("HTTP/1.1 200 OK\r\n\r\n", revisit_record.payload)
+        self.assertEqual(5, sfh.metrics.get("sfh_revisit_bytes_saved_total"))
+
+    def test_metrics(self):
+        mock_wr = MagicMock(name="warc record")
+        mock_wr.type = "response"
+        mock_wr.header = {"Content-Length": "100"}
+        mock_f1 = MagicMock(spec=Resource, name="f1")
+        mock_f1.hostname = "example.com"
+        mock_f1.fetch.return_value = ((mock_wr,), None)
+        mock_f2 = MagicMock(spec=Resource, name="f2")
+        mock_f2.hostname = "example.com"
+        mock_f2.fetch.side_effect = Exception("Fetch failed")
+        mock_fs = MagicMock(spec=DefaultFetchStrategy)
+        mock_fs.fetch_decision.return_value = True
+
+        sfh = SocialFeedHarvester([], fetch_strategy=mock_fs)
+        sfh._fetchable_queue.add((mock_f1, mock_f2))
+        self.assertRaises(Exception, sfh.fetch)
+
+        self.assertEqual(2, sfh.metrics.get("sfh_fetches_total", type="Resource", host="example.com"))
+        self.assertEqual(1, sfh.metrics.get("sfh_fetch_errors_total", type="Resource", host="example.com"))
+        self.assertEqual(2, sfh.metrics.get("sfh_fetch_seconds", type="Resource", host="example.com")[0])
+        self.assertEqual(1, sfh.metrics.get("sfh_warc_records_total", type="response"))
+        self.assertEqual(100, sfh.metrics.get("sfh_warc_bytes_total", type="response"))
+        self.assertEqual(0, sfh.metrics.get("sfh_queue_depth"))
+
+    def test_fetch_streaming(self):
+        #Fetchable 1 streams 2 pages.  The warc records and linked fetchables of the first page should be processed
+        #before the second page is fetched.
+        mock_wr1 = MagicMock(name="warc record1")
+        mock_wr2 = MagicMock(name="warc record2")
+        mock_f2 = MagicMock(spec=Resource, name="f2")
+        mock_f2.fetch.return_value = (None, None)
+        mock_ww = MagicMock(spec=WarcWriter)
+
+        def fetch_iter():
+            yield (mock_wr1,), (mock_f2,)
+            self.assertEqual([call.write_record(mock_wr1)], mock_ww.mock_calls)
+            self.assertEqual(1, len(sfh._fetchable_queue))
+            yield (mock_wr2,), None
+
+        mock_f1 = MagicMock(spec=Blog, name="f1")
+        mock_f1.fetch_iter.side_effect = fetch_iter
+
+        mock_fs = MagicMock(spec=DefaultFetchStrategy)
+        mock_fs.fetch_decision.return_value = True
+
+        sfh = SocialFeedHarvester([],
+                                  fetch_strategy=mock_fs,
+                                  warc_writer=mock_ww)
+        sfh._fetchable_queue.add(mock_f1)
+        sfh.fetch()
+
+        self.assertFalse(mock_f1.fetch.called)
+        self.assertTrue(mock_f2.fetch.called)
+        self.assertEqual([call.write_record(mock_wr1),
+                          call.write_record(mock_wr2),
+                          call.flush(),
+                          call.close()], mock_ww.mock_calls)
+
+    def test_fetch_concurrently(self):
+        #Fetchable 2 is returned as a linked fetchable by fetchable 1.
+        mock_wr1 = MagicMock(name="warc record1")
+        mock_f2 = MagicMock(spec=UnknownResource, name="f2", hostname="example.com")
+        mock_f2.fetch.return_value = ((mock_wr1,), None)
+        mock_f1 = MagicMock(spec=UnknownResource, name="f1", hostname="example.com")
+        mock_f1.fetch.return_value = (None, (mock_f2,))
+        mock_f3 = MagicMock(spec=UnknownResource, name="f3", hostname="example.org")
+        mock_f3.fetch.return_value = (None, None)
+
+        mock_fs = MagicMock(spec=DefaultFetchStrategy)
+        mock_fs.fetch_decision.return_value = True
+
+        mock_ww = MagicMock(spec=WarcWriter)
+
+        sfh = SocialFeedHarvester([],
+                                  fetch_strategy=mock_fs,
+                                  warc_writer=mock_ww,
+                                  workers=2)
+        sfh._fetchable_queue.add((mock_f1, mock_f3))
+        sfh.fetch()
+
+        self.assertTrue(mock_f1.fetch.called)
+        self.assertTrue(mock_f2.fetch.called)
+        self.assertTrue(mock_f3.fetch.called)
+        self.assertEqual([call.write_record(mock_wr1),
+                          call.flush(),
+                          call.close()], mock_ww.mock_calls)
+
+    def test_fetch_concurrently_exception(self):
+        mock_f1 = MagicMock(spec=UnknownResource, name="f1", hostname="example.com")
+        mock_f1.fetch.side_effect = Exception("Fetch failed")
+
+        mock_ww = MagicMock(spec=WarcWriter)
+
+        sfh = SocialFeedHarvester([],
+                                  warc_writer=mock_ww,
+                                  workers=2)
+        sfh._fetchable_queue.add(mock_f1)
+        self.assertRaises(Exception, sfh.fetch)
+        self.assertEqual([call.flush(), call.close()], mock_ww.mock_calls)
+
+    def test_empty_host_scheduler(self):
+        #An empty host scheduler is falsy, but is still used.
+        hs = HostScheduler(10)
+        sfh = SocialFeedHarvester([], host_scheduler=hs)
+        self.assertIs(hs, sfh._host_scheduler)
+
+    def test_max_held(self):
+        mock_fs = MagicMock(spec=DefaultFetchStrategy)
+        mock_fs.fetch_decision.return_value = True
+        sfh = SocialFeedHarvester([], fetch_strategy=mock_fs, host_scheduler=HostScheduler(10, max_held=2))
+        sfh._fetchable_queue.add([Image("http://example.com/%s.jpg" % i, None) for i in range(5)])
+
+        self.assertEqual("http://example.com/0.jpg", sfh._next_ready_fetchable()[0].url)
+        #example.com is waiting, so its fetchables are held until full.
+        self.assertIsNone(sfh._next_ready_fetchable())
+        self.assertEqual(2, len(sfh._host_scheduler))
+        self.assertEqual(2, len(sfh._fetchable_queue))
+
+    def test_host_never_ready(self):
+        mock_f1 = MagicMock(spec=Resource, name="f1", hostname="example.com")
+        mock_fs = MagicMock(spec=DefaultFetchStrategy)
+        mock_fs.fetch_decision.return_value = True
+        sfh = SocialFeedHarvester([], fetch_strategy=mock_fs,
+                                  host_scheduler=HostScheduler(0, host_overrides={"example.com": {"max_per_host": 0}}))
+        sfh._fetchable_queue.add(mock_f1)
+        sfh.fetch()
+        self.assertFalse(mock_f1.fetch.called)
+        self.assertEqual(1, len(sfh._host_scheduler))
+
+    def test_checkpoint(self):
+        mock = MagicMock()
+        mock.ww = MagicMock(spec=WarcWriter)
+        mock.fq = MagicMock(spec=SqliteFetchableQueue)
+
+        sfh = SocialFeedHarvester([], warc_writer=mock.ww, fetchable_queue=mock.fq)
+        sfh.checkpoint()
+        #Records are flushed before the queue is committed.
+        self.assertEqual([call.ww.flush(), call.fq.checkpoint()],
+                         [c for c in mock.mock_calls if c in (call.ww.flush(), call.fq.checkpoint())])
+
+    def test_resume(self):
+        fq = SqliteFetchableQueue(self.data_path)
+        fq.open(None)
+        fq.add(Image("http://example.com/1.jpg", None))
+        fq.checkpoint()
+
+        fq = SqliteFetchableQueue(self.data_path)
+        sfh = SocialFeedHarvester([
+                                      {
+                                          "type": "resource",
+                                          "url": "http://example.com/2.html"
+                                      }
+                                  ],
+                                  fetchable_queue=fq,
+                                  resume=True)
+        #Seeds are not queued
+        self.assertEqual(1, len(fq))
+        (fetchable, depth) = fq.next()
+        self.assertEqual("http://example.com/1.jpg", fetchable.url)
+        self.assertEqual(sfh, fetchable.sfh)
+
     def test_get_auth(self):
         sfh = SocialFeedHarvester([],
                                   auths={"twitter": {"token": "1234"}, "flickr": {"secret": "4567"}})
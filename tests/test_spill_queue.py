@@ -0,0 +1,71 @@
+from socialfeedharvester.spill_queue import SpillQueue
+from tests import TestCase
+import Queue
+import threading
+import time
+
+
+class TestSpillQueue(TestCase):
+
+    def setUp(self):
+        self.queue = SpillQueue(maxsize=2)
+
+    def tearDown(self):
+        self.queue.close()
+
+    def test_spill(self):
+        for i in range(5):
+            self.queue.put(("tweet", i))
+        self.assertEqual(5, self.queue.qsize())
+        self.assertEqual(3, self.queue.spilled_count)
+        self.assertTrue(self.queue.spill_size > 0)
+
+        self.assertEqual(("tweet", 0), self.queue.get())
+        self.assertEqual(("tweet", 1), self.queue.get())
+        #Spilling continues until the spill file is drained, so that order is kept.
+        self.queue.put(("tweet", 5))
+        self.assertEqual(4, self.queue.spilled_count)
+        self.assertEqual([("tweet", i) for i in range(2, 6)], [self.queue.get() for _ in range(4)])
+        self.assertEqual(0, self.queue.qsize())
+        self.assertEqual(0, self.queue.spill_size)
+
+        #Drained, so back to memory.
+        self.queue.put(("tweet", 6))
+        self.assertEqual(4, self.queue.spilled_count)
+        self.assertEqual(("tweet", 6), self.queue.get())
+
+    def test_steady(self):
+        queue = SpillQueue(maxsize=1, segment_size=1000)
+        for i in range(10):
+            queue.put("tweet %s" % i)
+        #Taking items as fast as they are put, so never catching up.
+        for i in range(10, 1000):
+            queue.put("tweet %s" % i)
+            self.assertEqual("tweet %s" % (i - 10), queue.get())
+            self.assertEqual(10, queue.qsize())
+            #Spill files are removed as they are drained.
+            self.assertTrue(queue.spill_files_size < queue.spill_size + 1100)
+        self.assertEqual(["tweet %s" % i for i in range(990, 1000)], [queue.get() for _ in range(10)])
+        self.assertEqual(0, queue.spill_files_size)
+        queue.close()
+
+    def test_get_timeout(self):
+        self.assertRaises(Queue.Empty, self.queue.get, timeout=0.01)
+
+    def test_max_spill_size(self):
+        queue = SpillQueue(maxsize=1, max_spill_size=1)
+        queue.put("tweet 0")
+        queue.put("tweet 1")
+        #The spill file is full, so put waits for a get.
+        thread = threading.Thread(target=queue.put, args=("tweet 2",))
+        thread.start()
+        time.sleep(0.05)
+        self.assertTrue(thread.is_alive())
+        self.assertEqual(2, queue.qsize())
+
+        self.assertEqual("tweet 0", queue.get())
+        self.assertEqual("tweet 1", queue.get())
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual("tweet 2", queue.get())
+        queue.close()
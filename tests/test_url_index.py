@@ -0,0 +1,32 @@
+from socialfeedharvester.url_index import FingerprintUrlIndex, BloomFilterUrlIndex
+from tests import TestCase
+
+
+class TestFingerprintUrlIndex(TestCase):
+
+    def setUp(self):
+        self.index = FingerprintUrlIndex()
+
+    def test_add(self):
+        self.assertNotIn("http://example.com/1", self.index)
+        self.index.add("http://example.com/1")
+        self.index.add(u"http://example.com/\u00e9")
+        self.index.add("http://example.com/1")
+        self.assertIn("http://example.com/1", self.index)
+        self.assertIn(u"http://example.com/\u00e9", self.index)
+        self.assertNotIn("http://example.com/2", self.index)
+        self.assertEqual(2, len(self.index))
+
+
+class TestBloomFilterUrlIndex(TestCase):
+
+    def setUp(self):
+        self.index = BloomFilterUrlIndex(1000, error_rate=0.001)
+
+    def test_add(self):
+        for i in range(1000):
+            self.index.add("http://example.com/%s" % i)
+        for i in range(1000):
+            self.assertIn("http://example.com/%s" % i, self.index)
+        false_positives = len([i for i in range(1000, 11000) if "http://example.com/%s" % i in self.index])
+        self.assertLess(false_positives, 50, "Too many false positives.")
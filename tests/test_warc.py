@@ -1,6 +1,8 @@
 from __future__ import absolute_import
 from tests import TestCase
 import tempfile
+import gzip
+from mock import MagicMock
 import os
 import socialfeedharvester.warc as sfh_warc
 import warc as ia_warc
@@ -24,4 +26,149 @@ class TestWarcWriter(TestCase):
             count += 1
             self.assertEqual("response", r["WARC-Type"], "WARC-Type is not response.")
             self.assertEqual("helloworld", r.payload.read(), "Payload is not correct.")
-        self.assertEqual(1, count, "WARC file does not contain 1 record.")
\ No newline at end of file
+        self.assertEqual(1, count, "WARC file does not contain 1 record.")
+
+    def test_write_gzip(self):
+        warc_filepath = os.path.join(tempfile.mkdtemp(), "test.warc.gz")
+        warc_writer = sfh_warc.WarcWriter(warc_filepath, compresslevel=1)
+        warc_writer.write_record(ia_warc.WARCRecord(payload="hello", headers={"WARC-Type": "response"}))
+        warc_writer.write_record(ia_warc.WARCRecord(payload=u"world", headers={"WARC-Type": "resource",
+                                                                                "WARC-Target-URI": u"http://x/\u00e9"}))
+        warc_writer.close()
+
+        #Each record is a gzip member, so can be read independently.
+        f = ia_warc.open(warc_filepath)
+        offsets = [offset for (_, offset, _) in f.browse()]
+        self.assertEqual(2, len(offsets))
+        with open(warc_filepath, "rb") as f:
+            f.seek(offsets[1])
+            record = ia_warc.WARCFile(fileobj=gzip.GzipFile(fileobj=f)).read_record()
+        self.assertEqual("resource", record.type)
+        self.assertEqual("world", record.payload.read())
+
+
+class TestRotatingWarcWriter(TestCase):
+
+    def setUp(self):
+        self.data_path = tempfile.mkdtemp()
+
+    def test_rotate_by_size(self):
+        warc_writer = sfh_warc.RotatingWarcWriter(self.data_path, "test", max_size=1)
+        for i in range(3):
+            warc_writer.write_record(ia_warc.WARCRecord(payload="helloworld%s" % i, headers={"WARC-Type": "response"}))
+        warc_writer.close()
+
+        #Rotated after the warcinfo record and each record
+        self.assertEqual(3, len(warc_writer.filepaths))
+        for (i, filepath) in enumerate(warc_writer.filepaths):
+            self.assertTrue(filepath.endswith("-%05d.warc.gz" % i))
+            records = [(r.type, r.header.get("WARC-Filename"), r.payload.read()) for r in ia_warc.open(filepath)]
+            self.assertEqual(("warcinfo", os.path.basename(filepath)), records[0][:2])
+            self.assertTrue("isPartOf: test\r\n" in records[0][2])
+            self.assertEqual(("response", None, "helloworld%s" % i), records[1])
+            self.assertEqual(2, len(records))
+
+    def test_rotate_by_time(self):
+        warc_writer = sfh_warc.RotatingWarcWriter(self.data_path, "test", max_minutes=1)
+        warc_writer.write_record(ia_warc.WARCRecord(payload="hello", headers={"WARC-Type": "response"}))
+        warc_writer.write_record(ia_warc.WARCRecord(payload="world", headers={"WARC-Type": "response"}))
+        self.assertEqual(1, len(warc_writer.filepaths))
+        warc_writer._warc_writer.opened -= 60
+        warc_writer.write_record(ia_warc.WARCRecord(payload="again", headers={"WARC-Type": "response"}))
+        warc_writer.close()
+        self.assertEqual(2, len(warc_writer.filepaths))
+
+    def test_no_records(self):
+        warc_writer = sfh_warc.RotatingWarcWriter(self.data_path, "test", max_size=1)
+        warc_writer.close()
+        self.assertEqual([], warc_writer.filepaths)
+
+
+class TestAsyncWarcWriter(TestCase):
+
+    def setUp(self):
+        self.warc_filepath = os.path.join(tempfile.mkdtemp(), "test.warc.gz")
+
+    def test_write(self):
+        warc_writer = sfh_warc.AsyncWarcWriter(sfh_warc.WarcWriter(self.warc_filepath), queue_size=2)
+        for i in range(10):
+            warc_writer.write_record(ia_warc.WARCRecord(payload="helloworld%s" % i, headers={"WARC-Type": "response"}))
+        warc_writer.close()
+        self.assertEqual(0, warc_writer.qsize())
+
+        #Written in order
+        self.assertEqual(["helloworld%s" % i for i in range(10)],
+                         [r.payload.read() for r in ia_warc.open(self.warc_filepath)])
+
+    def test_flush(self):
+        warc_writer = sfh_warc.AsyncWarcWriter(sfh_warc.WarcWriter(self.warc_filepath), queue_size=2)
+        for i in range(10):
+            warc_writer.write_record(ia_warc.WARCRecord(payload="helloworld%s" % i, headers={"WARC-Type": "response"}))
+        warc_writer.flush()
+        self.assertEqual(0, warc_writer.qsize())
+
+        #Written without closing
+        self.assertEqual(["helloworld%s" % i for i in range(10)],
+                         [r.payload.read() for r in ia_warc.open(self.warc_filepath)])
+        warc_writer.close()
+
+    def test_write_error(self):
+        mock_warc_writer = MagicMock()
+        mock_warc_writer.write_record.side_effect = IOError("No space left on device")
+        warc_writer = sfh_warc.AsyncWarcWriter(mock_warc_writer)
+        warc_writer.write_record(ia_warc.WARCRecord(payload="helloworld", headers={"WARC-Type": "response"}))
+        self.assertRaises(IOError, warc_writer.close)
+        mock_warc_writer.close.assert_called_once_with()
+
+
+class TestPayloadBuffer(TestCase):
+
+    def test_write_record(self):
+        payload_buffer = sfh_warc.PayloadBuffer(max_memory_size=10)
+        for i in range(10):
+            payload_buffer.write("helloworld%s\r\n" % i)
+        payload_buffer.write(u"\u00e9")
+        payload = "".join("helloworld%s\r\n" % i for i in range(10)) + "\xc3\xa9"
+        self.assertEqual(len(payload), payload_buffer.length)
+        self.assertEqual(sfh_warc.payload_digest(payload), payload_buffer.payload_digest())
+        #Spilled to a temporary file
+        self.assertTrue(payload_buffer._file._rolled)
+
+        http_header = "HTTP/1.1 200 OK\r\n\r\n"
+        record = ia_warc.WARCRecord(payload=payload_buffer.open(http_header),
+                                    headers={"WARC-Type": "response",
+                                             "Content-Length": str(len(http_header) + payload_buffer.length),
+                                             "WARC-Payload-Digest": payload_buffer.payload_digest()})
+        warc_filepath = os.path.join(tempfile.mkdtemp(), "test.warc.gz")
+        warc_writer = sfh_warc.WarcWriter(warc_filepath, index=True)
+        warc_writer.write_record(record)
+        warc_writer.close()
+        payload_buffer.close()
+
+        records = [(r.type, r.payload.read()) for r in ia_warc.open(warc_filepath)]
+        self.assertEqual([("response", http_header + payload)], records)
+
+
+class TestRevisitRecord(TestCase):
+
+    def test_payload_digest(self):
+        self.assertEqual("sha1:NLP3DA5EULEUUL4S3K223Z3CUR4ITJNB", sfh_warc.payload_digest("helloworld"))
+
+    def test_to_revisit_record(self):
+        record = ia_warc.WARCRecord(payload="HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\nhelloworld",
+                                    headers={"WARC-Type": "response",
+                                             "WARC-Target-URI": "http://example.com/2",
+                                             "WARC-Payload-Digest": sfh_warc.payload_digest("helloworld")})
+        revisit_record = sfh_warc.to_revisit_record(record, "http://example.com/1", "2015-01-05T15:00:00Z",
+                                                    "<urn:uuid:1234>")
+        self.assertEqual("revisit", revisit_record.type)
+        self.assertEqual("HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\n", revisit_record.payload)
+        self.assertEqual(str(len(revisit_record.payload)), revisit_record["Content-Length"])
+        self.assertEqual(sfh_warc.REVISIT_PROFILE, revisit_record["WARC-Profile"])
+        self.assertEqual("http://example.com/2", revisit_record["WARC-Target-URI"])
+        self.assertEqual("http://example.com/1", revisit_record["WARC-Refers-To-Target-URI"])
+        self.assertEqual("2015-01-05T15:00:00Z", revisit_record["WARC-Refers-To-Date"])
+        self.assertEqual("<urn:uuid:1234>", revisit_record["WARC-Refers-To"])
+        self.assertEqual(record["WARC-Payload-Digest"], revisit_record["WARC-Payload-Digest"])
+        self.assertEqual(record["WARC-Date"], revisit_record["WARC-Date"])
+        self.assertNotEqual(record.header.record_id, revisit_record.header.record_id)
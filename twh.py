@@ -1,16 +1,20 @@
 import time
 import logging
-import httplib as http_client
+import sys
+import threading
 
 from tweepy.streaming import StreamListener
 from tweepy import OAuthHandler
 from tweepy import Stream
 import config
 import os
-import warc
-from socialfeedharvester.utilities import HttpLibMixin
+from socialfeedharvester.fetchables.utilities import HttpLibMixin
+from socialfeedharvester.metrics import MetricsRegistry
+from socialfeedharvester.profiler import FetchProfiler, NullFetchProfiler
+from socialfeedharvester.spill_queue import SpillQueue
 import requests
 import socialfeedharvester.utilities as utilities
+from socialfeedharvester.warc import PayloadBuffer, WarcWriter, warcinfo_fields
 import socialfeedharvester.fetchables.twitter as twitter
 
 
@@ -24,10 +28,13 @@ With the Twitter streaming api, an http connection is kept open for a long perio
 The payload is spread across multiple warc records using the warc continuation mechanism. A new warc file is used
 whenever a new connection is made or after a set duration.
 
+So that compressing and writing warc files does not hold up reading from the stream, which risks being disconnected
+as a slow consumer, the thread reading the stream only queues the tweets.  The warc files are written by a separate
+thread.  If the writer falls behind, tweets are spilled to temporary files in the data directory.
+
 Because of the streaming nature, related content (e.g., images) cannot be fetched at the same time as the tweets. This
 will need to be added as a post-processing step.
 """
-#TODO: Add warcinfo record
 
 log = logging.getLogger(__name__)
 
@@ -62,10 +69,9 @@ class SessionDecorator(requests.Session, HttpLibMixin):
         self.http_headers = []
 
     def request(self, *args, **kwargs):
-        resp, capture_out = self.wrap_execute(
-            lambda: requests.Session.request(self, *args, **kwargs),
-            http_client.HTTPConnection)
-        self.http_headers = self.parse_capture(capture_out)
+        resp, capture = self.wrap_execute(
+            lambda: requests.Session.request(self, *args, **kwargs))
+        self.http_headers = self.parse_capture(capture)
 
         return resp
 
@@ -74,7 +80,18 @@ class WarcListener(StreamListener, HttpLibMixin):
     """
     A listener which writes data to a rotating warc file.
     """
-    def __init__(self, collection, stream_name, data_dir, seed=False, duration_minutes=15, tweets_per_record=25000):
+    def __init__(self, collection, stream_name, data_dir, seed=False, duration_minutes=15, tweets_per_record=25000,
+                 max_payload_memory=8 * 1024 * 1024, queue_size=10000, max_spill_size=1024 * 1024 * 1024,
+                 metrics=None, profiler=None):
+        """
+        :param max_payload_memory: The number of bytes of the tweets of a record to buffer in memory before buffering
+        them in a temporary file.
+        :param queue_size: The number of tweets waiting to be written to keep in memory before spilling them to disk.
+        :param max_spill_size: The maximum number of bytes of tweets waiting to be written to spill to disk.  When
+        reached, reading from the stream waits for the writer.
+        :param metrics: Metrics registry to record the queue depth and write lag in.
+        :param profiler: Fetch profiler to profile the writer with, as a profile named for this class.
+        """
         StreamListener.__init__(self)
         log.info("Streaming %s tweets for %s collection into %s. Rotating files every %s minutes. Rotating "
                  "records every %s tweets",
@@ -95,33 +112,47 @@ class WarcListener(StreamListener, HttpLibMixin):
         self.warc = None
         self.warc_filepath = None
         self.segment_origin_id = None
-        self.payload = ""
+        self.max_payload_memory = max_payload_memory
+        self.payload = PayloadBuffer(max_memory_size=self.max_payload_memory)
         self.segment = 1
         self.segment_total_length = 0
         self.tweet_count = 0
         #These will be set by StreamDecorator
         self.session = None
         self.url = None
+        #Request and response headers of the current connection
+        self.http_headers = None
+        self.metrics = metrics or MetricsRegistry()
+        self._profiler = profiler or NullFetchProfiler()
+
+        #Tweets and connections are queued by the reader for the writer as (event, time received, data).
+        self._queue = SpillQueue(maxsize=queue_size, max_spill_size=max_spill_size, spill_dir=self.data_dir)
+        self._exc_info = None
+        self._thread = threading.Thread(target=self._write_events, name="twh-writer")
+        self._thread.daemon = True
+        self._thread.start()
 
     def on_data(self, data):
-        #See if rotating file necessary
-        if time.time() - self.period_start_time > (self.duration_minutes * 60):
-            log.debug("Rotating file")
-            self.close_warc()
-            self.open_warc()
-        elif self.tweet_count >= self.tweets_per_record:
-            log.debug("Rotating record")
-            self.write_warc_record()
-        self.payload += data
-        self.tweet_count += 1
+        self._raise_if_failed()
+        self._queue.put((_TWEET, time.time(), data))
 
     def on_connect(self):
         #This is called when a new connection is made.
         log.debug("Connected")
-        #Close warc
-        self.close_warc(end_continuation=True)
-        #Open file
-        self.open_warc()
+        self._raise_if_failed()
+        #The stream replaces its session when it disconnects, so keep the headers of this connection.
+        self._queue.put((_CONNECT, time.time(), self.session.http_headers))
+
+    def close(self):
+        """
+        Waits for the queued tweets to be written and closes the warc.
+        """
+        if self._thread.is_alive():
+            self._queue.put((_CLOSE, time.time(), None))
+            self._thread.join()
+            self._queue.close()
+            log.info("Stream metrics:\n%s", self.metrics.summary())
+        self._raise_if_failed()
 
     def on_error(self, status_code):
         log.error("Http error: %s", status_code)
@@ -156,25 +187,23 @@ class WarcListener(StreamListener, HttpLibMixin):
 
         #Open the warc
         self.warc_filepath = utilities.generate_warc_filepath(self.data_dir, self.collection, warc_type=self.stream_name)
-        utilities.create_warc_dir(self.warc_filepath)
-        log.debug("Opening %s", self.warc_filepath)
-        self.warc = warc.open(self.warc_filepath, "wb")
+        self.warc = WarcWriter(self.warc_filepath, warcinfo_fields=warcinfo_fields(self.collection), index=True)
 
     def write_warc_record(self, end_continuation=False):
-        if self.payload != "":
-            self.segment_total_length += len(self.payload)
+        if self.payload.length:
+            self.segment_total_length += self.payload.length
             headers = {}
             if self.segment == 1:
                 #Write request and response
-                assert len(self.session.http_headers) == 2
+                assert len(self.http_headers) == 2
                 #Write request
                 self.warc.write_record(self.to_warc_record("request", self.url,
-                                                           http_header=self.session.http_headers[0]))
+                                                           http_header=self.http_headers[0]))
                 #Write response
                 if not end_continuation:
                     headers["WARC-Segment-Number"] = str(self.segment)
                 warc_record = self.to_warc_record("response", self.url, http_body=self.payload,
-                                                  http_header=self.session.http_headers[1],
+                                                  http_header=self.http_headers[1],
                                                   headers=headers)
                 self.warc.write_record(warc_record)
                 self.segment_origin_id = warc_record.header.record_id
@@ -191,7 +220,8 @@ class WarcListener(StreamListener, HttpLibMixin):
             self.segment += 1
 
         #Reset
-        self.payload = ""
+        self.payload.close()
+        self.payload = PayloadBuffer(max_memory_size=self.max_payload_memory)
         self.tweet_count = 0
         if end_continuation:
             self.segment_total_length = 0
@@ -202,9 +232,61 @@ class WarcListener(StreamListener, HttpLibMixin):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close_warc(end_continuation=True)
+        self.close()
+
+    def _write_events(self):
+        #The reader is profiled by the caller, but the writer runs in its own thread.
+        with self._profiler.profile(self):
+            self._write_event_loop()
+
+    def _write_event_loop(self):
+        while True:
+            (event, received, data) = self._queue.get()
+            if self._exc_info is None:
+                try:
+                    if event == _TWEET:
+                        self._write_tweet(data, received)
+                    else:
+                        #Close warc
+                        self.close_warc(end_continuation=True)
+                        if event == _CONNECT:
+                            self.http_headers = data
+                            #Open file
+                            self.open_warc()
+                except Exception:
+                    log.exception("Error writing %s", self.warc_filepath)
+                    self._exc_info = sys.exc_info()
+            self.metrics.set("twh_queue_depth", self._queue.qsize())
+            self.metrics.set("twh_spill_bytes", self._queue.spill_size)
+            if event == _CLOSE:
+                break
+
+    def _write_tweet(self, data, received):
+        #See if rotating file necessary
+        if received - self.period_start_time > (self.duration_minutes * 60):
+            log.debug("Rotating file")
+            self.close_warc()
+            self.open_warc()
+        elif self.tweet_count >= self.tweets_per_record:
+            log.debug("Rotating record")
+            self.write_warc_record()
+        self.payload.write(data)
+        self.tweet_count += 1
+        self.metrics.observe("twh_write_lag_seconds", time.time() - received)
+
+    def _raise_if_failed(self):
+        if self._exc_info is not None:
+            exc_info = self._exc_info
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+
+#Events queued for the writer.
+_TWEET = "tweet"
+_CONNECT = "connect"
+_CLOSE = "close"
+
 
-def execute(collection, stream_name, data_path, stream_config):
+def execute(collection, stream_name, data_path, stream_config, metrics=None, profiler=None):
     auth = OAuthHandler(config.twitter_consumer_key, config.twitter_consumer_secret)
     auth.set_access_token(config.twitter_access_token, config.twitter_access_token_secret)
 
@@ -212,7 +294,8 @@ def execute(collection, stream_name, data_path, stream_config):
     with WarcListener(collection, stream_name, data_path,
                       seed=stream_config.get("seed", False),
                       duration_minutes=config.twitter_duration_minutes,
-                      tweets_per_record=config.twitter_tweets_per_record) as l:
+                      tweets_per_record=config.twitter_tweets_per_record,
+                      metrics=metrics, profiler=profiler) as l:
         stream = StreamDecorator(auth, l)
         if stream_config["type"] == "sample":
             languages = stream_config.get("languages", None)
@@ -246,10 +329,30 @@ if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser()
     parser.add_argument("stream_name")
+    parser.add_argument("--profile", action="store_true",
+                        help="Profile the harvest, writing a pstats dump and a report to the data path.")
+    parser.add_argument("--profile-top", type=int, default=30, help="Number of functions to list in the report.")
+    parser.add_argument("--metrics-port", type=int,
+                        help="Serve metrics, e.g., the depth of the queue of tweets waiting to be written, in the "
+                             "Prometheus text format from this port on localhost.")
     parser_args = parser.parse_args()
 
     #TODO: This should be configurable
     import collection_config
 
-    execute(collection_config.collection, parser_args.stream_name,
-            collection_config.data_path, collection_config.streams[parser_args.stream_name])
+    mr = MetricsRegistry()
+    if parser_args.metrics_port:
+        mr.serve(parser_args.metrics_port)
+
+    execute_args = (collection_config.collection, parser_args.stream_name,
+                    collection_config.data_path, collection_config.streams[parser_args.stream_name], mr)
+    if parser_args.profile:
+        fp = FetchProfiler()
+        try:
+            fp.run(execute, *execute_args, profiler=fp)
+        finally:
+            #Streams run until interrupted, so write the profile regardless.
+            fp.write(collection_config.data_path, name="profile-%s" % parser_args.stream_name,
+                     top=parser_args.profile_top)
+    else:
+        execute(*execute_args)